@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class InsuranceAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'insurance_app'
\ No newline at end of file
+    name = 'insurance_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
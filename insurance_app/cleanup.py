@@ -0,0 +1,165 @@
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .models import CustomerFile, FileDeletion
+
+logger = logging.getLogger(__name__)
+
+CLEANUP_BATCH_SIZE = 500
+
+
+class CleanupStats:
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.scanned = 0
+        self.orphans = 0
+        self.deleted = 0
+        self.bytes_freed = 0
+        self.missing = 0
+        self.kept = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        elapsed = self.elapsed
+        return {
+            'scanned': self.scanned,
+            'orphans': self.orphans,
+            'deleted': self.deleted,
+            'bytes_freed': self.bytes_freed,
+            'missing': self.missing,
+            'kept': self.kept,
+            'errors': self.errors,
+            'seconds': round(elapsed, 3),
+            'files_per_second': round((self.scanned + self.deleted) / elapsed, 1) if elapsed else 0,
+        }
+
+
+def customer_files_root():
+    upload_to = CustomerFile._meta.get_field('file').upload_to
+    return os.path.join(settings.MEDIA_ROOT, upload_to.split('%', 1)[0].rstrip('/'))
+
+
+def walk_files(root):
+    """Yield (storage name, DirEntry) for every file under ``root`` without building a listing."""
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield os.path.relpath(entry.path, settings.MEDIA_ROOT).replace(os.sep, '/'), entry
+
+
+def referenced_names(names):
+    return set(CustomerFile.objects.filter(file__in=names).values_list('file', flat=True))
+
+
+def find_orphan_files(stats=None, batch_size=CLEANUP_BATCH_SIZE, grace_seconds=None):
+    """
+    Yield the storage names of files under the CustomerFile upload directory
+    that no row references, checking ``batch_size`` names per query. Files
+    newer than ORPHAN_FILE_GRACE_SECONDS are skipped: uploads are written to
+    storage before their row is committed.
+    """
+    if grace_seconds is None:
+        grace_seconds = settings.ORPHAN_FILE_GRACE_SECONDS
+    cutoff = time.time() - grace_seconds
+    batch = []
+
+    def orphans_in(batch):
+        referenced = referenced_names(name for name, _ in batch)
+        return [name for name, entry in batch if name not in referenced and entry.stat().st_mtime < cutoff]
+
+    for name, entry in walk_files(customer_files_root()):
+        if stats is not None:
+            stats.scanned += 1
+        batch.append((name, entry))
+        if len(batch) >= batch_size:
+            yield from orphans_in(batch)
+            batch = []
+    if batch:
+        yield from orphans_in(batch)
+
+
+def queue_file_deletions(names):
+    FileDeletion.objects.bulk_create([FileDeletion(name=name) for name in names], ignore_conflicts=True)
+
+
+def process_file_deletions(stats=None, batch_size=CLEANUP_BATCH_SIZE, dry_run=False):
+    """Delete queued files a batch at a time; a name that a CustomerFile uses again is dropped from the queue, not deleted."""
+    if stats is None:
+        stats = CleanupStats(dry_run)
+    last_pk = 0
+    while True:
+        batch = list(FileDeletion.objects.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+        if not batch:
+            return stats
+        last_pk = batch[-1].pk
+        referenced = referenced_names([item.name for item in batch])
+
+        done = []
+        for item in batch:
+            if item.name in referenced:
+                stats.kept += 1
+                done.append(item.pk)
+                continue
+            path = os.path.join(settings.MEDIA_ROOT, item.name)
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                stats.missing += 1
+                done.append(item.pk)
+                continue
+            if not dry_run:
+                try:
+                    default_storage.delete(item.name)
+                except OSError:
+                    logger.warning("Could not delete %s", item.name, exc_info=True)
+                    stats.errors += 1
+                    continue
+            stats.deleted += 1
+            stats.bytes_freed += size
+            done.append(item.pk)
+
+        if not dry_run:
+            FileDeletion.objects.filter(pk__in=done).delete()
+
+
+def reconcile_files(batch_size=CLEANUP_BATCH_SIZE, dry_run=False, scan=True, on_orphan=None):
+    """
+    Queue the unreferenced files a scan finds, then work through the deletion
+    queue. A dry run queues and deletes nothing; ``on_orphan`` sees each
+    orphan's name either way.
+    """
+    stats = CleanupStats(dry_run)
+    if scan:
+        orphans = []
+        for name in find_orphan_files(stats, batch_size):
+            stats.orphans += 1
+            if on_orphan is not None:
+                on_orphan(name)
+            if dry_run:
+                continue
+            orphans.append(name)
+            if len(orphans) >= batch_size:
+                queue_file_deletions(orphans)
+                orphans = []
+        if orphans:
+            queue_file_deletions(orphans)
+    process_file_deletions(stats, batch_size, dry_run)
+    logger.info("File cleanup%s: %s", " (dry run)" if dry_run else "", stats.as_dict())
+    return stats
@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .metrics import record_cache
+from .models import Insurance, Warranty, Defect
+from . import jobs, renewals
+
+COUNTERS_CACHE_PREFIX = 'notification_counters'
+COUNTERS_CACHE_TIMEOUT = 60 * 60 * 24
+PERMISSION_TIERS = ('renewals', 'basic')
+
+
+def permission_tier(user):
+    if user.has_perm('insurance_app.change_insurance'):
+        return 'renewals'
+    return 'basic'
+
+
+def counters_cache_key(today, tier):
+    return f"{COUNTERS_CACHE_PREFIX}:{today.isoformat()}:{tier}"
+
+
+def counters_cache_timeout():
+    # Signals clear these only in the saving worker's cache; see SHARED_CACHE.
+    return COUNTERS_CACHE_TIMEOUT if settings.SHARED_CACHE else settings.LOCAL_CACHE_TIMEOUT
+
+
+def compute_notification_counters(today, tier, notices_generated=None):
+    thirty_days_from_now = today + timezone.timedelta(days=30)
+
+    expiring_insurances = Insurance.objects.filter(
+        end_period__lte=thirty_days_from_now
+    ).count()
+
+    expiring_warranties = Warranty.objects.filter(
+        end_date__lte=thirty_days_from_now
+    ).count()
+
+    expiring_defects = Defect.objects.filter(
+        resolution_deadline__lte=thirty_days_from_now
+    ).count()
+
+    pending_renewal_count = 0
+    if tier == 'renewals':
+        if notices_generated is None:
+            notices_generated = jobs.job_ran('roll_calendar', today)
+        if notices_generated:
+            pending_renewal_count = renewals.pending_renewal_count(today)
+        else:
+            # Without cron or the in-process scheduler, today's notices may not exist yet.
+            pending_renewal_count = renewals.live_pending_renewal_count(today)
+
+    return {
+        'expiring_items_count': expiring_insurances + expiring_warranties + expiring_defects,
+        'pending_renewal_count': pending_renewal_count,
+    }
+
+
+def get_notification_counters(user, today=None):
+    if today is None:
+        today = timezone.now().date()
+    tier = permission_tier(user)
+    key = counters_cache_key(today, tier)
+
+    counters = cache.get(key)
+    record_cache('notification_counters', counters is not None)
+    if counters is None:
+        counters = compute_notification_counters(today, tier)
+        cache.set(key, counters, counters_cache_timeout())
+    return counters
+
+
+def invalidate_notification_counters(today=None):
+    if today is None:
+        today = timezone.now().date()
+    cache.delete_many([counters_cache_key(today, tier) for tier in PERMISSION_TIERS])
+
+
+def refresh_notification_counters(today=None):
+    # Called by roll_calendar once today's notices are written.
+    if today is None:
+        today = timezone.now().date()
+    for tier in PERMISSION_TIERS:
+        counters = compute_notification_counters(today, tier, notices_generated=True)
+        cache.set(counters_cache_key(today, tier), counters, counters_cache_timeout())
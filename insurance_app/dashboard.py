@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .metrics import record_cache
+from .models import Customer, Insurance, Warranty, Defect
+from .parallel import gather_reads
+from .status import EXPIRING_WINDOW_DAYS
+
+DASHBOARD_CACHE_PREFIX = 'dashboard_stats'
+DASHBOARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def dashboard_cache_key(today):
+    return f"{DASHBOARD_CACHE_PREFIX}:{today.isoformat()}"
+
+
+def dashboard_cache_timeout():
+    # A save clears the figures in its own worker only; see SHARED_CACHE.
+    return DASHBOARD_CACHE_TIMEOUT if settings.SHARED_CACHE else settings.LOCAL_CACHE_TIMEOUT
+
+
+def dashboard_reads(today):
+    """{name: zero-argument read} for the figures; each is one independent query."""
+    thirty_days_from_now = today + timezone.timedelta(days=EXPIRING_WINDOW_DAYS)
+    return {
+        'insurances': lambda: Insurance.objects.aggregate(
+            expired=Count('pk', filter=Q(end_period__lt=today)),
+            expiring=Count('pk', filter=Q(end_period__gte=today, end_period__lte=thirty_days_from_now)),
+            active=Count('pk', filter=Q(end_period__gte=today)),
+        ),
+        'warranties': lambda: Warranty.objects.aggregate(
+            expired=Count('pk', filter=Q(end_date__lt=today)),
+            expiring=Count('pk', filter=Q(end_date__gte=today, end_date__lte=thirty_days_from_now)),
+        ),
+        'defects': lambda: Defect.objects.filter(accident_date__isnull=True).aggregate(
+            expired=Count('pk', filter=Q(resolution_deadline__lt=today)),
+            expiring=Count('pk', filter=Q(resolution_deadline__gte=today, resolution_deadline__lte=thirty_days_from_now)),
+        ),
+        'customers': Customer.objects.count,
+    }
+
+
+def build_dashboard_stats(today, results):
+    insurances, warranties, defects = results['insurances'], results['warranties'], results['defects']
+    return {
+        'date': today.isoformat(),
+        'total_expired_count': insurances['expired'] + warranties['expired'] + defects['expired'],
+        'expiring_items_count': insurances['expiring'] + warranties['expiring'] + defects['expiring'],
+        'total_customers_count': results['customers'],
+        'active_policies_count': insurances['active'],
+        'insurances': insurances,
+        'warranties': warranties,
+        'defects': defects,
+    }
+
+
+def compute_dashboard_stats(today):
+    return build_dashboard_stats(today, {name: read() for name, read in dashboard_reads(today).items()})
+
+
+async def acompute_dashboard_stats(today):
+    reads = dashboard_reads(today)
+    results = await gather_reads(*reads.values())
+    return build_dashboard_stats(today, dict(zip(reads, results)))
+
+
+def get_dashboard_stats(today=None):
+    if today is None:
+        today = timezone.now().date()
+    key = dashboard_cache_key(today)
+
+    stats = cache.get(key)
+    record_cache('dashboard_stats', stats is not None)
+    if stats is None:
+        stats = compute_dashboard_stats(today)
+        cache.set(key, stats, dashboard_cache_timeout())
+    return stats
+
+
+async def aget_dashboard_stats(today=None):
+    if today is None:
+        today = timezone.now().date()
+    key = dashboard_cache_key(today)
+
+    stats = await cache.aget(key)
+    record_cache('dashboard_stats', stats is not None)
+    if stats is None:
+        stats = await acompute_dashboard_stats(today)
+        await cache.aset(key, stats, dashboard_cache_timeout())
+    return stats
+
+
+def invalidate_dashboard_stats(today=None):
+    if today is None:
+        today = timezone.now().date()
+    cache.delete(dashboard_cache_key(today))
+
+
+def refresh_dashboard_stats(today=None):
+    if today is None:
+        today = timezone.now().date()
+    stats = compute_dashboard_stats(today)
+    cache.set(dashboard_cache_key(today), stats, dashboard_cache_timeout())
+    return stats
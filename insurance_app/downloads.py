@@ -0,0 +1,150 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Uploaded files are shown in the browser only as these types; anything else
+# (HTML, SVG, ...) could run script on this origin, so it is downloaded.
+INLINE_CONTENT_TYPES = {'application/pdf', 'image/gif', 'image/jpeg', 'image/png', 'image/webp'}
+
+
+class FileRange:
+    """File-like view of ``length`` bytes from ``start``; having no fileno()
+    keeps servers from sendfile()-ing past the end of the range."""
+
+    def __init__(self, fh, start, length):
+        fh.seek(start)
+        self.fh = fh
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fh.close()
+
+
+def file_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) for a single ``bytes=`` range, None to send the whole
+    file (no header, a malformed one or several ranges), or False when the
+    range cannot be satisfied.
+    """
+    match = RANGE_PATTERN.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last or int(last) == 0:
+            return False
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def range_applies(request, etag, mtime):
+    # If-Range carries either the ETag or the Last-Modified date the client
+    # has; a partial response only makes sense if the file still matches it.
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def file_response_headers(response, etag, mtime):
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(mtime)
+    response.headers['Accept-Ranges'] = 'bytes'
+    # Revalidate on each use so a replaced file is never served stale, but repeat
+    # downloads are answered with 304 Not Modified.
+    patch_cache_control(response, private=True, no_cache=True)
+    return uploaded_content_headers(response)
+
+
+def uploaded_content_headers(response):
+    # No type sniffing, and no script or same-origin access should a file
+    # get rendered anyway.
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['Content-Security-Policy'] = 'sandbox'
+    return response
+
+
+def serve_file(request, field_file, as_attachment=False):
+    """
+    Serve a stored file with conditional GET and, per FILE_DOWNLOAD_BACKEND,
+    either hand the transfer to the front server ('nginx' via
+    X-Accel-Redirect, 'sendfile' via X-Sendfile) or stream it from Python
+    with single-range support ('python'). Only INLINE_CONTENT_TYPES are
+    served inline; everything else is an application/octet-stream attachment.
+    """
+    filename = os.path.basename(field_file.name)
+    content_type = mimetypes.guess_type(filename)[0]
+    if content_type not in INLINE_CONTENT_TYPES:
+        content_type = 'application/octet-stream'
+        as_attachment = True
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        # Storage without local paths: no ranges or validators, just stream it.
+        return uploaded_content_headers(FileResponse(
+            field_file.open('rb'), as_attachment=as_attachment, filename=filename, content_type=content_type,
+        ))
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404("File not found.")
+    etag = file_etag(stat)
+    mtime = stat.st_mtime
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(mtime))
+    if not_modified is not None:
+        return file_response_headers(not_modified, etag, mtime)
+
+    backend = settings.FILE_DOWNLOAD_BACKEND
+    if backend in ('nginx', 'sendfile'):
+        response = HttpResponse(content_type=content_type)
+        if backend == 'nginx':
+            response.headers['X-Accel-Redirect'] = settings.FILE_DOWNLOAD_ACCEL_PREFIX + quote(field_file.name)
+        else:
+            response.headers['X-Sendfile'] = path
+        response.headers['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+        return file_response_headers(response, etag, mtime)
+
+    size = stat.st_size
+    byte_range = parse_range(request.headers.get('Range'), size) if range_applies(request, etag, mtime) else None
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response.headers['Content-Range'] = f'bytes */{size}'
+        return file_response_headers(response, etag, mtime)
+
+    fh = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(fh, as_attachment=as_attachment, filename=filename, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(FileRange(fh, start, end - start + 1), as_attachment=as_attachment, filename=filename,
+                                content_type=content_type, status=206)
+        response.headers['Content-Length'] = end - start + 1
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return file_response_headers(response, etag, mtime)
@@ -0,0 +1,90 @@
+import csv
+
+from django.utils import timezone
+
+from . import jobs
+from .models import Customer
+from .search import clean_sort, get_search_backend, sort_ordering
+from .status import STATUS_GROUPS, attach_group_statuses
+from .summaries import (
+    LIVE_PREFIX, SUMMARY_PREFIX, annotate_live_status, filter_by_status, is_status_sort, order_by_status,
+    uses_summaries,
+)
+
+EXPORT_CHUNK_SIZE = 2000
+
+CUSTOMER_COLUMNS = [
+    'id_customer', 'customer_name', 'address', 'email', 'phone_num',
+    'in_charge_person', 'proposal_prepared_by', 'engineers', 'installer', 'installed_on',
+]
+STATUS_COLUMNS = ['color', 'green', 'yellow', 'red', 'total']
+# Spreadsheets evaluate a cell starting with one of these as a formula.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Echo:
+    # csv.writer only needs write(); hand each line straight back to the caller.
+    def write(self, value):
+        return value
+
+
+def export_queryset(query='', search_field='all', sort_by='customer_name', status='', group_statuses=None,
+                    expires_within=None):
+    today = timezone.now().date()
+    customers = Customer.objects.all()
+    status_prefix = SUMMARY_PREFIX
+    if uses_summaries(sort_by, status, group_statuses, expires_within) and not jobs.job_ran('rebuild_status_summaries', today):
+        customers = annotate_live_status(customers, today)
+        status_prefix = LIVE_PREFIX
+    if query:
+        customers = get_search_backend().filter(customers, query, search_field)
+    customers = filter_by_status(customers, status, group_statuses, expires_within, today, status_prefix)
+    if is_status_sort(sort_by):
+        return order_by_status(customers, sort_by, status_prefix)
+    return customers.order_by(*sort_ordering(clean_sort(sort_by)))
+
+
+def export_header():
+    header = list(CUSTOMER_COLUMNS)
+    for attr, _, _, _ in STATUS_GROUPS:
+        prefix = attr.replace('_status', '')
+        header += [f'{prefix}_{column}' for column in STATUS_COLUMNS]
+    return header
+
+
+def export_rows(customers, chunk_size=EXPORT_CHUNK_SIZE, today=None):
+    if today is None:
+        today = timezone.now().date()
+
+    yield export_header()
+
+    chunk = []
+    for customer in customers.iterator(chunk_size=chunk_size):
+        chunk.append(customer)
+        if len(chunk) >= chunk_size:
+            yield from _chunk_rows(chunk, today)
+            chunk = []
+    if chunk:
+        yield from _chunk_rows(chunk, today)
+
+
+def escape_formula(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+def _chunk_rows(customers, today):
+    attach_group_statuses(customers, today)
+    for customer in customers:
+        row = [escape_formula(getattr(customer, column) or '') for column in CUSTOMER_COLUMNS]
+        for attr, _, _, _ in STATUS_GROUPS:
+            status = getattr(customer, attr)
+            row += [status[column] for column in STATUS_COLUMNS]
+        yield row
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow(row)
@@ -0,0 +1,62 @@
+from django.db.models import CharField, F, Value
+from django.utils import timezone
+
+from .models import Insurance, Warranty, Defect
+from .status import EXPIRING_WINDOW_DAYS, get_status_color
+
+# (filter value, label shown in the feed, model, end date field, extra filters)
+FEED_SOURCES = (
+    ('insurance', 'Insurance', Insurance, 'end_period', {}),
+    ('warranty', 'Warranty', Warranty, 'end_date', {}),
+    ('defect', 'Defect Liability', Defect, 'resolution_deadline', {'accident_date__isnull': True}),
+)
+FEED_TYPES = [source[0] for source in FEED_SOURCES]
+FEED_STATUSES = ['red', 'yellow']
+
+
+def _date_filters(date_field, status, today, thirty_days_from_now):
+    if status == 'red':
+        return {f'{date_field}__lt': today}
+    if status == 'yellow':
+        return {f'{date_field}__gte': today, f'{date_field}__lte': thirty_days_from_now}
+    return {f'{date_field}__lte': thirty_days_from_now}
+
+
+def expiring_items_feed(today=None, item_type=None, status=None):
+    """
+    Every Insurance, Warranty and liability-period Defect that has expired or
+    expires within the window, as one UNION ALL ordered by end date in SQL.
+    """
+    if today is None:
+        today = timezone.now().date()
+    thirty_days_from_now = today + timezone.timedelta(days=EXPIRING_WINDOW_DAYS)
+
+    querysets = []
+    for key, label, model, date_field, filters in FEED_SOURCES:
+        if item_type and key != item_type:
+            continue
+        querysets.append(
+            model.objects.filter(**filters, **_date_filters(date_field, status, today, thirty_days_from_now))
+            .annotate(
+                item_type=Value(label, output_field=CharField()),
+                customer_ref=F('id_customer_id'),
+                customer_name=F('id_customer__customer_name'),
+                expires_on=F(date_field),
+            )
+            .values('item_type', 'customer_ref', 'customer_name', 'expires_on')
+            .order_by()
+        )
+
+    feed = querysets[0]
+    if len(querysets) > 1:
+        feed = feed.union(*querysets[1:], all=True)
+    return feed.order_by('expires_on', 'item_type', 'customer_ref')
+
+
+def feed_row_to_item(row, today):
+    return {
+        'type': row['item_type'],
+        'customer': {'id_customer': row['customer_ref'], 'customer_name': row['customer_name']},
+        'end_date': row['expires_on'],
+        'status_color': get_status_color(row['expires_on'], today),
+    }
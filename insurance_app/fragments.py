@@ -0,0 +1,51 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .metrics import record_cache
+
+CUSTOMER_VERSION_PREFIX = 'customer_version'
+# A lost stamp is simply replaced by a new one, so this only bounds memory.
+CUSTOMER_VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def customer_version_key(customer_id):
+    return f"{CUSTOMER_VERSION_PREFIX}:{customer_id}"
+
+
+def new_version():
+    return time.time_ns()
+
+
+def bump_customer_versions(customer_ids):
+    """Give each customer a new stamp, so every cached fragment built from their rows misses."""
+    version = new_version()
+    cache.set_many({customer_version_key(pk): version for pk in customer_ids}, CUSTOMER_VERSION_TIMEOUT)
+
+
+def fragment_stamp(version, today):
+    # Status colors depend on today's date as well as the rows.
+    return f"{version}:{today.isoformat()}"
+
+
+def customer_fragment_stamp(customer_id, today=None):
+    if today is None:
+        today = timezone.now().date()
+    key = customer_version_key(customer_id)
+    version = cache.get(key)
+    record_cache('customer_version', version is not None)
+    if version is None:
+        version = new_version()
+        cache.add(key, version, CUSTOMER_VERSION_TIMEOUT)
+        version = cache.get(key, version)
+    return fragment_stamp(version, today)
+
+
+def seconds_until_tomorrow(now=None):
+    """Fragment timeout that expires at the next rollover of timezone.now().date()."""
+    if now is None:
+        now = timezone.now()
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=now.tzinfo)
+    return max(int((tomorrow - now).total_seconds()), 1)
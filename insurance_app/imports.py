@@ -0,0 +1,224 @@
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .counters import invalidate_notification_counters
+from .dashboard import invalidate_dashboard_stats
+from .fragments import bump_customer_versions
+from .models import Customer, Insurance, Warranty
+from .summaries import refresh_customer_summaries
+from .validation import RuleError, join_engineers, resolve_other_choice, resolve_warranty_product
+
+IMPORT_BATCH_SIZE = 1000
+ERROR_REPORT_COLUMNS = ['line', 'error']
+
+
+def _text(row, column):
+    return (row.get(column) or '').strip()
+
+
+def _required(row, column):
+    value = _text(row, column)
+    if not value:
+        raise RuleError(f"'{column}' is required.")
+    return value
+
+
+def _date(row, column, required=True):
+    value = _required(row, column) if required else _text(row, column)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise RuleError(f"'{column}' must be a date in YYYY-MM-DD format.")
+    return parsed
+
+
+def _decimal(row, column):
+    try:
+        return Decimal(_required(row, column))
+    except InvalidOperation:
+        raise RuleError(f"'{column}' must be a number.")
+
+
+class CustomerImporter:
+    model = Customer
+    key = 'id_customer'
+    columns = ['id_customer', 'customer_name']
+
+    def build(self, row):
+        engineers = [e.strip() for e in _text(row, 'engineers').split(',') if e.strip()]
+        return Customer(
+            id_customer=_required(row, 'id_customer'),
+            customer_name=_required(row, 'customer_name'),
+            address=_text(row, 'address'),
+            email=_text(row, 'email'),
+            phone_num=_text(row, 'phone_num'),
+            in_charge_person=resolve_other_choice(_text(row, 'in_charge_person'), _text(row, 'in_charge_other')) or None,
+            proposal_prepared_by=resolve_other_choice(_text(row, 'proposal_prepared_by'), _text(row, 'proposal_other')) or None,
+            engineers=join_engineers(engineers, _text(row, 'engineers_other')),
+            installer=_text(row, 'installer'),
+            installed_on=_date(row, 'installed_on', required=False),
+        )
+
+
+class InsuranceImporter:
+    model = Insurance
+    key = 'no_insurance'
+    columns = [
+        'no_insurance', 'ins_co', 'id_customer', 'sum_amount', 'total_payable',
+        'starting_period', 'end_period', 'status',
+    ]
+
+    def build(self, row):
+        return Insurance(
+            no_insurance=_required(row, 'no_insurance'),
+            ins_co=_required(row, 'ins_co'),
+            id_customer_id=_required(row, 'id_customer'),
+            sum_amount=_decimal(row, 'sum_amount'),
+            total_payable=_decimal(row, 'total_payable'),
+            starting_period=_date(row, 'starting_period'),
+            end_period=_date(row, 'end_period'),
+            status=_required(row, 'status'),
+        )
+
+
+class WarrantyImporter:
+    model = Warranty
+    key = None
+    columns = ['id_customer', 'product_select', 'start_date', 'end_date']
+
+    def build(self, row):
+        return Warranty(
+            id_customer_id=_required(row, 'id_customer'),
+            product_name=resolve_warranty_product(_text(row, 'product_select'), _text(row, 'product_other')),
+            start_date=_date(row, 'start_date'),
+            end_date=_date(row, 'end_date'),
+            details=_text(row, 'details'),
+        )
+
+
+IMPORTERS = {
+    'customers': CustomerImporter,
+    'insurance': InsuranceImporter,
+    'warranties': WarrantyImporter,
+}
+
+
+class ImportResult:
+    def __init__(self, kind, dry_run=False):
+        self.kind = kind
+        self.dry_run = dry_run
+        self.rows = 0
+        self.valid = 0
+        self.created = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+
+class RecordImport:
+    """
+    Streams a CSV through one importer: rows are validated as they are read
+    and every ``batch_size`` valid rows are written with a single bulk_create
+    in their own transaction, so memory stays flat and a bad batch only rolls
+    back itself.
+    """
+
+    def __init__(self, kind, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+        self.importer = IMPORTERS[kind]()
+        self.batch_size = batch_size
+        self.result = ImportResult(kind, dry_run)
+        self.seen_keys = set()
+
+    def run(self, stream):
+        reader = csv.DictReader(stream)
+        missing = [c for c in self.importer.columns if c not in (reader.fieldnames or [])]
+        if missing:
+            self.result.add_error(1, f"Missing column(s): {', '.join(missing)}.")
+            return self.result
+
+        batch = []
+        for row in reader:
+            self.result.rows += 1
+            batch.append((reader.line_num, row))
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch = []
+        if batch:
+            self.write_batch(batch)
+        self.result.errors.sort()
+
+        if self.result.created:
+            today = timezone.now().date()
+            invalidate_notification_counters(today)
+            invalidate_dashboard_stats(today)
+        return self.result
+
+    def build_batch(self, batch):
+        built = []
+        for line, row in batch:
+            try:
+                built.append((line, self.importer.build(row)))
+            except RuleError as e:
+                self.result.add_error(line, str(e))
+        return built
+
+    def check_batch(self, built):
+        model, key = self.importer.model, self.importer.key
+        customer_ids = {obj.id_customer_id for _, obj in built if model is not Customer}
+        known_customers = set(Customer.objects.filter(pk__in=customer_ids).values_list('pk', flat=True)) if customer_ids else set()
+        keys = {getattr(obj, key) for _, obj in built} if key else set()
+        existing = set(model.objects.filter(pk__in=keys).values_list('pk', flat=True)) if keys else set()
+
+        valid = []
+        for line, obj in built:
+            if model is not Customer and obj.id_customer_id not in known_customers:
+                self.result.add_error(line, f"Customer with ID '{obj.id_customer_id}' not found.")
+                continue
+            if key:
+                value = getattr(obj, key)
+                if value in existing:
+                    self.result.add_error(line, f"'{value}' already exists.")
+                    continue
+                if value in self.seen_keys:
+                    self.result.add_error(line, f"'{value}' appears more than once in this file.")
+                    continue
+                self.seen_keys.add(value)
+            valid.append((line, obj))
+        return valid
+
+    def write_batch(self, batch):
+        valid = self.check_batch(self.build_batch(batch))
+        self.result.valid += len(valid)
+        if not valid or self.result.dry_run:
+            return
+        try:
+            with transaction.atomic():
+                objs = self.importer.model.objects.bulk_create([obj for _, obj in valid], batch_size=self.batch_size)
+                # bulk_create() sends no post_save, so the status summaries are refreshed per batch.
+                customer_ids = {obj.pk if isinstance(obj, Customer) else obj.id_customer_id for obj in objs}
+                refresh_customer_summaries(customer_ids)
+        except DatabaseError as e:
+            for line, _ in valid:
+                self.result.add_error(line, f"Batch rolled back: {e}")
+            return
+        transaction.on_commit(lambda: bump_customer_versions(customer_ids))
+        self.result.created += len(valid)
+
+
+def import_records(kind, stream, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    return RecordImport(kind, batch_size=batch_size, dry_run=dry_run).run(stream)
+
+
+def write_error_report(errors, output):
+    writer = csv.writer(output)
+    writer.writerow(ERROR_REPORT_COLUMNS)
+    writer.writerows(errors)
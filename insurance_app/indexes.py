@@ -0,0 +1,15 @@
+"""Helpers for the migrations that build indexes on the unmanaged tables with raw SQL."""
+
+
+def drop_if_invalid(schema_editor, index_name):
+    # An interrupted CREATE INDEX CONCURRENTLY leaves an INVALID index behind
+    # that IF NOT EXISTS would keep and the planner never uses.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid '
+            'WHERE pg_class.relname = %s AND NOT pg_index.indisvalid',
+            [index_name],
+        )
+        invalid = cursor.fetchone() is not None
+    if invalid:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"')
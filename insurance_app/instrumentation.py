@@ -0,0 +1,92 @@
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+current_timings = ContextVar('request_timings', default=None)
+
+PLACEHOLDER_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+
+
+def sql_shape(sql):
+    # Collapse IN (%s, %s, ...) so lists of different lengths share a shape.
+    return PLACEHOLDER_LIST.sub('(...)', sql)
+
+
+class RequestTimings:
+    """Where one request spent its time, filled in by RequestInstrumentationMiddleware."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.db = 0.0
+        self.template = 0.0
+        self.queries = 0
+        self.statements = Counter()
+        # Views may run independent reads on several threads at once.
+        self.lock = threading.Lock()
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.db += elapsed
+                self.queries += 1
+                # Raw SQL only; folding into shapes is deferred to duplicate_shapes().
+                self.statements[sql] += 1
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    @property
+    def view(self):
+        # Everything outside template rendering: middleware, the view body and its queries.
+        return self.total - self.template
+
+    def duplicate_shapes(self, minimum=2):
+        shapes = Counter()
+        for sql, count in self.statements.items():
+            shapes[sql_shape(sql)] += count
+        return [(shape, count) for shape, count in shapes.most_common() if count >= minimum]
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f'view;dur={self.view * 1000:.1f}',
+            f'template;dur={self.template * 1000:.1f}',
+            f'total;dur={self.total * 1000:.1f}',
+        ])
+
+
+class Template(django_backend.Template):
+
+    def render(self, context=None, request=None):
+        timings = current_timings.get()
+        if timings is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            # Context processors run inside render, so they count as template time.
+            return super().render(context, request)
+        finally:
+            timings.template += time.perf_counter() - start
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The stock Django template backend, with top-level renders timed into the current RequestTimings."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import cleanup, counters, dashboard, previews, renewals, summaries, uploads
+from .metrics import record_cache
+from .models import JobRun
+
+logger = logging.getLogger(__name__)
+
+JOBS_DONE_CACHE_PREFIX = 'jobs_done'
+JOBS_DONE_CACHE_TIMEOUT = 60 * 60 * 24
+# A run still marked 'running' after this long is assumed to have died with its process.
+JOB_STALE_AFTER = timedelta(hours=1)
+
+
+def roll_calendar(today):
+    """
+    Everything that changes only when the date does: due renewal notices and
+    the per-day expired/expiring buckets behind the dashboard and the sidebar
+    badges, so requests for ``today`` read them from the cache.
+    """
+    rows = {'renewal_notices': renewals.generate_due_notices(today)}
+    stats = dashboard.refresh_dashboard_stats(today)
+    for group in ('insurances', 'warranties', 'defects'):
+        rows[group] = stats[group]
+    counters.refresh_notification_counters(today)
+    return rows
+
+
+def rebuild_status_summaries(today):
+    return {'customer_summaries': summaries.rebuild_summaries(today)}
+
+
+def purge_stale_uploads(today):
+    return {'upload_sessions': uploads.purge_stale_uploads(), 'file_previews': previews.evict_previews()}
+
+
+def cleanup_files(today):
+    return cleanup.reconcile_files().as_dict()
+
+
+JOBS = {
+    'roll_calendar': roll_calendar,
+    'rebuild_status_summaries': rebuild_status_summaries,
+    'purge_stale_uploads': purge_stale_uploads,
+    'cleanup_files': cleanup_files,
+}
+DAILY_JOBS = ['roll_calendar', 'rebuild_status_summaries', 'purge_stale_uploads', 'cleanup_files']
+
+
+def jobs_done_cache_key(name, today):
+    return f"{JOBS_DONE_CACHE_PREFIX}:{name}:{today.isoformat()}"
+
+
+def claim_job(name, today, force=False):
+    # The (name, run_date) unique constraint is the lock: whichever process
+    # inserts the row first runs the job, so several workers can share a schedule.
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            return JobRun.objects.create(name=name, run_date=today, started_at=now)
+    except IntegrityError:
+        pass
+
+    retry = Q(status=JobRun.FAILED) | Q(status=JobRun.RUNNING, started_at__lt=now - JOB_STALE_AFTER)
+    if force:
+        retry |= Q(status=JobRun.SUCCEEDED)
+    claimed = JobRun.objects.filter(retry, name=name, run_date=today).update(
+        status=JobRun.RUNNING, started_at=now, finished_at=None, duration_ms=None, rows={}, error='',
+    )
+    if claimed:
+        return JobRun.objects.get(name=name, run_date=today)
+    return None
+
+
+def run_job(name, today=None, force=False):
+    if today is None:
+        today = timezone.now().date()
+    run = claim_job(name, today, force=force)
+    if run is None:
+        return None
+
+    start = time.perf_counter()
+    try:
+        run.rows = JOBS[name](today)
+        run.status = JobRun.SUCCEEDED
+    except Exception as e:
+        logger.exception("Job %s for %s failed", name, today)
+        run.status = JobRun.FAILED
+        run.error = repr(e)
+    run.duration_ms = round((time.perf_counter() - start) * 1000)
+    run.finished_at = timezone.now()
+    run.save()
+
+    if run.status == JobRun.SUCCEEDED:
+        cache.set(jobs_done_cache_key(name, today), True, JOBS_DONE_CACHE_TIMEOUT)
+    logger.info("Job %s for %s %s in %sms: %s", name, today, run.status, run.duration_ms, run.rows)
+    return run
+
+
+def job_ran(name, today=None):
+    # One cache hit once the day's run is recorded; never runs the job.
+    if today is None:
+        today = timezone.now().date()
+    key = jobs_done_cache_key(name, today)
+    done = cache.get(key)
+    record_cache('jobs_done', bool(done))
+    if done:
+        return True
+    if JobRun.objects.filter(name=name, run_date=today, status=JobRun.SUCCEEDED).exists():
+        cache.set(key, True, JOBS_DONE_CACHE_TIMEOUT)
+        return True
+    return False
+
+
+def ensure_job_ran(name, today=None):
+    # Guard for request handlers: a catch-up run if the scheduler has not fired yet.
+    if today is None:
+        today = timezone.now().date()
+    if not job_ran(name, today):
+        run_job(name, today)
+
+
+def run_daily_jobs(today=None):
+    return [run_job(name, today) for name in DAILY_JOBS]
+
+
+def next_run_at(now, run_time=None):
+    hour, minute = map(int, (run_time or settings.JOB_SCHEDULE_TIME).split(':'))
+    candidate = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if candidate <= now:
+        candidate += timedelta(days=1)
+    return candidate
+
+
+def run_scheduler(stop_event=None):
+    """Run the daily jobs now if they are due, then once a day at JOB_SCHEDULE_TIME."""
+    if stop_event is None:
+        stop_event = threading.Event()
+    while not stop_event.is_set():
+        try:
+            run_daily_jobs()
+        except Exception:
+            logger.exception("Scheduled jobs failed")
+        finally:
+            close_old_connections()
+        now = timezone.now()
+        if stop_event.wait((next_run_at(now) - now).total_seconds()):
+            break
+
+
+def start_scheduler_thread():
+    thread = threading.Thread(target=run_scheduler, name='insurance-job-scheduler', daemon=True)
+    thread.start()
+    return thread
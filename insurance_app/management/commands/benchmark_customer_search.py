@@ -0,0 +1,100 @@
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from insurance_app.models import Customer
+from insurance_app.search import get_search_backend
+
+BENCH_PREFIX = 'BENCH-'
+
+
+class Rollback(Exception):
+    pass
+
+
+def random_word(rng, length):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+
+class Command(BaseCommand):
+    help = (
+        "Time customer_list searches against synthetic customers at several table sizes. "
+        "The synthetic rows are inserted inside a transaction that is always rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000, 1000000])
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        backends = ['basic']
+        if connection.vendor == 'postgresql':
+            backends.append('trigram')
+
+        self.stdout.write(f"{'rows':>10} {'backend':>8} {'field':>6} {'sort':>10} {'p50 ms':>8} {'p95 ms':>8}")
+        for size in sorted(options['sizes']):
+            try:
+                with transaction.atomic():
+                    terms = self.seed(size, options['batch_size'], random.Random(options['seed']))
+                    if connection.vendor == 'postgresql':
+                        with connection.cursor() as cursor:
+                            cursor.execute('ANALYZE "Customer"')
+                    for name in backends:
+                        self.run_backend(size, name, terms, options)
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def seed(self, size, batch_size, rng):
+        existing = Customer.objects.count()
+        to_create = max(size - existing, 0)
+        terms = []
+        batch = []
+        for i in range(to_create):
+            name = f"{random_word(rng, 6).capitalize()} {random_word(rng, 8).capitalize()}"
+            if i % max(to_create // 20, 1) == 0:
+                terms.append(name.split()[1][2:6])
+            batch.append(Customer(
+                id_customer=f'{BENCH_PREFIX}{i:08d}',
+                customer_name=name,
+                address=f"{rng.randint(1, 999)} Jalan {random_word(rng, 7).capitalize()}",
+                email=f"{random_word(rng, 8)}@example.com",
+                phone_num=f"01{rng.randint(10000000, 99999999)}",
+            ))
+            if len(batch) >= batch_size:
+                Customer.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Customer.objects.bulk_create(batch)
+        return terms or ['a']
+
+    def run_backend(self, size, name, terms, options):
+        backend = get_search_backend(name)
+        page_size = options['page_size']
+        for search_field in ('all', 'name'):
+            for ranked in (False, True):
+                timings = []
+                for i in range(options['repeat']):
+                    term = terms[i % len(terms)]
+                    queryset = backend.filter(Customer.objects.all(), term, search_field)
+                    if ranked:
+                        queryset = backend.rank(queryset, term, search_field).order_by('-search_rank', 'pk')
+                    else:
+                        queryset = queryset.order_by('customer_name', 'pk')
+                    start = time.perf_counter()
+                    list(queryset[:page_size])
+                    queryset.count()
+                    timings.append((time.perf_counter() - start) * 1000)
+                timings.sort()
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                self.stdout.write(
+                    f"{size:>10} {name:>8} {search_field:>6} {'relevance' if ranked else 'name':>10} "
+                    f"{statistics.median(timings):>8.1f} {p95:>8.1f}"
+                )
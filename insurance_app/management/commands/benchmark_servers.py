@@ -0,0 +1,141 @@
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from insurance_app.models import Customer
+
+DEFAULT_URLS = ['main_page', 'notification_page', 'customer_detail']
+WARMUP_REQUESTS = 5
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f"Server exited with status {process.returncode}.")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"Server did not start listening on port {port} within {timeout}s.")
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Start the project under gunicorn gthread (WSGI) and gunicorn uvicorn workers (ASGI, "
+        "insurance_project/gunicorn_asgi.py), load the same pages with concurrent keep-alive "
+        "clients, and compare latency and throughput. Uses the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--urls', nargs='+', default=DEFAULT_URLS, help="URL names to load.")
+        parser.add_argument('--requests', type=int, default=500, help="Requests per URL and server.")
+        parser.add_argument('--concurrency', type=int, default=20, help="Concurrent client connections.")
+        parser.add_argument('--workers', type=int, default=2, help="Worker processes for both servers.")
+        parser.add_argument('--threads', type=int, default=4, help="Threads per WSGI worker.")
+        parser.add_argument('--username', help="User to log in as; defaults to the first superuser.")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username=options['username']) if options['username'] else \
+            User.objects.filter(is_superuser=True).order_by('pk')
+        user = users.first()
+        if user is None:
+            raise CommandError("No user to log in as; pass --username or create a superuser.")
+        client = Client()
+        client.force_login(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        paths = [(name, self.path_for(name)) for name in options['urls']]
+
+        servers = {
+            'wsgi': [
+                'insurance_project.wsgi:application', '--worker-class', 'gthread',
+                '--threads', str(options['threads']),
+            ],
+            'asgi': [
+                'insurance_project.asgi:application',
+                '-c', os.path.join(settings.BASE_DIR, 'insurance_project', 'gunicorn_asgi.py'),
+            ],
+        }
+
+        self.stdout.write(f"{'server':>6} {'url':>20} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+        for label, arguments in servers.items():
+            port = free_port()
+            process = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', *arguments, '--bind', f'127.0.0.1:{port}',
+                 '--workers', str(options['workers']), '--log-level', 'warning'],
+                cwd=settings.BASE_DIR,
+            )
+            try:
+                wait_for_port(port, process)
+                for name, path in paths:
+                    self.load(port, path, cookie, WARMUP_REQUESTS, 1)
+                    elapsed, timings, errors = self.load(port, path, cookie, options['requests'], options['concurrency'])
+                    self.stdout.write(
+                        f"{label:>6} {name:>20} {len(timings) / elapsed:>8.1f} "
+                        f"{statistics.median(timings) * 1000:>8.1f} {percentile(timings, 0.95) * 1000:>8.1f} "
+                        f"{percentile(timings, 0.99) * 1000:>8.1f} {errors:>6}"
+                    )
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+
+    def path_for(self, name):
+        if name == 'customer_detail':
+            customer = Customer.objects.order_by('pk').first()
+            if customer is None:
+                raise CommandError("customer_detail needs at least one customer.")
+            return reverse(name, kwargs={'pk': customer.pk})
+        return reverse(name)
+
+    def load(self, port, path, cookie, requests, concurrency):
+        local = threading.local()
+        headers = {'Cookie': cookie, 'Host': 'localhost'}
+
+        def fetch(_):
+            if not hasattr(local, 'connection'):
+                local.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            start = time.perf_counter()
+            try:
+                local.connection.request('GET', path, headers=headers)
+                response = local.connection.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (OSError, http.client.HTTPException):
+                local.connection.close()
+                del local.connection
+                ok = False
+            return time.perf_counter() - start, ok
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(fetch, range(requests)))
+        elapsed = time.perf_counter() - start
+        timings = [duration for duration, ok in results if ok]
+        errors = len(results) - len(timings)
+        if not timings:
+            raise CommandError(f"Every request to {path} failed.")
+        return elapsed, timings, errors
@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from insurance_app import renewals
+from insurance_app.feeds import expiring_items_feed
+from insurance_app.models import Customer, Insurance, Warranty, Defect
+from insurance_app.summaries import filter_by_status, order_by_status
+from insurance_app.status import EXPIRING_WINDOW_DAYS, status_count_annotations
+
+
+def hot_queries(today):
+    thirty_days_from_now = today + timezone.timedelta(days=EXPIRING_WINDOW_DAYS)
+    customer_ids = list(Customer.objects.values_list('pk', flat=True)[:10]) or ['']
+
+    # (description, queryset, index names that may serve it)
+    return [
+        ("notification_counters: expiring insurances",
+         Insurance.objects.filter(end_period__lte=thirty_days_from_now),
+         ['insurance_end_period_idx', 'insurance_customer_end_period_idx']),
+        ("notification_counters: expiring warranties",
+         Warranty.objects.filter(end_date__lte=thirty_days_from_now),
+         ['warranty_end_date_idx', 'warranty_customer_end_date_idx']),
+        ("notification_counters: expiring defects",
+         Defect.objects.filter(resolution_deadline__lte=thirty_days_from_now),
+         ['defect_deadline_accident_idx']),
+        ("notification_counters: pending renewals",
+         renewals.pending_notices(today),
+         ['renewal_notice_pending_due_idx']),
+        ("renewal engine: active policies",
+         Insurance.objects.filter(end_period__gt=today).values_list('no_insurance', 'starting_period', 'end_period'),
+         ['insurance_end_period_idx']),
+        ("main_page / notification_page: liability periods",
+         Defect.objects.filter(accident_date__isnull=True, resolution_deadline__lte=thirty_days_from_now),
+         ['defect_liability_deadline_idx', 'defect_customer_liability_idx', 'defect_deadline_accident_idx']),
+        ("notification_page: feed",
+         expiring_items_feed(today),
+         ['insurance_end_period_idx', 'warranty_end_date_idx', 'defect_liability_deadline_idx']),
+        ("customer_list: insurance status",
+         Insurance.objects.filter(id_customer__in=customer_ids).values('id_customer')
+         .annotate(**status_count_annotations('end_period', today)).order_by(),
+         ['insurance_customer_end_period_idx']),
+        ("customer_list: warranty status",
+         Warranty.objects.filter(id_customer__in=customer_ids).values('id_customer')
+         .annotate(**status_count_annotations('end_date', today)).order_by(),
+         ['warranty_customer_end_date_idx']),
+        ("customer_list: defect status",
+         Defect.objects.filter(id_customer__in=customer_ids, accident_date__isnull=True).values('id_customer')
+         .annotate(**status_count_annotations('resolution_deadline', today)).order_by(),
+         ['defect_customer_liability_idx']),
+        ("customer_list: filter by status",
+         filter_by_status(Customer.objects.all(), status='red'),
+         ['summary_color_expiry_idx']),
+        ("customer_list: most urgent first",
+         order_by_status(Customer.objects.all(), 'urgency')[:10],
+         ['summary_urgency_idx']),
+        ("customer_list: nearest expiry",
+         order_by_status(Customer.objects.all(), 'next_expiry')[:10],
+         ['summary_next_expiry_idx']),
+        ("defect_list",
+         Defect.objects.filter(accident_date__isnull=False).order_by('status', '-accident_date'),
+         ['defect_accident_status_idx']),
+    ]
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot list/dashboard queries and check they use the indexes from migrations 0003 and 0005-0006."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help="Print every query plan.")
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        failures = []
+
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Small or freshly seeded tables make a sequential scan look
+                # cheapest; this checks the index is usable, not that it wins.
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for description, queryset, index_names in hot_queries(today):
+                plan = queryset.explain()
+                used = [name for name in index_names if name in plan]
+                if used:
+                    self.stdout.write(self.style.SUCCESS(f"OK       {description} ({', '.join(used)})"))
+                else:
+                    failures.append(description)
+                    self.stdout.write(self.style.ERROR(f"NO INDEX {description}"))
+                if options['verbose_plans'] or not used:
+                    self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f"{len(failures)} quer{'y' if len(failures) == 1 else 'ies'} did not use an index.")
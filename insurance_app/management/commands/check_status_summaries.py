@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from insurance_app.summaries import SUMMARY_BATCH_SIZE, find_inconsistent_summaries, refresh_customer_summaries
+
+
+class Command(BaseCommand):
+    help = "Compare every CustomerStatusSummary row with a fresh computation from its insurances, warranties and defects."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Rewrite the rows that are missing or differ.")
+        parser.add_argument('--batch-size', type=int, default=SUMMARY_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        problems = []
+        for customer_id, problem in find_inconsistent_summaries(batch_size=options['batch_size']):
+            problems.append(customer_id)
+            self.stdout.write(f"{customer_id}: {problem}")
+
+        if not problems:
+            self.stdout.write(self.style.SUCCESS("All customer status summaries are consistent."))
+            return
+
+        if not options['fix']:
+            raise CommandError(f"{len(problems)} customer status summary row(s) are inconsistent; rerun with --fix.")
+
+        for start in range(0, len(problems), options['batch_size']):
+            refresh_customer_summaries(problems[start:start + options['batch_size']])
+        self.stdout.write(self.style.SUCCESS(f"Rewrote {len(problems)} customer status summary row(s)."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from insurance_app.cleanup import CLEANUP_BATCH_SIZE, reconcile_files
+
+
+class Command(BaseCommand):
+    help = (
+        "Scan MEDIA_ROOT for customer files no CustomerFile references, queue them for deletion, "
+        "and delete everything in the queue in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report orphans and queued files without deleting anything.")
+        parser.add_argument('--no-scan', action='store_true', help="Only work through the deletion queue.")
+        parser.add_argument('--batch-size', type=int, default=CLEANUP_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        stats = reconcile_files(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            scan=not options['no_scan'],
+            on_orphan=lambda name: self.stdout.write(f"orphan: {name}"),
+        )
+        summary = ', '.join(f"{key}={value}" for key, value in stats.as_dict().items())
+        prefix = "Dry run, nothing deleted: " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(f"{prefix}{summary}"))
@@ -0,0 +1,38 @@
+import csv
+
+from django.core.management.base import BaseCommand
+
+from insurance_app.exports import EXPORT_CHUNK_SIZE, export_queryset, export_rows
+
+
+class Command(BaseCommand):
+    help = "Write every customer with their insurance/warranty/defect status to CSV, streaming in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', default='-', help="File to write, or '-' for stdout.")
+        parser.add_argument('--query', default='')
+        parser.add_argument('--search-field', default='all')
+        parser.add_argument('--sort-by', default='customer_name')
+        parser.add_argument('--status', default='', choices=['', 'red', 'yellow', 'green', 'gray'])
+        parser.add_argument('--expires-within', type=int, default=None, help="Only customers with an item ending within this many days.")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        customers = export_queryset(options['query'], options['search_field'], options['sort_by'], options['status'],
+                                    expires_within=options['expires_within'])
+        rows = export_rows(customers, chunk_size=options['chunk_size'])
+
+        if options['output'] == '-':
+            written = self.write(rows, self.stdout)
+        else:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                written = self.write(rows, output)
+            self.stderr.write(self.style.SUCCESS(f"Exported {written} customer(s) to {options['output']}."))
+
+    def write(self, rows, output):
+        writer = csv.writer(output)
+        written = -1
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+        return written
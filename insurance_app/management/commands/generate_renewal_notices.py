@@ -0,0 +1,18 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from insurance_app import renewals
+
+
+class Command(BaseCommand):
+    help = "Create the InsuranceRenewalNotice rows that have fallen due. Schedule this to run daily."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, default=None,
+                            help="Generate notices as of this date (YYYY-MM-DD) instead of today.")
+        parser.add_argument('--batch-size', type=int, default=renewals.RENEWAL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        created = renewals.generate_due_notices(options['date'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Created {created} renewal notice(s)."))
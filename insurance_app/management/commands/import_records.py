@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from insurance_app.imports import IMPORT_BATCH_SIZE, IMPORTERS, import_records, write_error_report
+
+
+class Command(BaseCommand):
+    help = "Bulk-load customers, insurance policies or warranties from a CSV file, streaming in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help="CSV file to read, or '-' for stdin.")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Validate every row without writing.")
+        parser.add_argument('--errors', help="Write the per-row error report to this CSV file.")
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            result = import_records(options['kind'], sys.stdin, options['batch_size'], options['dry_run'])
+        else:
+            with open(options['path'], newline='', encoding='utf-8-sig') as source:
+                result = import_records(options['kind'], source, options['batch_size'], options['dry_run'])
+
+        if options['errors']:
+            with open(options['errors'], 'w', newline='', encoding='utf-8') as report:
+                write_error_report(result.errors, report)
+        else:
+            for line, message in result.errors:
+                self.stderr.write(f"line {line}: {message}")
+
+        if result.dry_run:
+            summary = f"Dry run: {result.valid} of {result.rows} row(s) valid, {len(result.errors)} error(s)."
+        else:
+            summary = f"Imported {result.created} of {result.rows} row(s), {len(result.errors)} error(s)."
+        self.stdout.write(self.style.SUCCESS(summary) if not result.errors else self.style.WARNING(summary))
@@ -0,0 +1,37 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from insurance_app import jobs
+from insurance_app.models import JobRun
+
+
+class Command(BaseCommand):
+    help = "Run the daily jobs once (schedule this nightly), or with --loop keep running them at JOB_SCHEDULE_TIME."
+
+    def add_arguments(self, parser):
+        parser.add_argument('jobs', nargs='*', help=f"Any of {', '.join(sorted(jobs.JOBS))}; defaults to every daily job.")
+        parser.add_argument('--date', type=date.fromisoformat, default=None,
+                            help="Run as of this date (YYYY-MM-DD) instead of today.")
+        parser.add_argument('--force', action='store_true', help="Run again even if it already succeeded for the date.")
+        parser.add_argument('--loop', action='store_true', help="Stay in the foreground as the scheduler.")
+
+    def handle(self, *args, **options):
+        if options['loop']:
+            self.stdout.write(f"Scheduler started; daily jobs run at {settings.JOB_SCHEDULE_TIME} UTC.")
+            jobs.run_scheduler()
+            return
+
+        unknown = sorted(set(options['jobs']) - set(jobs.JOBS))
+        if unknown:
+            raise CommandError(f"Unknown job(s): {', '.join(unknown)}.")
+
+        for name in options['jobs'] or jobs.DAILY_JOBS:
+            run = jobs.run_job(name, options['date'], force=options['force'])
+            if run is None:
+                self.stdout.write(f"{name}: already ran for this date (use --force to run again).")
+            elif run.status == JobRun.SUCCEEDED:
+                self.stdout.write(self.style.SUCCESS(f"{name}: {run.status} in {run.duration_ms}ms {run.rows}"))
+            else:
+                self.stderr.write(self.style.ERROR(f"{name}: {run.status} in {run.duration_ms}ms {run.error}"))
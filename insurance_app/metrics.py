@@ -0,0 +1,292 @@
+import atexit
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development machines
+    fcntl = None
+
+# Seconds; chosen around the SLOW_REQUEST_THRESHOLD_MS default.
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'insurance_http_requests_total': ('counter', "Requests by URL name, method and status."),
+    'insurance_http_request_duration_seconds': ('histogram', "Request latency by URL name."),
+    'insurance_db_queries_total': ('counter', "SQL queries run while handling requests, by URL name."),
+    'insurance_db_query_seconds_total': ('counter', "Time spent in SQL while handling requests, by URL name."),
+    'insurance_template_seconds_total': ('counter', "Time spent rendering templates, by URL name."),
+    'insurance_cache_requests_total': ('counter', "Application cache lookups by cache and result."),
+}
+
+# <pid>-<start>.json per process; a reused pid gets a new file.
+WORKER_FILE_PATTERN = re.compile(r'^(\d+)-(\d+)\.json$')
+# Totals of processes that have exited, so their counters never go backwards.
+AGGREGATE_FILE = 'aggregate.json'
+LOCK_FILE = '.lock'
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms for one process, written to ``<pid>-<start>.json``
+    in METRICS_DIR at most every METRICS_FLUSH_INTERVAL seconds. Each gunicorn
+    worker owns its file, so flushing needs no cross-process locking; the
+    exposition sums every file in the directory, after folding the files of
+    exited processes into AGGREGATE_FILE.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.started = time.time_ns()
+        self.last_flush = 0.0
+        self.reset()
+
+    def reset(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.dirty = False
+
+    def check_fork(self):
+        # A worker forked from a process that already recorded metrics must
+        # not report the parent's numbers a second time under its own pid.
+        if os.getpid() != self.pid:
+            self.pid = os.getpid()
+            self.started = time.time_ns()
+            self.last_flush = 0.0
+            self.reset()
+
+    @property
+    def filename(self):
+        return f'{self.pid}-{self.started}.json'
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self.check_fork()
+            self.counters[(name, label_key(labels))] += value
+            self.dirty = True
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            self.check_fork()
+            key = (name, label_key(labels))
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * len(LATENCY_BUCKETS) + [0.0, 0]
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram[index] += 1
+                    break
+            histogram[-2] += value
+            histogram[-1] += 1
+            self.dirty = True
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            self.check_fork()
+            self.last_flush = time.monotonic()
+            if not self.dirty:
+                return
+            self.dirty = False
+            data = {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, values] for (name, labels), values in self.histograms.items()],
+            }
+            filename = self.filename
+        write_metrics(settings.METRICS_DIR, filename, data)
+
+    def retire(self):
+        # At exit: fold this process's file into the aggregate. A worker that
+        # is killed instead is folded in by the next collect().
+        self.flush()
+        path = os.path.join(settings.METRICS_DIR, self.filename)
+        if fcntl is not None and os.path.exists(path):
+            with metrics_lock():
+                merge_into_aggregate([path])
+            with self.lock:
+                self.reset()
+
+
+def write_metrics(directory, filename, data):
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as fh:
+        json.dump(data, fh)
+    os.replace(tmp_path, os.path.join(directory, filename))
+
+
+def read_metrics(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def metrics_lock():
+    directory = settings.METRICS_DIR
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        yield
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running under another user.
+        pass
+    return True
+
+
+def exited_worker_files(directory):
+    starts = defaultdict(dict)
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            match = WORKER_FILE_PATTERN.match(entry.name)
+            if match:
+                starts[int(match[1])][int(match[2])] = entry.path
+    exited = []
+    for pid, paths in starts.items():
+        # Only the newest start of a pid can still be running.
+        newest = max(paths)
+        exited += [path for start, path in paths.items() if start != newest]
+        if pid == registry.pid:
+            alive = newest == registry.started
+        else:
+            alive = pid_alive(pid)
+        if not alive:
+            exited.append(paths[newest])
+    return exited
+
+
+def merge_into_aggregate(paths):
+    """Add the files at ``paths`` to AGGREGATE_FILE and remove them; hold metrics_lock()."""
+    counters, histograms = new_totals()
+    aggregate_path = os.path.join(settings.METRICS_DIR, AGGREGATE_FILE)
+    for path in [aggregate_path] + list(paths):
+        data = read_metrics(path)
+        if data is not None:
+            add_metrics(counters, histograms, data)
+    write_metrics(settings.METRICS_DIR, AGGREGATE_FILE, {
+        'counters': [[name, labels, value] for name, values in counters.items() for labels, value in values.items()],
+        'histograms': [[name, labels, value] for name, values in histograms.items() for labels, value in values.items()],
+    })
+    for path in paths:
+        os.remove(path)
+
+
+def new_totals():
+    return defaultdict(lambda: defaultdict(float)), defaultdict(dict)
+
+
+def add_metrics(counters, histograms, data):
+    for name, labels, value in data['counters']:
+        counters[name][tuple(map(tuple, labels))] += value
+    for name, labels, values in data['histograms']:
+        key = tuple(map(tuple, labels))
+        merged = histograms[name].get(key)
+        histograms[name][key] = values if merged is None else [a + b for a, b in zip(merged, values)]
+
+
+registry = MetricsRegistry()
+atexit.register(registry.retire)
+
+
+def record_request(view, method, status, timings):
+    labels = {'view': view}
+    registry.inc('insurance_http_requests_total', {'view': view, 'method': method, 'status': str(status)})
+    registry.observe('insurance_http_request_duration_seconds', labels, timings.total)
+    registry.inc('insurance_db_queries_total', labels, timings.queries)
+    registry.inc('insurance_db_query_seconds_total', labels, timings.db)
+    registry.inc('insurance_template_seconds_total', labels, timings.template)
+    registry.maybe_flush()
+
+
+def record_cache(cache_name, hit):
+    registry.inc('insurance_cache_requests_total', {'cache': cache_name, 'result': 'hit' if hit else 'miss'})
+
+
+def collect():
+    """Merge the files of every process into {name: {labels: value}} (histograms as lists)."""
+    registry.flush()
+    counters, histograms = new_totals()
+    directory = settings.METRICS_DIR
+    if not os.path.isdir(directory):
+        return counters, histograms
+    if fcntl is None:
+        read_all_metrics(directory, counters, histograms)
+        return counters, histograms
+    # Locked so a concurrent scrape never sees a file both merged and still present.
+    with metrics_lock():
+        exited = exited_worker_files(directory)
+        if exited:
+            merge_into_aggregate(exited)
+        read_all_metrics(directory, counters, histograms)
+    return counters, histograms
+
+
+def read_all_metrics(directory, counters, histograms):
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name != AGGREGATE_FILE and not WORKER_FILE_PATTERN.match(entry.name):
+                continue
+            data = read_metrics(entry.path)
+            if data is not None:
+                add_metrics(counters, histograms, data)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_prometheus():
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for labels, value in sorted(counters[name].items()):
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+            continue
+        for labels, values in sorted(histograms[name].items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, values):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{format_labels(labels, [("le", "+Inf")])} {values[-1]}')
+            lines.append(f'{name}_sum{format_labels(labels)} {format_value(values[-2])}')
+            lines.append(f'{name}_count{format_labels(labels)} {values[-1]}')
+    return '\n'.join(lines) + '\n'
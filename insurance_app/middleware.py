@@ -0,0 +1,226 @@
+import json
+import logging
+import random
+import threading
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics
+from .instrumentation import RequestTimings, current_timings, sql_shape
+from .routers import read_database
+
+logger = logging.getLogger(__name__)
+slow_request_logger = logging.getLogger('insurance_app.slow_requests')
+
+
+# The execute_wrappers of the current request, for reads that the view runs
+# on other threads (insurance_app.parallel.gather_reads).
+query_wrappers = ContextVar('query_wrappers', default=())
+
+
+def wrap_queries(stack, wrapper):
+    # Every alias, not only initialized ones: a new server thread has not
+    # opened its connections yet when the request starts.
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+
+
+class QueryWrapperMiddleware:
+    """
+    Base for middleware that wraps every query of a request with
+    execute_wrapper. Subclasses implement begin() (returning the wrapper),
+    end() and optionally cleanup(); both sync and async stacks are supported.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def begin(self, request):
+        raise NotImplementedError
+
+    def end(self, request, response):
+        return response
+
+    def cleanup(self, request):
+        pass
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        wrapper = self.begin(request)
+        token = query_wrappers.set(query_wrappers.get() + (wrapper,))
+        try:
+            with ExitStack() as stack:
+                wrap_queries(stack, wrapper)
+                response = self.get_response(request)
+        finally:
+            query_wrappers.reset(token)
+            self.cleanup(request)
+        return self.end(request, response)
+
+    async def __acall__(self, request):
+        wrapper = self.begin(request)
+        token = query_wrappers.set(query_wrappers.get() + (wrapper,))
+        stack = ExitStack()
+        try:
+            # Async ORM calls run in the request's thread-sensitive executor,
+            # whose connection objects are not this thread's: wrap those.
+            await sync_to_async(wrap_queries)(stack, wrapper)
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            query_wrappers.reset(token)
+            self.cleanup(request)
+        return self.end(request, response)
+
+
+class DuplicateQueryWarningMiddleware(QueryWrapperMiddleware):
+    """
+    DEBUG-only: log a warning when one request runs the same SQL shape
+    DUPLICATE_QUERY_THRESHOLD or more times, which is usually an N+1 from a
+    template following a foreign key.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.threshold = getattr(settings, 'DUPLICATE_QUERY_THRESHOLD', 5)
+
+    def begin(self, request):
+        shapes = request._query_shapes = Counter()
+        lock = threading.Lock()
+
+        def record(execute, sql, params, many, context):
+            with lock:
+                shapes[sql_shape(sql)] += 1
+            return execute(sql, params, many, context)
+        return record
+
+    def end(self, request, response):
+        for shape, count in request._query_shapes.most_common():
+            if count < self.threshold:
+                break
+            logger.warning("%s %s ran the same query %d times: %s", request.method, request.path, count, shape)
+        return response
+
+
+class RequestInstrumentationMiddleware(QueryWrapperMiddleware):
+    """
+    Time every request: query count and DB time through execute_wrapper on
+    each connection, template time (context processors included) through
+    insurance_app.instrumentation.DjangoTemplates, and the rest as view time.
+    Adds a Server-Timing header and logs requests slower than
+    SLOW_REQUEST_THRESHOLD_MS, sampled at SLOW_REQUEST_SAMPLE_RATE, as JSON.
+    The timings stay on request.timings and feed insurance_app.metrics.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.threshold = settings.SLOW_REQUEST_THRESHOLD_MS / 1000
+        self.sample_rate = settings.SLOW_REQUEST_SAMPLE_RATE
+
+    def begin(self, request):
+        timings = request.timings = RequestTimings()
+        request._timings_token = current_timings.set(timings)
+        return timings.record_query
+
+    def cleanup(self, request):
+        current_timings.reset(request._timings_token)
+
+    def end(self, request, response):
+        timings = request.timings
+        timings.finish()
+
+        if settings.METRICS_ENABLED:
+            match = request.resolver_match
+            # URL names, not paths, keep the label set small; unmatched URLs share one label.
+            metrics.record_request(match.view_name if match else '<unresolved>', request.method,
+                                   response.status_code, timings)
+        if settings.SERVER_TIMING_HEADER:
+            response.headers['Server-Timing'] = timings.server_timing()
+        if timings.total >= self.threshold and random.random() < self.sample_rate:
+            self.log_slow_request(request, response, timings)
+        return response
+
+    def log_slow_request(self, request, response, timings):
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(timings.total * 1000, 1),
+            'view_ms': round(timings.view * 1000, 1),
+            'template_ms': round(timings.template * 1000, 1),
+            'db_ms': round(timings.db * 1000, 1),
+            'queries': timings.queries,
+            'duplicate_queries': [
+                {'count': count, 'sql': shape} for shape, count in timings.duplicate_shapes()[:5]
+            ],
+        }
+        slow_request_logger.warning(json.dumps(record), extra={'request_timing': record})
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serve the reads of views marked with routers.reads_from_replica from
+    REPLICA_DATABASE_ALIAS. Any request that may write (POST, PUT, PATCH,
+    DELETE) sets a REPLICA_PIN_SECONDS cookie that keeps the browser's reads
+    on the primary, so the redirect after a save sees the saved row even
+    while the replica lags.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASE_ALIAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.alias = settings.REPLICA_DATABASE_ALIAS
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = read_database.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_database.reset(token)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        token = read_database.set(None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_database.reset(token)
+        return self.pin(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'reads_from_replica', False) and settings.REPLICA_PIN_COOKIE not in request.COOKIES:
+            read_database.set(self.alias)
+
+    def pin(self, request, response):
+        if request.method in ('POST', 'PUT', 'PATCH', 'DELETE'):
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+from insurance_app.indexes import drop_if_invalid
+
+# The Customer table is unmanaged, so these indexes are created with raw SQL.
+# The expressions match the UPPER("col"::text) LIKE UPPER(...) that Django
+# emits for __icontains on PostgreSQL, so customer_list searches can use them.
+# They are built CONCURRENTLY so searches and edits keep working during the
+# build, which is why this migration is not atomic.
+TRIGRAM_INDEXES = {
+    'customer_id_customer_trgm': 'id_customer',
+    'customer_customer_name_trgm': 'customer_name',
+    'customer_address_trgm': 'address',
+    'customer_email_trgm': 'email',
+    'customer_phone_num_trgm': 'phone_num',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for index_name, column in TRIGRAM_INDEXES.items():
+        drop_if_invalid(schema_editor, index_name)
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index_name}" ON "Customer" '
+            f'USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index_name in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('insurance_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations
+
+from insurance_app.indexes import drop_if_invalid
+
+# The tables are unmanaged, so the indexes behind the date-range queries are
+# created with raw SQL. On PostgreSQL they are built CONCURRENTLY, which is why
+# this migration is not atomic. IF NOT EXISTS skips indexes created by hand; an
+# interrupted concurrent build leaves an INVALID index, which is dropped first
+# so the re-run builds it again. Tables that do not exist (a fresh development
+# database, where the unmanaged tables were never created) are skipped.
+DATE_RANGE_INDEXES = [
+    ('insurance_end_period_idx', 'Insurance', '("end_period")'),
+    ('insurance_customer_end_period_idx', 'Insurance', '("id_customer", "end_period")'),
+    ('warranty_end_date_idx', 'Warranty', '("end_date")'),
+    ('warranty_customer_end_date_idx', 'Warranty', '("id_customer", "end_date")'),
+    ('defect_deadline_accident_idx', 'Defect', '("resolution_deadline", "accident_date")'),
+    ('defect_liability_deadline_idx', 'Defect', '("resolution_deadline") WHERE "accident_date" IS NULL'),
+    ('defect_customer_liability_idx', 'Defect', '("id_customer", "resolution_deadline") WHERE "accident_date" IS NULL'),
+    ('defect_accident_status_idx', 'Defect', '("status", "accident_date" DESC) WHERE "accident_date" IS NOT NULL'),
+    ('renewal_notice_pending_due_idx', 'InsuranceRenewalNotice', '("due_date") WHERE NOT "is_dismissed"'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    postgresql = schema_editor.connection.vendor == 'postgresql'
+    concurrently = 'CONCURRENTLY ' if postgresql else ''
+    existing_tables = set(schema_editor.connection.introspection.table_names())
+    for index_name, table, definition in DATE_RANGE_INDEXES:
+        if table not in existing_tables:
+            continue
+        if postgresql:
+            drop_if_invalid(schema_editor, index_name)
+        schema_editor.execute(f'CREATE INDEX {concurrently}IF NOT EXISTS "{index_name}" ON "{table}" {definition}')
+
+
+def drop_indexes(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    for index_name, _, _ in DATE_RANGE_INDEXES:
+        schema_editor.execute(f'DROP INDEX {concurrently}IF EXISTS "{index_name}"')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('insurance_app', '0002_customer_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
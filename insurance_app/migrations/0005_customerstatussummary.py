@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insurance_app', '0004_jobrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStatusSummary',
+            fields=[
+                ('customer', models.OneToOneField(db_column='id_customer', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='status_summary', serialize=False, to='insurance_app.customer')),
+                ('as_of', models.DateField()),
+                ('status_color', models.CharField(default='gray', max_length=10)),
+                ('next_expiry', models.DateField(blank=True, null=True)),
+                ('insurance_color', models.CharField(default='gray', max_length=10)),
+                ('insurance_green', models.PositiveIntegerField(default=0)),
+                ('insurance_yellow', models.PositiveIntegerField(default=0)),
+                ('insurance_red', models.PositiveIntegerField(default=0)),
+                ('insurance_total', models.PositiveIntegerField(default=0)),
+                ('warranty_color', models.CharField(default='gray', max_length=10)),
+                ('warranty_green', models.PositiveIntegerField(default=0)),
+                ('warranty_yellow', models.PositiveIntegerField(default=0)),
+                ('warranty_red', models.PositiveIntegerField(default=0)),
+                ('warranty_total', models.PositiveIntegerField(default=0)),
+                ('defect_color', models.CharField(default='gray', max_length=10)),
+                ('defect_green', models.PositiveIntegerField(default=0)),
+                ('defect_yellow', models.PositiveIntegerField(default=0)),
+                ('defect_red', models.PositiveIntegerField(default=0)),
+                ('defect_total', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'CustomerStatusSummary',
+                'indexes': [models.Index(fields=['status_color', 'next_expiry'], name='summary_color_expiry_idx'), models.Index(fields=['next_expiry'], name='summary_next_expiry_idx')],
+            },
+        ),
+    ]
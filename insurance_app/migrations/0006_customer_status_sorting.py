@@ -0,0 +1,63 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:06
+
+from django.db import migrations, models
+
+STATUS_COLORS = ['red', 'yellow', 'green', 'gray']
+
+
+def backfill_ranks(apps, schema_editor):
+    CustomerStatusSummary = apps.get_model('insurance_app', 'CustomerStatusSummary')
+    updates = {}
+    for prefix in ('status', 'insurance', 'warranty', 'defect'):
+        updates[f'{prefix}_rank'] = models.Case(
+            *[models.When(**{f'{prefix}_color': color}, then=models.Value(rank)) for rank, color in enumerate(STATUS_COLORS)],
+            default=models.Value(len(STATUS_COLORS) - 1),
+        )
+    CustomerStatusSummary.objects.update(**updates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insurance_app', '0005_customerstatussummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerstatussummary',
+            name='defect_rank',
+            field=models.PositiveSmallIntegerField(default=3),
+        ),
+        migrations.AddField(
+            model_name='customerstatussummary',
+            name='insurance_rank',
+            field=models.PositiveSmallIntegerField(default=3),
+        ),
+        migrations.AddField(
+            model_name='customerstatussummary',
+            name='status_rank',
+            field=models.PositiveSmallIntegerField(default=3),
+        ),
+        migrations.AddField(
+            model_name='customerstatussummary',
+            name='warranty_rank',
+            field=models.PositiveSmallIntegerField(default=3),
+        ),
+        migrations.AddIndex(
+            model_name='customerstatussummary',
+            index=models.Index(fields=['status_rank', 'next_expiry', 'customer'], name='summary_urgency_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerstatussummary',
+            index=models.Index(fields=['insurance_rank', 'next_expiry', 'customer'], name='summary_insurance_urgency_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerstatussummary',
+            index=models.Index(fields=['warranty_rank', 'next_expiry', 'customer'], name='summary_warranty_urgency_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerstatussummary',
+            index=models.Index(fields=['defect_rank', 'next_expiry', 'customer'], name='summary_defect_urgency_idx'),
+        ),
+        migrations.RunPython(backfill_ranks, migrations.RunPython.noop),
+    ]
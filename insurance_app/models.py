@@ -1,5 +1,45 @@
 from django.db import models
 
+
+class InsuranceQuerySet(models.QuerySet):
+    def with_customer(self):
+        return self.select_related('id_customer')
+
+    def for_detail_table(self):
+        return self.only('no_insurance', 'ins_co', 'end_period', 'id_customer')
+
+
+class WarrantyQuerySet(models.QuerySet):
+    def with_customer(self):
+        return self.select_related('id_customer')
+
+    def for_detail_table(self):
+        return self.only('warranty_id', 'product_name', 'end_date', 'id_customer')
+
+
+class DefectQuerySet(models.QuerySet):
+    def with_customer(self):
+        return self.select_related('id_customer')
+
+    def for_detail_table(self):
+        return self.only('defect_id', 'report_date', 'resolution_deadline', 'id_customer')
+
+    def for_defect_list(self):
+        return self.with_customer().only(
+            'defect_id', 'status', 'defect_type', 'accident_date', 'resolution_deadline',
+            'id_customer__id_customer', 'id_customer__customer_name',
+        )
+
+
+class InsuranceRenewalNoticeQuerySet(models.QuerySet):
+    def for_notice_list(self):
+        return self.select_related('insurance__id_customer').only(
+            'id', 'renewal_year', 'due_date', 'is_dismissed',
+            'insurance__no_insurance', 'insurance__end_period',
+            'insurance__id_customer__id_customer', 'insurance__id_customer__customer_name',
+        )
+
+
 class Customer(models.Model):
     id_customer = models.CharField(primary_key=True)
     customer_name = models.CharField(max_length=200)
@@ -43,6 +83,8 @@ class Insurance(models.Model):
     status = models.CharField(max_length=50)
     ins_co = models.CharField(max_length=200)
 
+    objects = InsuranceQuerySet.as_manager()
+
     class Meta:
         managed = False
         db_table = 'Insurance'
@@ -55,6 +97,8 @@ class Warranty(models.Model):
     end_date = models.DateField()
     details = models.TextField(blank=True)
 
+    objects = WarrantyQuerySet.as_manager()
+
     class Meta:
         managed = False
         db_table = 'Warranty'
@@ -74,6 +118,8 @@ class Defect(models.Model):
     defect_type = models.CharField(max_length=100, choices=DEFECT_CHOICES, default='Other')
     status = models.CharField(max_length=50, default='Pending')
 
+    objects = DefectQuerySet.as_manager()
+
     class Meta:
         managed = False
         db_table = 'Defect'
@@ -97,10 +143,99 @@ class InsuranceRenewalNotice(models.Model):
     due_date = models.DateField()
     is_dismissed = models.BooleanField(default=False)
 
+    objects = InsuranceRenewalNoticeQuerySet.as_manager()
+
     class Meta:
         managed = False
         db_table = 'InsuranceRenewalNotice'
         unique_together = ('insurance', 'renewal_year')
 
     def __str__(self):
-        return f"{self.insurance.no_insurance} - Renewal for {self.renewal_year}"
\ No newline at end of file
+        return f"{self.insurance.no_insurance} - Renewal for {self.renewal_year}"
+
+class JobRun(models.Model):
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    run_date = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=RUNNING)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    rows = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        db_table = 'JobRun'
+        unique_together = ('name', 'run_date')
+
+    def __str__(self):
+        return f"{self.name} {self.run_date} ({self.status})"
+
+
+class FileDeletion(models.Model):
+    """A stored file waiting for the batched cleanup in insurance_app/cleanup.py to remove it."""
+    name = models.CharField(max_length=255, unique=True)
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'FileDeletion'
+
+    def __str__(self):
+        return self.name
+
+
+class CustomerStatusSummary(models.Model):
+    customer = models.OneToOneField(
+        Customer, primary_key=True, on_delete=models.CASCADE, db_column='id_customer', related_name='status_summary',
+    )
+    as_of = models.DateField()
+    status_color = models.CharField(max_length=10, default='gray')
+    # Position of each color in summaries.STATUS_COLORS (0 = most urgent), for index-backed sorting.
+    status_rank = models.PositiveSmallIntegerField(default=3)
+    next_expiry = models.DateField(null=True, blank=True)
+    insurance_color = models.CharField(max_length=10, default='gray')
+    insurance_rank = models.PositiveSmallIntegerField(default=3)
+    insurance_green = models.PositiveIntegerField(default=0)
+    insurance_yellow = models.PositiveIntegerField(default=0)
+    insurance_red = models.PositiveIntegerField(default=0)
+    insurance_total = models.PositiveIntegerField(default=0)
+    warranty_color = models.CharField(max_length=10, default='gray')
+    warranty_rank = models.PositiveSmallIntegerField(default=3)
+    warranty_green = models.PositiveIntegerField(default=0)
+    warranty_yellow = models.PositiveIntegerField(default=0)
+    warranty_red = models.PositiveIntegerField(default=0)
+    warranty_total = models.PositiveIntegerField(default=0)
+    defect_color = models.CharField(max_length=10, default='gray')
+    defect_rank = models.PositiveSmallIntegerField(default=3)
+    defect_green = models.PositiveIntegerField(default=0)
+    defect_yellow = models.PositiveIntegerField(default=0)
+    defect_red = models.PositiveIntegerField(default=0)
+    defect_total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'CustomerStatusSummary'
+        indexes = [
+            models.Index(fields=['status_color', 'next_expiry'], name='summary_color_expiry_idx'),
+            models.Index(fields=['next_expiry'], name='summary_next_expiry_idx'),
+            models.Index(fields=['status_rank', 'next_expiry', 'customer'], name='summary_urgency_idx'),
+            models.Index(fields=['insurance_rank', 'next_expiry', 'customer'], name='summary_insurance_urgency_idx'),
+            models.Index(fields=['warranty_rank', 'next_expiry', 'customer'], name='summary_warranty_urgency_idx'),
+            models.Index(fields=['defect_rank', 'next_expiry', 'customer'], name='summary_defect_urgency_idx'),
+        ]
+
+    def group_status(self, group):
+        return {
+            'color': getattr(self, f'{group}_color'),
+            'green': getattr(self, f'{group}_green'),
+            'yellow': getattr(self, f'{group}_yellow'),
+            'red': getattr(self, f'{group}_red'),
+            'total': getattr(self, f'{group}_total'),
+        }
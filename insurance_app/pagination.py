@@ -0,0 +1,134 @@
+import base64
+import binascii
+import json
+
+from django.db.models import F, Q
+
+DEFAULT_PAGE_SIZE = 10
+PAGE_SIZE_CHOICES = [10, 25, 50, 100]
+MAX_PAGE_SIZE = 100
+
+
+def get_page_size(value, default=DEFAULT_PAGE_SIZE):
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(values, list) or len(values) != 2:
+        return None
+    # Cursors come back from the client: anything but a plain value would
+    # reach the ORM as a lookup argument (a 500, or a wrong page). The sort
+    # value may be null (a NULL column); the primary key never is.
+    value, pk = values
+    if not (value is None or is_plain_value(value)) or not is_plain_value(pk):
+        return None
+    return values
+
+
+def is_plain_value(value):
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over ``order_field`` with the primary key as tie-breaker.
+    Each page costs one query for page_size + 1 rows and no COUNT(*).
+    NULL sort values come last in either direction, as in ``sort_ordering``.
+    """
+
+    def __init__(self, queryset, order_field, page_size=DEFAULT_PAGE_SIZE):
+        self.queryset = queryset
+        self.descending = order_field.startswith('-')
+        self.field = order_field.lstrip('-')
+        self.page_size = page_size
+
+    def _cursor_for(self, obj):
+        return encode_cursor([getattr(obj, self.field), obj.pk])
+
+    def _seek(self, values, forward):
+        value, pk = values
+        lookup = 'gt' if forward != self.descending else 'lt'
+        is_null = Q(**{f'{self.field}__isnull': True})
+        pk_beyond = Q(**{f'pk__{lookup}': pk})
+        if value is None:
+            # Inside the trailing NULL run: only the primary key moves on,
+            # and stepping back leaves the run for the non-NULL rows.
+            condition = is_null & pk_beyond if forward else ~is_null | (is_null & pk_beyond)
+        else:
+            condition = Q(**{f'{self.field}__{lookup}': value}) | (Q(**{self.field: value}) & pk_beyond)
+            if forward:
+                condition |= is_null
+        return self.queryset.filter(condition)
+
+    def _ordering(self, forward):
+        nulls = {'nulls_last': True} if forward else {'nulls_first': True}
+        if forward != self.descending:
+            return (F(self.field).asc(**nulls), 'pk')
+        return (F(self.field).desc(**nulls), '-pk')
+
+    def page(self, after=None, before=None):
+        after_values = decode_cursor(after)
+        before_values = decode_cursor(before) if after_values is None else None
+        forward = before_values is None
+
+        queryset = self.queryset
+        if after_values is not None:
+            queryset = self._seek(after_values, forward=True)
+        elif before_values is not None:
+            queryset = self._seek(before_values, forward=False)
+
+        rows = list(queryset.order_by(*self._ordering(forward))[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if forward:
+            has_next, has_previous = has_more, after_values is not None
+        else:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+
+        next_cursor = self._cursor_for(rows[-1]) if rows and has_next else None
+        previous_cursor = self._cursor_for(rows[0]) if rows and has_previous else None
+        return KeysetPage(rows, has_next, has_previous, next_cursor, previous_cursor)
@@ -0,0 +1,33 @@
+import asyncio
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .middleware import query_wrappers, wrap_queries
+
+
+def run_read(read):
+    # On a pool thread with connections of its own: checked and closed like a
+    # request's, and wrapped like the request's so the queries are counted.
+    close_old_connections()
+    try:
+        with ExitStack() as stack:
+            for wrapper in query_wrappers.get():
+                wrap_queries(stack, wrapper)
+            return read()
+    finally:
+        close_old_connections()
+
+
+async def gather_reads(*reads):
+    """
+    Run independent, read-only callables at the same time, each on its own
+    thread and database connection, and return their results in order. With
+    ASYNC_PARALLEL_READS off they run one after another in the request's
+    thread-sensitive executor instead, on the request's own connection.
+    """
+    if not settings.ASYNC_PARALLEL_READS:
+        return [await sync_to_async(read)() for read in reads]
+    return await asyncio.gather(*(sync_to_async(run_read, thread_sensitive=False)(read) for read in reads))
@@ -0,0 +1,188 @@
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.html import escape
+
+from .metrics import record_cache
+from .uploads import file_sha256
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tif', '.tiff'}
+PDF_EXTENSIONS = {'.pdf'}
+PREVIEW_CONTENT_TYPE = 'image/jpeg'
+FILE_HASH_CACHE_PREFIX = 'file_sha256'
+FILE_HASH_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+# Eviction trims the cache to this fraction of its limit so it is not deleting on every new preview.
+EVICT_TO_FRACTION = 0.9
+# Running size of the preview directory, so a new preview only scans it once over the limit.
+PREVIEW_BYTES_CACHE_KEY = 'file_preview_bytes'
+# The placeholder stands in until a preview can be made (a file still being
+# restored, a renderer installed later), so browsers keep it only briefly.
+PLACEHOLDER_MAX_AGE = 60 * 5
+
+
+def preview_dir():
+    return settings.FILE_PREVIEW_CACHE_DIR or os.path.join(settings.MEDIA_ROOT, '.previews')
+
+
+def can_preview(name):
+    extension = os.path.splitext(name)[1].lower()
+    if Image is None:
+        return False
+    return extension in IMAGE_EXTENSIONS or (extension in PDF_EXTENSIONS and pypdfium2 is not None)
+
+
+def cached_file_hash(path, stat):
+    # Hashing a multi-MB original on every preview request would cost more
+    # than the preview saves, so the digest is remembered per (path, mtime, size).
+    key = f"{FILE_HASH_CACHE_PREFIX}:{path}:{stat.st_mtime_ns}:{stat.st_size}"
+    digest = cache.get(key)
+    record_cache('file_hash', digest is not None)
+    if digest is None:
+        digest = file_sha256(path)
+        cache.set(key, digest, FILE_HASH_CACHE_TIMEOUT)
+    return digest
+
+
+def render_preview(path, size):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in PDF_EXTENSIONS:
+        document = pypdfium2.PdfDocument(path)
+        try:
+            page = document[0]
+            image = page.render(scale=size / max(page.get_size())).to_pil()
+        finally:
+            document.close()
+    else:
+        image = Image.open(path)
+        # Lets the JPEG decoder downscale while decoding instead of loading every pixel.
+        image.draft('RGB', (size, size))
+    image.thumbnail((size, size))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def get_preview(field_file):
+    """Return the path of a cached JPEG preview for a stored file, or None if it cannot have one."""
+    if not can_preview(field_file.name):
+        return None
+    try:
+        path = field_file.path
+        stat = os.stat(path)
+    except (NotImplementedError, FileNotFoundError):
+        return None
+
+    size = settings.FILE_PREVIEW_SIZE
+    digest = cached_file_hash(path, stat)
+    preview_path = os.path.join(preview_dir(), digest[:2], f'{digest}-{size}.jpg')
+    try:
+        # The mtime doubles as the last-used time for LRU eviction.
+        os.utime(preview_path)
+        return preview_path
+    except FileNotFoundError:
+        pass
+
+    try:
+        image = render_preview(path, size)
+    except Exception:
+        logger.warning("Could not render a preview for %s", field_file.name, exc_info=True)
+        return None
+    os.makedirs(os.path.dirname(preview_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(preview_path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as fh:
+        image.save(fh, 'JPEG', quality=80, optimize=True)
+    os.replace(tmp_path, preview_path)
+    count_preview_bytes(os.path.getsize(preview_path))
+    return preview_path
+
+
+def open_preview(field_file):
+    """Open the cached preview for reading, or return None if the file cannot have one."""
+    for _ in range(2):
+        preview_path = get_preview(field_file)
+        if preview_path is None:
+            return None
+        try:
+            return open(preview_path, 'rb')
+        except FileNotFoundError:
+            # Evicted between get_preview() and here; the next call renders it again.
+            continue
+    return None
+
+
+def placeholder_svg(name):
+    label = (os.path.splitext(name)[1].lstrip('.').upper() or 'FILE')[:4]
+    size = settings.FILE_PREVIEW_SIZE
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" viewBox="0 0 100 100">'
+        '<rect width="100" height="100" rx="8" fill="#f3f4f6"/>'
+        '<path d="M30 18h28l14 14v50H30z" fill="#fff" stroke="#9ca3af" stroke-width="2"/>'
+        f'<text x="51" y="66" font-family="sans-serif" font-size="14" font-weight="bold" fill="#4b5563" '
+        f'text-anchor="middle">{escape(label)}</text></svg>'
+    )
+
+
+def scan_previews():
+    previews = []
+    if not os.path.isdir(preview_dir()):
+        return previews
+    with os.scandir(preview_dir()) as shards:
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            with os.scandir(shard.path) as entries:
+                for entry in entries:
+                    stat = entry.stat()
+                    previews.append((stat.st_mtime, stat.st_size, entry.path))
+    return previews
+
+
+def count_preview_bytes(added):
+    # Per-process caches undercount other workers' previews; the daily
+    # purge_stale_uploads job evicts and recounts from disk.
+    try:
+        total = cache.incr(PREVIEW_BYTES_CACHE_KEY, added)
+    except ValueError:
+        total = sum(size for _, size, _ in scan_previews())
+        cache.set(PREVIEW_BYTES_CACHE_KEY, total, None)
+    if total > settings.FILE_PREVIEW_CACHE_MAX_BYTES:
+        evict_previews()
+
+
+def evict_previews(max_bytes=None):
+    """Delete the least recently used previews once the cache is over FILE_PREVIEW_CACHE_MAX_BYTES."""
+    if max_bytes is None:
+        max_bytes = settings.FILE_PREVIEW_CACHE_MAX_BYTES
+    previews = scan_previews()
+    total = sum(size for _, size, _ in previews)
+    if total <= max_bytes:
+        cache.set(PREVIEW_BYTES_CACHE_KEY, total, None)
+        return 0
+
+    evicted = 0
+    for _, size, path in sorted(previews):
+        if total <= max_bytes * EVICT_TO_FRACTION:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        evicted += 1
+    cache.set(PREVIEW_BYTES_CACHE_KEY, total, None)
+    return evicted
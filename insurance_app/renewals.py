@@ -0,0 +1,148 @@
+from datetime import date
+
+from django.db import connections, router
+from django.utils import timezone
+
+from .models import Insurance, InsuranceRenewalNotice
+from . import counters
+
+RENEWAL_BATCH_SIZE = 1000
+# Rows per INSERT statement; four parameters each stays under SQLite's variable limit.
+INSERT_BATCH_SIZE = 500
+NOTICE_FIELDS = ('insurance', 'renewal_year', 'due_date', 'is_dismissed')
+
+
+def renewal_due_date(end_period, year):
+    try:
+        return end_period.replace(year=year)
+    except ValueError:
+        # Policies ending on 29 February renew on the 28th in common years.
+        return date(year, 2, 28)
+
+
+def due_renewal_years(starting_period, end_period, today):
+    for year in range(starting_period.year + 1, end_period.year + 1):
+        due_date = renewal_due_date(end_period, year)
+        if due_date > today:
+            break
+        yield year, due_date
+
+
+def _create_missing_notices(policies, today):
+    existing = set(
+        InsuranceRenewalNotice.objects.filter(
+            insurance_id__in=[no_insurance for no_insurance, _, _ in policies]
+        ).values_list('insurance_id', 'renewal_year')
+    )
+
+    notices = []
+    for no_insurance, starting_period, end_period in policies:
+        for year, due_date in due_renewal_years(starting_period, end_period, today):
+            if (no_insurance, year) in existing:
+                continue
+            notices.append(InsuranceRenewalNotice(
+                insurance_id=no_insurance,
+                renewal_year=year,
+                due_date=due_date,
+                is_dismissed=False,
+            ))
+
+    return insert_notices(notices)
+
+
+def insert_notices(notices):
+    """
+    Insert notices, skipping any (insurance, renewal_year) another run has
+    already written, and return how many rows were actually inserted.
+    bulk_create(ignore_conflicts=True) cannot report that, so this issues
+    INSERT ... ON CONFLICT DO NOTHING (PostgreSQL and SQLite) and sums the
+    row counts.
+    """
+    if not notices:
+        return 0
+    meta = InsuranceRenewalNotice._meta
+    connection = connections[router.db_for_write(InsuranceRenewalNotice)]
+    quote = connection.ops.quote_name
+    fields = [meta.get_field(name) for name in NOTICE_FIELDS]
+    columns = ', '.join(quote(field.column) for field in fields)
+    row = '(' + ', '.join(['%s'] * len(fields)) + ')'
+
+    inserted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(notices), INSERT_BATCH_SIZE):
+            batch = notices[start:start + INSERT_BATCH_SIZE]
+            params = []
+            for notice in batch:
+                params += [field.get_db_prep_save(field.value_from_object(notice), connection) for field in fields]
+            cursor.execute(
+                f"INSERT INTO {quote(meta.db_table)} ({columns}) VALUES {', '.join([row] * len(batch))} "
+                "ON CONFLICT DO NOTHING",
+                params,
+            )
+            inserted += cursor.rowcount
+    return inserted
+
+
+def generate_due_notices(today=None, batch_size=RENEWAL_BATCH_SIZE):
+    if today is None:
+        today = timezone.now().date()
+
+    active_policies = (
+        Insurance.objects.filter(end_period__gt=today)
+        .values_list('no_insurance', 'starting_period', 'end_period')
+        .order_by()
+    )
+
+    created = 0
+    batch = []
+    for policy in active_policies.iterator(chunk_size=batch_size):
+        batch.append(policy)
+        if len(batch) >= batch_size:
+            created += _create_missing_notices(batch, today)
+            batch = []
+    if batch:
+        created += _create_missing_notices(batch, today)
+
+    if created:
+        # bulk_create() does not send post_save, so the sidebar badge is reset here.
+        counters.invalidate_notification_counters(today)
+    return created
+
+
+def pending_notices(today=None):
+    if today is None:
+        today = timezone.now().date()
+    return InsuranceRenewalNotice.objects.filter(
+        is_dismissed=False,
+        due_date__lte=today,
+        insurance__end_period__gt=today,
+    )
+
+
+def pending_renewal_count(today=None):
+    return pending_notices(today).count()
+
+
+def live_pending_renewal_count(today=None, batch_size=RENEWAL_BATCH_SIZE):
+    """
+    pending_renewal_count() for a day whose notices may not have been
+    generated yet: every due renewal year of an active policy counts unless
+    its notice was dismissed. Reads only.
+    """
+    if today is None:
+        today = timezone.now().date()
+    dismissed = set(
+        InsuranceRenewalNotice.objects.filter(is_dismissed=True, insurance__end_period__gt=today)
+        .values_list('insurance_id', 'renewal_year')
+    )
+    active_policies = (
+        Insurance.objects.filter(end_period__gt=today)
+        .values_list('no_insurance', 'starting_period', 'end_period')
+        .order_by()
+    )
+    count = 0
+    for no_insurance, starting_period, end_period in active_policies.iterator(chunk_size=batch_size):
+        for year, _ in due_renewal_years(starting_period, end_period, today):
+            if (no_insurance, year) not in dismissed:
+                count += 1
+    return count
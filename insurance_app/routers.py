@@ -0,0 +1,63 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# The alias reads go to for the current request; None means the primary.
+read_database = ContextVar('read_database', default=None)
+
+# Read just before a write decides what the write does, so a lagging replica
+# would run a job twice.
+PRIMARY_ONLY_MODELS = {'insurance_app.jobrun'}
+
+
+def reads_from_replica(view):
+    """Mark a view whose reads may be served by REPLICA_DATABASE_ALIAS; see ReplicaRoutingMiddleware."""
+    view.reads_from_replica = True
+    return view
+
+
+def keep_read_database(iterable):
+    """
+    Iterate with the current request's read alias. A streamed response is
+    consumed after ReplicaRoutingMiddleware has reset it, so without this its
+    queries would all go to the primary.
+    """
+    alias = read_database.get()
+    iterator = iter(iterable)
+    while True:
+        token = read_database.set(alias)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            read_database.reset(token)
+        yield item
+
+
+class ReplicaRouter:
+    """
+    Send insurance_app reads to the replica while a read-only view is
+    running. Writes, reads inside a transaction and reads from any other app
+    (sessions, auth) always use the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = read_database.get()
+        if alias is None or model._meta.app_label != 'insurance_app' or model._meta.label_lower in PRIMARY_ONLY_MODELS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication.
+        return db != settings.REPLICA_DATABASE_ALIAS
@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+SEARCH_FIELDS = {
+    'id': 'id_customer',
+    'name': 'customer_name',
+    'address': 'address',
+    'email': 'email',
+    'phone': 'phone_num',
+}
+
+CUSTOMER_SORT_FIELDS = ['id_customer', 'customer_name', 'email', 'phone_num']
+
+
+def clean_sort(sort_by, default='customer_name'):
+    if sort_by and sort_by.lstrip('-') in CUSTOMER_SORT_FIELDS:
+        return sort_by
+    return default
+
+
+def sort_ordering(sort_by):
+    # NULLs last either way, matching the keyset cursor's order.
+    field = F(sort_by.lstrip('-'))
+    if sort_by.startswith('-'):
+        return (field.desc(nulls_last=True), '-pk')
+    return (field.asc(nulls_last=True), 'pk')
+
+
+class BasicSearchBackend:
+    """Portable ``icontains`` search; works on every database Django supports."""
+
+    name = 'basic'
+
+    def get_fields(self, search_field):
+        if search_field in SEARCH_FIELDS:
+            return [SEARCH_FIELDS[search_field]]
+        return list(SEARCH_FIELDS.values())
+
+    def filter(self, queryset, query, search_field='all'):
+        condition = Q()
+        for field in self.get_fields(search_field):
+            condition |= Q(**{f'{field}__icontains': query})
+        return queryset.filter(condition)
+
+    def rank(self, queryset, query, search_field='all'):
+        whens = []
+        for field in self.get_fields(search_field):
+            whens.append(When(**{f'{field}__iexact': query}, then=Value(3)))
+        for field in self.get_fields(search_field):
+            whens.append(When(**{f'{field}__istartswith': query}, then=Value(2)))
+        return queryset.annotate(
+            search_rank=Case(*whens, default=Value(1), output_field=IntegerField())
+        )
+
+
+class TrigramSearchBackend(BasicSearchBackend):
+    """
+    PostgreSQL search served by the pg_trgm GIN indexes from migration 0002.
+    The filter is unchanged, so both backends return the same rows; ranking
+    uses trigram word similarity instead of exact/prefix buckets.
+    """
+
+    name = 'trigram'
+
+    def rank(self, queryset, query, search_field='all'):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        similarities = [TrigramWordSimilarity(query, field) for field in self.get_fields(search_field)]
+        if len(similarities) == 1:
+            return queryset.annotate(search_rank=similarities[0])
+        return queryset.annotate(search_rank=Greatest(*similarities))
+
+
+SEARCH_BACKENDS = {
+    BasicSearchBackend.name: BasicSearchBackend,
+    TrigramSearchBackend.name: TrigramSearchBackend,
+}
+
+
+def get_search_backend(name=None):
+    if name is None:
+        name = settings.CUSTOMER_SEARCH_BACKEND
+    if name == 'auto':
+        name = 'trigram' if connection.vendor == 'postgresql' else 'basic'
+    try:
+        return SEARCH_BACKENDS[name]()
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"CUSTOMER_SEARCH_BACKEND must be 'auto' or one of {', '.join(SEARCH_BACKENDS)}, not {name!r}."
+        ) from None
@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cleanup import queue_file_deletions
+from .models import Customer, CustomerFile, Insurance, Warranty, Defect, InsuranceRenewalNotice
+from .counters import invalidate_notification_counters
+from .dashboard import invalidate_dashboard_stats
+from .fragments import bump_customer_versions
+from .summaries import refresh_customer_summaries
+
+
+@receiver(post_save, sender=Insurance)
+@receiver(post_delete, sender=Insurance)
+@receiver(post_save, sender=Warranty)
+@receiver(post_delete, sender=Warranty)
+@receiver(post_save, sender=Defect)
+@receiver(post_delete, sender=Defect)
+@receiver(post_save, sender=InsuranceRenewalNotice)
+@receiver(post_delete, sender=InsuranceRenewalNotice)
+def invalidate_counters_on_change(sender, **kwargs):
+    # After commit, so a concurrent request cannot re-cache the old count.
+    transaction.on_commit(invalidate_notification_counters)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_save, sender=Insurance)
+@receiver(post_delete, sender=Insurance)
+@receiver(post_save, sender=Warranty)
+@receiver(post_delete, sender=Warranty)
+@receiver(post_save, sender=Defect)
+@receiver(post_delete, sender=Defect)
+def invalidate_dashboard_on_change(sender, **kwargs):
+    # After commit, so a concurrent request cannot re-cache the old figures.
+    transaction.on_commit(invalidate_dashboard_stats)
+
+
+@receiver(post_save, sender=Insurance)
+@receiver(post_delete, sender=Insurance)
+@receiver(post_save, sender=Warranty)
+@receiver(post_delete, sender=Warranty)
+@receiver(post_save, sender=Defect)
+@receiver(post_delete, sender=Defect)
+def refresh_summary_on_change(sender, instance, **kwargs):
+    # Deferred to commit so a cascading customer delete has finished and the
+    # refresh drops the summary instead of recreating it.
+    customer_id = instance.id_customer_id
+    transaction.on_commit(lambda: refresh_customer_summaries([customer_id]))
+
+
+@receiver(post_save, sender=Customer)
+def create_summary_for_customer(sender, instance, created, **kwargs):
+    if created:
+        customer_id = instance.pk
+        transaction.on_commit(lambda: refresh_customer_summaries([customer_id]))
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_save, sender=Insurance)
+@receiver(post_delete, sender=Insurance)
+@receiver(post_save, sender=Warranty)
+@receiver(post_delete, sender=Warranty)
+@receiver(post_save, sender=Defect)
+@receiver(post_delete, sender=Defect)
+@receiver(post_save, sender=CustomerFile)
+@receiver(post_delete, sender=CustomerFile)
+def bump_customer_version_on_change(sender, instance, **kwargs):
+    # After commit, so a concurrent request cannot cache the old rows under the new stamp.
+    customer_id = instance.pk if sender is Customer else instance.id_customer_id
+    transaction.on_commit(lambda: bump_customer_versions([customer_id]))
+
+
+@receiver(post_delete, sender=CustomerFile)
+def queue_deleted_customer_file(sender, instance, **kwargs):
+    # Queued in the deleting transaction (also for customer cascades) and
+    # removed from storage later by cleanup.process_file_deletions().
+    if instance.file.name:
+        queue_file_deletions([instance.file.name])
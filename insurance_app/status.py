@@ -0,0 +1,104 @@
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Insurance, Warranty, Defect
+
+EXPIRING_WINDOW_DAYS = 30
+
+# (attribute set on each customer, model, end date field, extra filters)
+STATUS_GROUPS = (
+    ('insurance_status', Insurance, 'end_period', {}),
+    ('warranty_status', Warranty, 'end_date', {}),
+    ('defect_status', Defect, 'resolution_deadline', {'accident_date__isnull': True}),
+)
+
+
+def get_status_color(end_date, today=None):
+    if today is None:
+        today = timezone.now().date()
+    thirty_days_from_now = today + timezone.timedelta(days=EXPIRING_WINDOW_DAYS)
+
+    if end_date < today:
+        return 'red'
+    if today <= end_date <= thirty_days_from_now:
+        return 'yellow'
+    return 'green'
+
+
+def empty_group_status():
+    return {'color': 'gray', 'green': 0, 'yellow': 0, 'red': 0, 'gray': 0, 'total': 0}
+
+
+def summarize_status_counts(status_counts, total):
+    """
+    Summarize one group's color counts. Items without an end date (a defect
+    with no resolution_deadline) count towards ``total`` but fall in no
+    color, so they never change the color; a group with only such items is
+    gray, like a group with no items.
+    """
+    if not total:
+        return empty_group_status()
+
+    summary_color = 'green'
+    statuses_present = {s for s, count in status_counts.items() if count > 0}
+
+    if not statuses_present:
+        summary_color = 'gray'
+    elif 'yellow' in statuses_present:
+        summary_color = 'yellow'
+    elif 'red' in statuses_present and 'green' in statuses_present:
+        summary_color = 'yellow'
+    elif statuses_present == {'green'}:
+        summary_color = 'green'
+    elif statuses_present == {'red'}:
+        summary_color = 'red'
+
+    return {
+        'color': summary_color,
+        'green': status_counts['green'],
+        'yellow': status_counts['yellow'],
+        'red': status_counts['red'],
+        'total': total
+    }
+
+
+def status_count_annotations(date_field, today):
+    thirty_days_from_now = today + timezone.timedelta(days=EXPIRING_WINDOW_DAYS)
+    return {
+        'red': Count('pk', filter=Q(**{f'{date_field}__lt': today})),
+        'yellow': Count('pk', filter=Q(**{f'{date_field}__gte': today, f'{date_field}__lte': thirty_days_from_now})),
+        'green': Count('pk', filter=Q(**{f'{date_field}__gt': thirty_days_from_now})),
+        'total': Count('pk'),
+    }
+
+
+def group_status_by_customer(model, date_field, customer_ids, today, **filters):
+    rows = (
+        model.objects.filter(id_customer__in=customer_ids, **filters)
+        .values('id_customer')
+        .annotate(**status_count_annotations(date_field, today))
+        .order_by()
+    )
+    return {
+        row['id_customer']: summarize_status_counts(
+            {'green': row['green'], 'yellow': row['yellow'], 'red': row['red']},
+            row['total'],
+        )
+        for row in rows
+    }
+
+
+def attach_group_statuses(customers, today=None):
+    if today is None:
+        today = timezone.now().date()
+
+    customers = list(customers)
+    customer_ids = [customer.pk for customer in customers]
+    if not customer_ids:
+        return customers
+
+    for attr, model, date_field, filters in STATUS_GROUPS:
+        statuses = group_status_by_customer(model, date_field, customer_ids, today, **filters)
+        for customer in customers:
+            setattr(customer, attr, statuses.get(customer.pk) or empty_group_status())
+    return customers
@@ -0,0 +1,273 @@
+from datetime import date
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Case, DateField, F, Min, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Least, NullIf
+from django.utils import timezone
+
+from .models import Customer, CustomerStatusSummary
+from .status import (
+    EXPIRING_WINDOW_DAYS, STATUS_GROUPS, empty_group_status, status_count_annotations, summarize_status_counts,
+)
+
+SUMMARY_BATCH_SIZE = 1000
+# Most to least urgent; the index is stored as each summary color's rank.
+STATUS_COLORS = ['red', 'yellow', 'green', 'gray']
+SUMMARY_GROUPS = [attr.replace('_status', '') for attr, _, _, _ in STATUS_GROUPS]
+# sort_by value -> summary rank column (None: nearest expiry only)
+STATUS_SORT_FIELDS = {
+    'urgency': 'status_rank',
+    'insurance_status': 'insurance_rank',
+    'warranty_status': 'warranty_rank',
+    'defect_status': 'defect_rank',
+    'next_expiry': None,
+}
+EXPIRES_WITHIN_CHOICES = [7, 30, 90]
+SUMMARY_VALUE_FIELDS = ['status_color', 'status_rank', 'next_expiry'] + [
+    f'{group}_{column}' for group in SUMMARY_GROUPS for column in ('color', 'rank', 'green', 'yellow', 'red', 'total')
+]
+# Prefix of the columns filter_by_status/order_by_status read: the stored
+# summary, or the annotations from annotate_live_status().
+SUMMARY_PREFIX = 'status_summary__'
+LIVE_PREFIX = 'live_'
+
+
+def compute_summaries(customer_ids, today):
+    group_statuses = {customer_id: {} for customer_id in customer_ids}
+    next_expiry = {}
+
+    for (attr, model, date_field, filters), group in zip(STATUS_GROUPS, SUMMARY_GROUPS):
+        rows = (
+            model.objects.filter(id_customer__in=customer_ids, **filters)
+            .values('id_customer')
+            .annotate(
+                **status_count_annotations(date_field, today),
+                next_expiry=Min(date_field, filter=Q(**{f'{date_field}__gte': today})),
+            )
+            .order_by()
+        )
+        for row in rows:
+            customer_id = row['id_customer']
+            group_statuses[customer_id][group] = summarize_status_counts(
+                {'green': row['green'], 'yellow': row['yellow'], 'red': row['red']},
+                row['total'],
+            )
+            if row['next_expiry'] and (customer_id not in next_expiry or row['next_expiry'] < next_expiry[customer_id]):
+                next_expiry[customer_id] = row['next_expiry']
+
+    summaries = []
+    for customer_id, statuses in group_statuses.items():
+        summary = CustomerStatusSummary(customer_id=customer_id, as_of=today, next_expiry=next_expiry.get(customer_id))
+        combined = {'green': 0, 'yellow': 0, 'red': 0}
+        for group in SUMMARY_GROUPS:
+            status = statuses.get(group) or empty_group_status()
+            for column in ('color', 'green', 'yellow', 'red', 'total'):
+                setattr(summary, f'{group}_{column}', status[column])
+            setattr(summary, f'{group}_rank', STATUS_COLORS.index(status['color']))
+            for color in combined:
+                combined[color] += status[color]
+        summary.status_color = summarize_status_counts(combined, sum(combined.values()))['color']
+        summary.status_rank = STATUS_COLORS.index(summary.status_color)
+        summaries.append(summary)
+    return summaries
+
+
+def refresh_customer_summaries(customer_ids, today=None):
+    if today is None:
+        today = timezone.now().date()
+    customer_ids = set(customer_ids)
+    existing = list(Customer.objects.filter(pk__in=customer_ids).values_list('pk', flat=True))
+    summaries = compute_summaries(existing, today)
+
+    with transaction.atomic():
+        if summaries:
+            CustomerStatusSummary.objects.bulk_create(
+                summaries,
+                update_conflicts=True,
+                unique_fields=['customer'],
+                update_fields=['as_of'] + SUMMARY_VALUE_FIELDS,
+            )
+        removed = customer_ids.difference(existing)
+        if removed:
+            CustomerStatusSummary.objects.filter(customer_id__in=removed).delete()
+    return summaries
+
+
+def customer_id_batches(batch_size=SUMMARY_BATCH_SIZE):
+    batch = []
+    for customer_id in Customer.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=batch_size):
+        batch.append(customer_id)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def rebuild_summaries(today=None, batch_size=SUMMARY_BATCH_SIZE):
+    if today is None:
+        today = timezone.now().date()
+    rebuilt = 0
+    for batch in customer_id_batches(batch_size):
+        rebuilt += len(refresh_customer_summaries(batch, today))
+    return rebuilt
+
+
+def find_inconsistent_summaries(today=None, batch_size=SUMMARY_BATCH_SIZE):
+    """Yield (customer_id, problem) for every stored summary that differs from a fresh computation."""
+    if today is None:
+        today = timezone.now().date()
+    for batch in customer_id_batches(batch_size):
+        stored = CustomerStatusSummary.objects.in_bulk(batch)
+        for fresh in compute_summaries(batch, today):
+            summary = stored.get(fresh.customer_id)
+            if summary is None:
+                yield fresh.customer_id, 'missing'
+                continue
+            fields = [field for field in SUMMARY_VALUE_FIELDS if getattr(summary, field) != getattr(fresh, field)]
+            if fields:
+                yield fresh.customer_id, f"differs in {', '.join(fields)}"
+
+
+def attach_summary_statuses(customers, today=None):
+    """
+    Set insurance_status/warranty_status/defect_status from the summary rows
+    loaded with select_related('status_summary'); missing or stale rows on
+    the page are computed in one batch but not saved, so request handlers
+    stay read-only.
+    """
+    if today is None:
+        today = timezone.now().date()
+
+    customers = list(customers)
+    stale = [c.pk for c in customers if getattr(c, 'status_summary', None) is None or c.status_summary.as_of != today]
+    fresh = {summary.customer_id: summary for summary in compute_summaries(stale, today)} if stale else {}
+
+    for customer in customers:
+        summary = fresh.get(customer.pk) or customer.status_summary
+        customer.status_summary = summary
+        for group in SUMMARY_GROUPS:
+            setattr(customer, f'{group}_status', summary.group_status(group))
+    return customers
+
+
+def is_status_sort(sort_by):
+    return bool(sort_by) and sort_by.lstrip('-') in STATUS_SORT_FIELDS
+
+
+def uses_summaries(sort_by, status='', group_statuses=None, expires_within=None):
+    """Whether the list is filtered or sorted on status, from summaries rebuilt today or annotate_live_status()."""
+    return (
+        is_status_sort(sort_by)
+        or status in STATUS_COLORS
+        or any(color in STATUS_COLORS for color in (group_statuses or {}).values())
+        or bool(expires_within)
+    )
+
+
+def order_by_status(customers, sort_by, prefix=SUMMARY_PREFIX):
+    """
+    Order customers by a summary status rank (most urgent first, '-' for
+    least) and then by their nearest upcoming expiry, customers with none
+    last. next_expiry spans every group, so one group's color mixes set and
+    empty values. Ascending, the inner join lets PostgreSQL walk the
+    (rank, next_expiry, customer) index, whose NULLs sort last, and stop
+    after one page.
+    """
+    descending = sort_by.startswith('-')
+    if prefix == SUMMARY_PREFIX:
+        customers = customers.filter(status_summary__isnull=False)
+        tie_breaker = 'status_summary__customer'
+    else:
+        tie_breaker = 'pk'
+    rank_field = STATUS_SORT_FIELDS[sort_by.lstrip('-')]
+    next_expiry = F(f'{prefix}next_expiry')
+    ordering = [
+        next_expiry.desc(nulls_last=True) if descending else next_expiry.asc(nulls_last=True),
+        f'-{tie_breaker}' if descending else tie_breaker,
+    ]
+    if rank_field is not None:
+        ordering.insert(0, f'-{prefix}{rank_field}' if descending else f'{prefix}{rank_field}')
+    return customers.order_by(*ordering)
+
+
+def filter_by_status(customers, status='', group_statuses=None, expires_within=None, today=None,
+                     prefix=SUMMARY_PREFIX):
+    if status in STATUS_COLORS:
+        customers = customers.filter(**{f'{prefix}status_color': status})
+    for group, color in (group_statuses or {}).items():
+        if group in SUMMARY_GROUPS and color in STATUS_COLORS:
+            customers = customers.filter(**{f'{prefix}{group}_color': color})
+    if expires_within:
+        if today is None:
+            today = timezone.now().date()
+        customers = customers.filter(
+            **{f'{prefix}next_expiry__lte': today + timezone.timedelta(days=expires_within)},
+        )
+    return customers
+
+
+# Which colors a set of items shows, as bits: OR-ing two sets' masks gives the
+# mask of their union, so the combined status needs no further counting.
+COLOR_BITS = {'red': 1, 'yellow': 2, 'green': 4}
+# mask -> color, by the same rules summarize_status_counts() applies to counts.
+MASK_COLORS = {
+    mask: summarize_status_counts({color: mask & bit for color, bit in COLOR_BITS.items()}, 1)['color']
+    for mask in range(8)
+}
+
+
+def _mask_case(mask_field, values):
+    return Case(
+        *[When(**{f'{mask_field}__in': [mask for mask, c in MASK_COLORS.items() if c == color]}, then=Value(value))
+          for color, value in values.items() if color != 'gray'],
+        default=Value(values['gray']),
+    )
+
+
+def annotate_live_status(customers, today):
+    """
+    Alias the summary columns as live_<column>, computed from the items
+    themselves, for filtering and sorting before today's summaries are
+    rebuilt. Only the columns a filter or ordering uses reach the SQL.
+    """
+    far_future = Value(date.max, output_field=DateField())
+    thirty_days_from_now = today + timezone.timedelta(days=EXPIRING_WINDOW_DAYS)
+    masks, next_expiries = {}, []
+    for (attr, model, date_field, filters), group in zip(STATUS_GROUPS, SUMMARY_GROUPS):
+        items = model.objects.filter(id_customer=OuterRef('pk'), **filters).order_by().values('id_customer')
+        color_bit = Case(
+            When(**{f'{date_field}__lt': today}, then=Value(COLOR_BITS['red'])),
+            When(**{f'{date_field}__lte': thirty_days_from_now}, then=Value(COLOR_BITS['yellow'])),
+            When(**{f'{date_field}__gt': thirty_days_from_now}, then=Value(COLOR_BITS['green'])),
+            default=Value(0),
+        )
+        # The sum of the distinct bits is their OR.
+        masks[f'{LIVE_PREFIX}{group}_mask'] = Coalesce(
+            Subquery(items.annotate(mask=Sum(color_bit, distinct=True)).values('mask')), 0,
+        )
+        next_expiries.append(Coalesce(
+            Subquery(items.filter(**{f'{date_field}__gte': today}).annotate(first=Min(date_field)).values('first')),
+            far_future,
+        ))
+    customers = customers.alias(**masks).alias(**{
+        f'{LIVE_PREFIX}status_mask': reduce(lambda a, b: a.bitor(b), [F(name) for name in masks]),
+        f'{LIVE_PREFIX}next_expiry': NullIf(Least(*next_expiries), far_future),
+    })
+
+    ranks = {color: rank for rank, color in enumerate(STATUS_COLORS)}
+    columns = {}
+    for column in ['status', *SUMMARY_GROUPS]:
+        mask_field = f'{LIVE_PREFIX}{column}_mask'
+        columns[f'{LIVE_PREFIX}{column}_color'] = _mask_case(mask_field, {color: color for color in STATUS_COLORS})
+        columns[f'{LIVE_PREFIX}{column}_rank'] = _mask_case(mask_field, ranks)
+    return customers.alias(**columns)
+
+
+def get_expires_within(value):
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        return None
+    return days if days in EXPIRES_WITHIN_CHOICES else None
@@ -0,0 +1,40 @@
+import shutil
+import tempfile
+
+from django.apps import apps
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from . import metrics
+
+
+class UnmanagedModelTestRunner(DiscoverRunner):
+    """
+    The insurance_app tables are created outside Django, so the test database
+    would otherwise have none of them. Mark the models as managed and build the
+    app's tables from the models instead of from its raw-SQL migrations.
+
+    Request metrics go to a METRICS_DIR of the run's own, removed afterwards,
+    so test requests never reach the real workers' totals. Parallel reads are
+    off: a TestCase's rows are uncommitted, so other threads' connections
+    cannot see them. Tests of the parallel path turn it back on.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.metrics_dir = tempfile.mkdtemp(prefix='insurance-test-metrics-')
+        self.metrics_settings = override_settings(METRICS_DIR=self.metrics_dir, ASYNC_PARALLEL_READS=False)
+        self.metrics_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        # Drop what is left unflushed, or the exit hook writes it to the real METRICS_DIR.
+        metrics.registry.reset()
+        self.metrics_settings.disable()
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
+
+    def setup_databases(self, **kwargs):
+        for model in apps.get_app_config('insurance_app').get_models():
+            model._meta.managed = True
+        with override_settings(MIGRATION_MODULES={'insurance_app': None}):
+            return super().setup_databases(**kwargs)
@@ -1,3 +1,1675 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+from django.db.models import F, Value
+from django.db.models.functions import NullIf
+from django.http import HttpResponse
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from . import imports, metrics, previews, renewals, urls as app_urls
+from .counters import get_notification_counters
+from .dashboard import get_dashboard_stats
+from .fragments import customer_fragment_stamp, seconds_until_tomorrow
+from .jobs import run_job
+from .middleware import DuplicateQueryWarningMiddleware, ReplicaRoutingMiddleware
+from .cleanup import reconcile_files
+from .exports import export_header
+from .feeds import FEED_SOURCES, expiring_items_feed, feed_row_to_item
+from .imports import import_records
+from .models import (
+    Customer, CustomerStatusSummary, Insurance, Warranty, Defect, CustomerFile, FileDeletion, InsuranceRenewalNotice,
+    JobRun,
+)
+from .pagination import KeysetPaginator, encode_cursor
+from .parallel import gather_reads
+from .search import BasicSearchBackend, TrigramSearchBackend, get_search_backend
+from .renewals import generate_due_notices, insert_notices, renewal_due_date
+from .status import STATUS_GROUPS, attach_group_statuses, get_status_color
+from .routers import read_database, reads_from_replica
+from .summaries import (
+    EXPIRES_WITHIN_CHOICES, STATUS_COLORS, STATUS_SORT_FIELDS, SUMMARY_GROUPS, rebuild_summaries,
+)
+from .uploads import UploadSession
+
+# Synthetic data volume; raise these to benchmark against a larger book.
+BENCHMARK_CUSTOMERS = int(os.environ.get('BENCHMARK_CUSTOMERS', 12))
+BENCHMARK_POLICY_YEARS = int(os.environ.get('BENCHMARK_POLICY_YEARS', 3))
+BENCHMARK_WARRANTIES = int(os.environ.get('BENCHMARK_WARRANTIES', 2))
+BENCHMARK_DEFECTS = int(os.environ.get('BENCHMARK_DEFECTS', 2))
+BENCHMARK_FILES = int(os.environ.get('BENCHMARK_FILES', 1))
+BENCHMARK_REPEAT = int(os.environ.get('BENCHMARK_REPEAT', 5))
+# Set to a JSON path to record p50/p95 latency and query counts per view.
+BENCHMARK_BASELINE = os.environ.get('BENCHMARK_BASELINE')
+
+# Offsets in days from today, cycled so every status color is represented.
+END_DATE_OFFSETS = [-400, -10, 0, 15, 30, 31, 200, 900]
+
+
+def seed_data(customers, policy_years=3, warranties=2, defects=2, files=1, prefix='BM'):
+    today = timezone.now().date()
+    customer_rows, insurance_rows, warranty_rows, defect_rows, file_rows = [], [], [], [], []
+
+    for i in range(customers):
+        customer_id = f'{prefix}{i:06d}'
+        customer_rows.append(Customer(
+            id_customer=customer_id,
+            customer_name=f'Customer {prefix} {i:06d}',
+            address=f'{i} Jalan Benchmark',
+            email=f'{customer_id.lower()}@example.com',
+            phone_num=f'01{i:08d}',
+        ))
+        offset = END_DATE_OFFSETS[i % len(END_DATE_OFFSETS)]
+        end_period = today + timezone.timedelta(days=offset)
+        insurance_rows.append(Insurance(
+            no_insurance=f'POL-{customer_id}',
+            sum_amount=10000,
+            starting_period=renewal_due_date(end_period, end_period.year - policy_years),
+            end_period=end_period,
+            id_customer_id=customer_id,
+            total_payable=500,
+            status='Active',
+            ins_co='Benchmark Assurance',
+        ))
+        for j in range(warranties):
+            warranty_offset = END_DATE_OFFSETS[(i + j) % len(END_DATE_OFFSETS)]
+            warranty_rows.append(Warranty(
+                id_customer_id=customer_id,
+                product_name='Inverter',
+                start_date=today - timezone.timedelta(days=365),
+                end_date=today + timezone.timedelta(days=warranty_offset),
+            ))
+        for j in range(defects):
+            defect_offset = END_DATE_OFFSETS[(i + j + 1) % len(END_DATE_OFFSETS)]
+            defect_rows.append(Defect(
+                id_customer_id=customer_id,
+                report_date=today - timezone.timedelta(days=30),
+                accident_date=today - timezone.timedelta(days=j) if j % 2 else None,
+                resolution_deadline=today + timezone.timedelta(days=defect_offset),
+                status='Solved' if i % 3 == 0 else 'Pending',
+            ))
+        for j in range(files):
+            file_rows.append(CustomerFile(
+                id_customer_id=customer_id,
+                file=f'customer_files/{customer_id}_{j}.pdf',
+                description=f'Inspection report {j}',
+            ))
+
+    Customer.objects.bulk_create(customer_rows)
+    Insurance.objects.bulk_create(insurance_rows)
+    Warranty.objects.bulk_create(warranty_rows)
+    Defect.objects.bulk_create(defect_rows)
+    CustomerFile.objects.bulk_create(file_rows)
+    generate_due_notices(today)
+    rebuild_summaries(today)
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+# Worst-case (cold cache) query ceilings per URL name, including the session
+# and user lookups and the sidebar counters.
+QUERY_BUDGETS = {
+    'main_page': 11,
+    'dashboard_stats': 6,
+    'metrics': 2,
+    'notification_page': 10,
+    'renewal_notices_page': 10,
+    'dismiss_renewal': 2,
+    'customer_list': 12,
+    'export_customers': 8,
+    'import_records': 7,
+    'customer_typeahead': 4,
+    'customer_detail': 13,
+    'upload_customer_file': 3,
+    'start_customer_upload': 3,
+    'customer_upload': 2,
+    'download_customer_file': 3,
+    'customer_file_preview': 3,
+    'delete_customer_file': 4,
+    'add_customer': 8,
+    'edit_customer': 9,
+    'delete_customer': 8,
+    'add_insurance': 8,
+    'edit_insurance': 8,
+    'delete_insurance': 8,
+    'add_warranty': 9,
+    'edit_warranty': 8,
+    'delete_warranty': 8,
+    'add_defect': 9,
+    'edit_defect': 8,
+    'delete_defect': 8,
+    'defect_list': 8,
+    'add_defect_record': 8,
+    'solve_defect': 3,
+    'edit_defect_record': 8,
+    'delete_defect_record': 8,
+}
+
+# Views whose query count still grows with the number of rows they list.
+QUERY_GROWTH_ALLOWED = set()
+
+# Extra query string used to show more rows per page on list views.
+LARGE_PAGE_PARAMS = {
+    'customer_list': {'page_size': 50},
+    'notification_page': {'page_size': 100},
+}
+
+
+def url_kwargs(name):
+    customer = Customer.objects.order_by('pk').first()
+    insurance = Insurance.objects.order_by('pk').first()
+    warranty = Warranty.objects.order_by('pk').first()
+    liability = Defect.objects.filter(accident_date__isnull=True).order_by('pk').first()
+    accident = Defect.objects.filter(accident_date__isnull=False).order_by('pk').first()
+    customer_file = CustomerFile.objects.order_by('pk').first()
+    notice = InsuranceRenewalNotice.objects.order_by('pk').first()
+
+    if name == 'download_customer_file':
+        os.makedirs(os.path.dirname(customer_file.file.path), exist_ok=True)
+        with open(customer_file.file.path, 'wb') as fh:
+            fh.write(b'%PDF-1.4 benchmark')
+    if name == 'customer_upload':
+        session = UploadSession.start(customer.pk, User.objects.order_by('pk').first(), 'budget.txt', 1)
+        return {'upload_id': session.upload_id}
+    return {
+        'customer_detail': {'pk': customer.pk},
+        'upload_customer_file': {'customer_pk': customer.pk},
+        'start_customer_upload': {'customer_pk': customer.pk},
+        'download_customer_file': {'file_pk': customer_file.pk},
+        'customer_file_preview': {'file_pk': customer_file.pk},
+        'delete_customer_file': {'file_pk': customer_file.pk},
+        'edit_customer': {'pk': customer.pk},
+        'delete_customer': {'pk': customer.pk},
+        'edit_insurance': {'pk': insurance.pk},
+        'delete_insurance': {'pk': insurance.pk},
+        'add_warranty': {'customer_pk': customer.pk},
+        'edit_warranty': {'pk': warranty.pk},
+        'delete_warranty': {'pk': warranty.pk},
+        'add_defect': {'customer_pk': customer.pk},
+        'edit_defect': {'pk': liability.pk},
+        'delete_defect': {'pk': liability.pk},
+        'solve_defect': {'pk': accident.pk},
+        'edit_defect_record': {'pk': accident.pk},
+        'delete_defect_record': {'pk': accident.pk},
+        'dismiss_renewal': {'notice_pk': notice.pk},
+    }.get(name, {})
+
+
+def url_names():
+    names = []
+    for pattern in app_urls.urlpatterns:
+        if isinstance(pattern, URLPattern) and pattern.name not in names:
+            names.append(pattern.name)
+    return names
+
+
+class TempMediaRootMixin:
+    """A MEDIA_ROOT of the class's own, removed after its last test."""
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        cls.enterClassContext(override_settings(MEDIA_ROOT=media_root))
+        super().setUpClass()
+
+
+class ViewQueryBudgetMixin(TempMediaRootMixin):
+    seed_customers = BENCHMARK_CUSTOMERS
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+        seed_data(
+            cls.seed_customers,
+            policy_years=BENCHMARK_POLICY_YEARS,
+            warranties=BENCHMARK_WARRANTIES,
+            defects=BENCHMARK_DEFECTS,
+            files=BENCHMARK_FILES,
+        )
+        run_job('roll_calendar')
+        run_job('rebuild_status_summaries')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def count_queries(self, name, params=None):
+        cache.clear()
+        url = reverse(name, kwargs=url_kwargs(name))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertLess(response.status_code, 400, f"{name} returned {response.status_code}")
+        return len(queries)
+
+
+class ViewQueryBudgetTests(ViewQueryBudgetMixin, TestCase):
+
+    def test_every_url_has_a_query_budget(self):
+        self.assertEqual(sorted(set(url_names()) - set(QUERY_BUDGETS)), [])
+
+    def test_views_stay_within_query_budget(self):
+        for name in url_names():
+            if name in QUERY_GROWTH_ALLOWED:
+                continue
+            with self.subTest(view=name):
+                self.assertLessEqual(self.count_queries(name), QUERY_BUDGETS[name])
+
+    def test_customer_list_status_sorts_and_filters_stay_within_budget(self):
+        for params in ({'sort_by': 'urgency'}, {'sort_by': '-next_expiry'}, {'status': 'red', 'expires_within': 30}):
+            with self.subTest(params=params):
+                self.assertLessEqual(self.count_queries('customer_list', params), QUERY_BUDGETS['customer_list'])
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        for name, params in LARGE_PAGE_PARAMS.items():
+            with self.subTest(view=name):
+                self.assertEqual(self.count_queries(name), self.count_queries(name, params))
+
+
+class ViewQueryGrowthTests(ViewQueryBudgetMixin, TestCase):
+
+    def test_query_count_does_not_grow_with_data_volume(self):
+        before = {name: self.count_queries(name) for name in url_names()}
+        seed_data(
+            self.seed_customers * 2,
+            policy_years=BENCHMARK_POLICY_YEARS,
+            warranties=BENCHMARK_WARRANTIES,
+            defects=BENCHMARK_DEFECTS,
+            files=BENCHMARK_FILES,
+            prefix='GROW',
+        )
+        for name in url_names():
+            if name in QUERY_GROWTH_ALLOWED:
+                continue
+            with self.subTest(view=name):
+                self.assertEqual(self.count_queries(name), before[name])
+
+
+@override_settings(CUSTOMER_UPLOAD_CHUNK_SIZE=4)
+class ResumableUploadTests(TempMediaRootMixin, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('uploader', 'uploader@example.com', 'uploader')
+        self.client.force_login(self.user)
+        self.customer = Customer.objects.create(id_customer='UP1', customer_name='Upload Customer')
+
+    def start(self, content, sha256=''):
+        response = self.client.post(reverse('start_customer_upload', args=[self.customer.pk]), {
+            'filename': 'report.txt', 'size': len(content), 'sha256': sha256,
+        })
+        self.assertEqual(response.status_code, 201)
+        return reverse('customer_upload', args=[response.json()['upload_id']])
+
+    def put(self, url, offset, chunk):
+        return self.client.generic('PUT', url, chunk, content_type='application/octet-stream',
+                                   headers={'Upload-Offset': str(offset)})
+
+    def test_chunks_resume_from_offset_and_finalize_into_customer_file(self):
+        content = b'0123456789'
+        url = self.start(content, hashlib.sha256(content).hexdigest())
+
+        self.assertEqual(self.put(url, 0, content[:4]).json()['offset'], 4)
+        mismatch = self.put(url, 0, content[4:8])
+        self.assertEqual((mismatch.status_code, mismatch.json()['offset']), (409, 4))
+        self.assertEqual(self.client.get(url).json()['offset'], 4)
+        self.assertEqual(self.client.post(url).status_code, 409)
+        self.put(url, 4, content[4:8])
+        self.put(url, 8, content[8:])
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        customer_file = CustomerFile.objects.get(pk=response.json()['id'])
+        self.assertEqual(customer_file.id_customer_id, self.customer.pk)
+        with customer_file.file.open('rb') as fh:
+            self.assertEqual(fh.read(), content)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_hash_mismatch_discards_upload_without_a_row(self):
+        url = self.start(b'abcd', hashlib.sha256(b'wxyz').hexdigest())
+        self.put(url, 0, b'abcd')
+        self.assertEqual(self.client.post(url).status_code, 422)
+        self.assertFalse(CustomerFile.objects.exists())
+
+    def test_missing_part_file_is_not_found(self):
+        for request in (self.client.get, lambda url: self.put(url, 0, b'abcd'), self.client.post):
+            url = self.start(b'abcd')
+            session = UploadSession(url.rstrip('/').rsplit('/', 1)[-1], None)
+            os.remove(session.part_path)
+            with self.subTest(request=request):
+                self.assertEqual(request(url).status_code, 404)
+                self.assertFalse(os.path.exists(session.part_path) or os.path.exists(session.meta_path))
+
+
+    def stored_files(self):
+        directory = os.path.join(settings.MEDIA_ROOT, 'customer_files')
+        return os.listdir(directory) if os.path.isdir(directory) else []
+
+    def test_finalize_for_a_deleted_customer_is_not_found(self):
+        url = self.start(b'abcd')
+        self.put(url, 0, b'abcd')
+        self.customer.delete()
+        self.assertEqual(self.client.post(url).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_customer_deleted_while_storing_is_not_found(self):
+        url = self.start(b'abcd')
+        self.put(url, 0, b'abcd')
+        stored = self.stored_files()
+        with mock.patch.object(CustomerFile.objects, 'create', side_effect=IntegrityError):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.stored_files(), stored)
+
+    def test_failed_finalize_keeps_the_part_for_a_retry(self):
+        content = b'abcd'
+        url = self.start(content)
+        self.put(url, 0, content)
+        stored = self.stored_files()
+        with mock.patch.object(CustomerFile.objects, 'create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.post(url)
+        self.assertEqual(self.stored_files(), stored)
+        self.assertEqual(self.client.get(url).json()['offset'], len(content))
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        with CustomerFile.objects.get(pk=response.json()['id']).file.open('rb') as fh:
+            self.assertEqual(fh.read(), content)
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, '.uploads')), [])
+
+@override_settings(FILE_DOWNLOAD_BACKEND='python')
+class CustomerFileDownloadTests(TempMediaRootMixin, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('reader', 'reader@example.com', 'reader')
+        self.client.force_login(self.user)
+        customer = Customer.objects.create(id_customer='DL1', customer_name='Download Customer')
+        customer_file = CustomerFile.objects.create(id_customer=customer, file='customer_files/report.pdf')
+        os.makedirs(os.path.dirname(customer_file.file.path), exist_ok=True)
+        with open(customer_file.file.path, 'wb') as fh:
+            fh.write(b'0123456789')
+        self.url = reverse('download_customer_file', args=[customer_file.pk])
+
+    def test_conditional_get_and_ranges(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        etag = response.headers['ETag']
+
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+        partial = self.client.get(self.url, headers={'Range': 'bytes=2-5'})
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial.headers['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(partial.streaming_content), b'2345')
+        suffix = self.client.get(self.url, headers={'Range': 'bytes=-3', 'If-Range': etag})
+        self.assertEqual(b''.join(suffix.streaming_content), b'789')
+        stale = self.client.get(self.url, headers={'Range': 'bytes=2-5', 'If-Range': '"stale"'})
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(self.client.get(self.url, headers={'Range': 'bytes=20-'}).status_code, 416)
+
+    @override_settings(FILE_DOWNLOAD_BACKEND='nginx', FILE_DOWNLOAD_ACCEL_PREFIX='/protected-media/')
+    def test_front_server_handoff(self):
+        response = self.client.get(self.url, {'download': 1})
+        self.assertEqual(response.headers['X-Accel-Redirect'], '/protected-media/customer_files/report.pdf')
+        self.assertTrue(response.headers['Content-Disposition'].startswith('attachment'))
+        self.assertEqual(response.content, b'')
+
+
+    def test_only_images_and_pdfs_are_served_inline(self):
+        customer = Customer.objects.get(pk='DL1')
+        for name, inline in (('photo.png', True), ('scan.pdf', True), ('page.html', False),
+                             ('logo.svg', False), ('notes', False)):
+            customer_file = CustomerFile.objects.create(id_customer=customer, file=f'customer_files/{name}')
+            with open(customer_file.file.path, 'wb') as fh:
+                fh.write(b'<script>alert(1)</script>')
+            for backend in ('python', 'nginx'):
+                with self.subTest(name=name, backend=backend), override_settings(FILE_DOWNLOAD_BACKEND=backend):
+                    response = self.client.get(reverse('download_customer_file', args=[customer_file.pk]))
+                    disposition = response.headers['Content-Disposition']
+                    self.assertEqual(disposition.startswith('inline'), inline, disposition)
+                    self.assertEqual(response.headers['X-Content-Type-Options'], 'nosniff')
+                    self.assertEqual(response.headers['Content-Security-Policy'], 'sandbox')
+                    if not inline:
+                        self.assertFalse(response.headers['Content-Type'].startswith(('text/html', 'image/svg')))
+
+@skipUnless(previews.Image, "Pillow is not installed")
+@override_settings(FILE_PREVIEW_CACHE_DIR='')
+class CustomerFilePreviewTests(TempMediaRootMixin, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('viewer', 'viewer@example.com', 'viewer')
+        self.client.force_login(self.user)
+        self.customer = Customer.objects.create(id_customer='PV1', customer_name='Preview Customer')
+        cache.clear()
+        self.addCleanup(shutil.rmtree, previews.preview_dir(), ignore_errors=True)
+
+    def add_image(self, name, color):
+        customer_file = CustomerFile.objects.create(id_customer=self.customer, file=f'customer_files/{name}')
+        os.makedirs(os.path.dirname(customer_file.file.path), exist_ok=True)
+        previews.Image.new('RGB', (1200, 800), color).save(customer_file.file.path)
+        return customer_file
+
+    def test_previews_are_cached_by_hash_and_evicted_least_recently_used(self):
+        first = self.add_image('first.png', 'red')
+        response = self.client.get(reverse('customer_file_preview', args=[first.pk]))
+        self.assertEqual(response['Content-Type'], previews.PREVIEW_CONTENT_TYPE)
+        self.assertIn('immutable', response['Cache-Control'])
+        preview = previews.Image.open(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertLessEqual(max(preview.size), settings.FILE_PREVIEW_SIZE)
+
+        same_content = self.add_image('copy.png', 'red')
+        self.assertEqual(previews.get_preview(same_content.file), previews.get_preview(first.file))
+        os.utime(previews.get_preview(first.file), (0, 0))
+        second = previews.get_preview(self.add_image('second.png', 'blue').file)
+        self.assertEqual(previews.evict_previews(max_bytes=int(os.path.getsize(second) / previews.EVICT_TO_FRACTION) + 1), 1)
+        self.assertEqual([path for _, _, path in previews.scan_previews()], [second])
+
+    def test_unsupported_files_get_a_briefly_cached_placeholder(self):
+        customer_file = CustomerFile.objects.create(id_customer=self.customer, file='customer_files/notes.docx')
+        response = self.client.get(reverse('customer_file_preview', args=[customer_file.pk]))
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'DOCX', response.content)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn(f'max-age={previews.PLACEHOLDER_MAX_AGE}', response['Cache-Control'])
+
+    def test_new_previews_scan_for_eviction_only_over_the_limit(self):
+        with mock.patch.object(previews, 'evict_previews', wraps=previews.evict_previews) as evict:
+            previews.get_preview(self.add_image('small.png', 'red').file)
+            evict.assert_not_called()
+            with override_settings(FILE_PREVIEW_CACHE_MAX_BYTES=1):
+                previews.get_preview(self.add_image('over.png', 'blue').file)
+            evict.assert_called_once()
+        self.assertEqual(previews.scan_previews(), [])
+
+    def test_preview_evicted_before_it_is_opened_is_rendered_again(self):
+        customer_file = self.add_image('raced.png', 'green')
+        get_preview = previews.get_preview
+
+        def evicted_right_after(field_file):
+            path = get_preview(field_file)
+            if evicted_right_after.first:
+                evicted_right_after.first = False
+                os.remove(path)
+            return path
+        evicted_right_after.first = True
+
+        with mock.patch.object(previews, 'get_preview', side_effect=evicted_right_after):
+            response = self.client.get(reverse('customer_file_preview', args=[customer_file.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], previews.PREVIEW_CONTENT_TYPE)
+        self.assertTrue(b''.join(response.streaming_content))
+
+
+@override_settings(ORPHAN_FILE_GRACE_SECONDS=60)
+class FileCleanupTests(TempMediaRootMixin, TestCase):
+
+    def write(self, name, age=0):
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fh:
+            fh.write(b'x' * 10)
+        if age:
+            os.utime(path, (time.time() - age, time.time() - age))
+        return path
+
+    def test_deleted_and_orphaned_files_are_removed_in_batches(self):
+        customer = Customer.objects.create(id_customer='CL1', customer_name='Cleanup Customer')
+        kept = CustomerFile.objects.create(id_customer=customer, file='customer_files/kept.pdf')
+        removed = CustomerFile.objects.create(id_customer=customer, file='customer_files/removed.pdf')
+        paths = [self.write(kept.file.name), self.write(removed.file.name)]
+        orphan = self.write('customer_files/2020/orphan.pdf', age=3600)
+        fresh = self.write('customer_files/fresh.pdf')
+
+        removed.delete()
+        self.assertTrue(FileDeletion.objects.filter(name='customer_files/removed.pdf').exists())
+
+        orphans = []
+        dry_run = reconcile_files(batch_size=2, dry_run=True, on_orphan=orphans.append)
+        self.assertEqual(orphans, ['customer_files/2020/orphan.pdf'])
+        self.assertEqual((dry_run.scanned, dry_run.deleted), (4, 1))
+        self.assertTrue(all(os.path.exists(path) for path in paths + [orphan, fresh]))
+
+        stats = reconcile_files(batch_size=2)
+        self.assertEqual((stats.deleted, stats.bytes_freed), (2, 20))
+        self.assertEqual([os.path.exists(path) for path in paths + [orphan, fresh]], [True, False, False, True])
+        self.assertFalse(FileDeletion.objects.exists())
+
+        customer.delete()
+        self.assertEqual(list(FileDeletion.objects.values_list('name', flat=True)), ['customer_files/kept.pdf'])
+
+
+class RequestInstrumentationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('timed', 'timed@example.com', 'timed')
+        seed_data(3, prefix='TIME')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    async def test_async_views_are_instrumented_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        customer = await Customer.objects.order_by('pk').afirst()
+        for url in (reverse('main_page'), reverse('notification_page'), reverse('customer_detail', args=[customer.pk])):
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('desc="0 queries"', response['Server-Timing'])
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0, SLOW_REQUEST_SAMPLE_RATE=1.0)
+    def test_server_timing_header_and_slow_request_log(self):
+        with self.assertLogs('insurance_app.slow_requests', 'WARNING') as logs:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('customer_list'))
+        timing = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timing), {'db', 'view', 'template', 'total'})
+        self.assertIn(f'desc="{len(queries)} queries"', timing['db'])
+
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((record['view'], record['status'], record['queries']), ('customer_list', 200, len(queries)))
+        self.assertGreater(record['template_ms'], 0)
+
+
+@override_settings(ASYNC_PARALLEL_READS=True)
+class ParallelReadTests(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser('parallel', 'parallel@example.com', 'parallel')
+        seed_data(len(END_DATE_OFFSETS), prefix='PAR')
+
+    async def test_reads_run_at_the_same_time(self):
+        # Each read waits for the other; run one after another, the first would time out.
+        barrier = threading.Barrier(2, timeout=5)
+
+        def read():
+            barrier.wait()
+            return Customer.objects.count()
+        self.assertEqual(await gather_reads(read, read), [len(END_DATE_OFFSETS)] * 2)
+
+    async def test_async_views_serve_the_same_figures(self):
+        today = timezone.now().date()
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse('main_page'))
+        expected = await sync_to_async(baseline_dashboard_figures)(today)
+        self.assertEqual({key: response.context[key] for key in expected}, expected)
+        self.assertNotIn('desc="0 queries"', response['Server-Timing'])
+
+        response = await self.async_client.get(reverse('notification_page'), {'page_size': 10, 'page': 99})
+        expected = await sync_to_async(baseline_feed_items)(today)
+        page_obj = response.context['page_obj']
+        self.assertEqual((page_obj.number, page_obj.paginator.count), (page_obj.paginator.num_pages, len(expected)))
+        self.assertEqual([feed_item_tuple(item) for item in response.context['items']],
+                         expected[(page_obj.number - 1) * 10:])
+
+        customer = await Customer.objects.order_by('pk').afirst()
+        response = await self.async_client.get(reverse('customer_detail', args=[customer.pk]))
+        self.assertEqual(response.context['customer'].pk, customer.pk)
+        self.assertEqual(response.context['fragment_stamp'], await sync_to_async(customer_fragment_stamp)(customer.pk, today))
+        response = await self.async_client.get(reverse('customer_detail', args=['MISSING']))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(DEBUG=True, DUPLICATE_QUERY_THRESHOLD=3)
+class DuplicateQueryWarningTests(TransactionTestCase):
+
+    def test_repeated_queries_in_a_new_thread_are_reported(self):
+        def view(request):
+            for pk in ('A', 'B', 'C'):
+                Customer.objects.filter(pk=pk).first()
+            return HttpResponse()
+        middleware = DuplicateQueryWarningMiddleware(view)
+
+        def serve():
+            # Like a fresh runserver thread: no connection is open when the request starts.
+            try:
+                middleware(RequestFactory().get('/customers/'))
+            finally:
+                connections.close_all()
+        with self.assertLogs('insurance_app.middleware', 'WARNING') as logs:
+            thread = threading.Thread(target=serve)
+            thread.start()
+            thread.join()
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('GET /customers/ ran the same query 3 times', logs.records[0].getMessage())
+
+
+@override_settings(METRICS_FLUSH_INTERVAL=0, METRICS_TOKEN='scrape-token')
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser('metrics', 'metrics@example.com', 'metrics')
+        cls.clerk = User.objects.create_user('clerk', 'clerk@example.com', 'clerk')
+        seed_data(2, prefix='MET')
+
+    def setUp(self):
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir, ignore_errors=True)
+        self.enterContext(override_settings(METRICS_DIR=metrics_dir))
+        metrics.registry.reset()
+
+    def test_requests_are_exposed_in_prometheus_format(self):
+        self.client.force_login(self.staff)
+        cache.clear()
+        self.client.get(reverse('main_page'))
+        self.client.get(reverse('main_page'))
+        # Another worker's numbers, as written to its own file in METRICS_DIR.
+        self.write_worker_file(f'{os.getppid()}-1.json', 3)
+
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('insurance_http_requests_total{method="GET",status="200",view="main_page"} 5', body)
+        self.assertIn('insurance_http_request_duration_seconds_count{view="main_page"} 2', body)
+        self.assertIn('insurance_cache_requests_total{cache="dashboard_stats",result="hit"} 1', body)
+        self.assertIn('insurance_cache_requests_total{cache="dashboard_stats",result="miss"} 1', body)
+
+    def write_worker_file(self, filename, requests):
+        metrics.write_metrics(settings.METRICS_DIR, filename, {
+            'counters': [['insurance_http_requests_total',
+                          [['method', 'GET'], ['status', '200'], ['view', 'main_page']], requests]],
+            'histograms': [],
+        })
+
+    def main_page_requests(self):
+        counters, _ = metrics.collect()
+        return counters['insurance_http_requests_total'][(('method', 'GET'), ('status', '200'), ('view', 'main_page'))]
+
+    def test_exited_workers_are_folded_into_the_aggregate(self):
+        exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+        dead_pid = int(exited.stdout)
+        self.write_worker_file(f'{dead_pid}-1.json', 3)
+        # The same pid reused by a later worker, and an earlier process of this one's pid.
+        self.write_worker_file(f'{dead_pid}-2.json', 4)
+        self.write_worker_file(f'{os.getpid()}-1.json', 5)
+
+        self.assertEqual(self.main_page_requests(), 12)
+        self.assertEqual(sorted(os.listdir(settings.METRICS_DIR)), ['.lock', metrics.AGGREGATE_FILE])
+        self.assertEqual(self.main_page_requests(), 12)
+
+        metrics.registry.inc('insurance_http_requests_total', {'view': 'main_page', 'method': 'GET', 'status': '200'})
+        metrics.registry.retire()
+        self.assertEqual(sorted(os.listdir(settings.METRICS_DIR)), ['.lock', metrics.AGGREGATE_FILE])
+        self.assertEqual(self.main_page_requests(), 13)
+
+    def test_metrics_are_staff_or_token_only(self):
+        self.client.force_login(self.clerk)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+        response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer scrape-token'})
+        self.assertEqual(response.status_code, 200)
+
+
+# Two aliases on one locmem store: within a test process that is as shared as 'file' or 'db'.
+SHARED_FRAGMENT_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'fragment-tests'}
+    for alias in ('default', 'fragments')
+}
+
+
+@override_settings(CACHES=SHARED_FRAGMENT_CACHES)
+class CustomerFragmentCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('fragments', 'fragments@example.com', 'fragments')
+        seed_data(1, files=2, prefix='FRG')
+        cls.customer = Customer.objects.get()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.url = reverse('customer_detail', args=[self.customer.pk])
+
+    def test_templates_use_the_cached_loader(self):
+        self.assertIsInstance(engines.all()[0].engine.template_loaders[0], CachedLoader)
+
+    def test_tables_are_reused_until_a_child_row_changes(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as warm:
+            response = self.client.get(self.url)
+        # The insurance, warranty, defect and file tables come from the fragment cache.
+        tables = ('"Insurance"', '"Warranty"', '"Defect"', '"CustomerFile"')
+        self.assertEqual([q['sql'] for q in warm if q['sql'].split(' FROM ')[-1].startswith(tables)], [])
+        # Logout, upload and the shared delete form; the cached rows carry no token of their own.
+        self.assertContains(response, 'form="customer-file-delete-form"', count=2)
+        self.assertContains(response, 'name="csrfmiddlewaretoken"', count=3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Warranty.objects.create(
+                id_customer=self.customer, product_name='Battery',
+                start_date=date(2020, 1, 1), end_date=date(2040, 1, 1),
+            )
+        self.assertContains(self.client.get(self.url), 'Battery')
+
+    # What settings.py configures for CACHE_BACKEND='locmem'.
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'fragments': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    })
+    def test_per_process_cache_renders_uncached(self):
+        self.client.get(self.url)
+        # Another worker's save bumps the stamp only in its own locmem cache.
+        Warranty.objects.filter(id_customer=self.customer).update(product_name='Changed Elsewhere')
+        self.assertContains(self.client.get(self.url), 'Changed Elsewhere')
+
+    def test_stamp_rolls_over_with_the_date(self):
+        today = timezone.now().date()
+        stamp = customer_fragment_stamp(self.customer.pk, today)
+        self.assertEqual(customer_fragment_stamp(self.customer.pk, today), stamp)
+        self.assertNotEqual(customer_fragment_stamp(self.customer.pk, today + timezone.timedelta(days=1)), stamp)
+
+        now = timezone.now().replace(hour=23, minute=59, second=30, microsecond=0)
+        self.assertEqual(seconds_until_tomorrow(now), 30)
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+
+    def route(self, request, view):
+        seen = []
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            seen.append(read_database.get())
+            return HttpResponse()
+        with override_settings(REPLICA_DATABASE_ALIAS='replica'):
+            middleware = ReplicaRoutingMiddleware(get_response)
+            response = middleware(request)
+        self.assertIsNone(read_database.get())
+        return seen[0], response
+
+    def test_router_sends_only_app_reads_outside_transactions_to_the_replica(self):
+        token = read_database.set('replica')
+        try:
+            self.assertEqual(Customer.objects.all().db, 'replica')
+            self.assertEqual(User.objects.all().db, 'default')
+            self.assertEqual(JobRun.objects.all().db, 'default')
+            with transaction.atomic():
+                self.assertEqual(Customer.objects.all().db, 'default')
+        finally:
+            read_database.reset(token)
+        self.assertEqual(Customer.objects.all().db, 'default')
+
+    def test_marked_views_read_from_the_replica_until_a_post_pins_the_primary(self):
+        factory = RequestFactory()
+        replica_view = reads_from_replica(lambda request: None)
+
+        alias, _ = self.route(factory.get('/'), replica_view)
+        self.assertEqual(alias, 'replica')
+        alias, _ = self.route(factory.get('/'), lambda request: None)
+        self.assertIsNone(alias)
+
+        alias, response = self.route(factory.post('/'), lambda request: None)
+        pin = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(pin['max-age'], settings.REPLICA_PIN_SECONDS)
+
+        request = factory.get('/')
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = pin.value
+        alias, response = self.route(request, replica_view)
+        self.assertIsNone(alias)
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+
+@skipUnless(settings.REPLICA_DATABASE_ALIAS, "set REPLICA_DATABASE_URL to run against a replica alias")
+class ReplicaDatabaseTests(TransactionTestCase):
+    # A transaction-per-test case would keep every read on the primary.
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('replica', 'replica@example.com', 'replica')
+        seed_data(1, prefix='REP')
+        self.customer = Customer.objects.get()
+        self.client.force_login(self.user)
+
+    def queries_by_alias(self, url, method='get', **kwargs):
+        counts = {}
+
+        def count(alias):
+            def wrapper(execute, sql, params, many, context):
+                counts[alias] = counts.get(alias, 0) + 1
+                return execute(sql, params, many, context)
+            return wrapper
+        with connections['default'].execute_wrapper(count('default')), \
+                connections[settings.REPLICA_DATABASE_ALIAS].execute_wrapper(count('replica')):
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400)
+        return counts
+
+    def test_read_only_views_use_the_replica_until_a_post_pins_the_primary(self):
+        detail = reverse('customer_detail', args=[self.customer.pk])
+        self.assertGreater(self.queries_by_alias(reverse('customer_list')).get('replica', 0), 0)
+        self.assertGreater(self.queries_by_alias(detail).get('replica', 0), 0)
+
+        self.queries_by_alias(reverse('edit_customer', args=[self.customer.pk]), 'post', data={
+            'customer_name': 'Renamed', 'in_charge_person': '', 'proposal_prepared_by': '',
+        })
+        self.assertNotIn('replica', self.queries_by_alias(detail))
+
+
+def per_row_group_status(items, date_field, today):
+    """The per-item computation customer_list used before statuses were aggregated in SQL."""
+    if not items:
+        return {'color': 'gray', 'green': 0, 'yellow': 0, 'red': 0, 'gray': 0, 'total': 0}
+    status_counts = {'green': 0, 'yellow': 0, 'red': 0, 'gray': 0}
+    for item in items:
+        status_counts[get_status_color(getattr(item, date_field), today)] += 1
+    summary_color = 'green'
+    statuses_present = {s for s, count in status_counts.items() if count > 0}
+    if 'yellow' in statuses_present:
+        summary_color = 'yellow'
+    elif 'red' in statuses_present and 'green' in statuses_present:
+        summary_color = 'yellow'
+    elif statuses_present == {'green'}:
+        summary_color = 'green'
+    elif statuses_present == {'red'}:
+        summary_color = 'red'
+    return {'color': summary_color, 'green': status_counts['green'], 'yellow': status_counts['yellow'],
+            'red': status_counts['red'], 'total': len(items)}
+
+
+class GroupStatusTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_data(len(END_DATE_OFFSETS) * 2, warranties=3, defects=3, prefix='GRP')
+        cls.today = timezone.now().date()
+        customers = list(Customer.objects.order_by('pk'))
+        # Undated defects: alone, and next to a dated one.
+        cls.undated_only = customers[0]
+        Defect.objects.filter(id_customer=cls.undated_only).update(resolution_deadline=None, accident_date=None)
+        cls.undated_mixed = customers[1]
+        Defect.objects.create(id_customer=cls.undated_mixed, report_date=cls.today, resolution_deadline=None)
+
+    def test_aggregated_statuses_match_the_per_row_computation(self):
+        customers = attach_group_statuses(Customer.objects.exclude(pk__in=[self.undated_only.pk, self.undated_mixed.pk]),
+                                          self.today)
+        self.assertTrue(customers)
+        for customer in customers:
+            for attr, model, date_field, filters in STATUS_GROUPS:
+                items = list(model.objects.filter(id_customer=customer, **filters))
+                with self.subTest(customer=customer.pk, group=attr):
+                    self.assertEqual(getattr(customer, attr), per_row_group_status(items, date_field, self.today))
+
+    def test_undated_items_count_in_total_but_not_in_the_color(self):
+        only, mixed = attach_group_statuses([self.undated_only, self.undated_mixed], self.today)
+        self.assertEqual(only.defect_status['color'], 'gray')
+        self.assertEqual(only.defect_status['total'], Defect.objects.filter(id_customer=only).count())
+        self.assertEqual(only.defect_status['green'] + only.defect_status['yellow'] + only.defect_status['red'], 0)
+
+        dated = [d for d in Defect.objects.filter(id_customer=mixed, accident_date__isnull=True)
+                 if d.resolution_deadline is not None]
+        expected = per_row_group_status(dated, 'resolution_deadline', self.today)
+        self.assertEqual(mixed.defect_status, {**expected, 'total': expected['total'] + 1})
+
+
+class StatusSummaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('summaries', 'summaries@example.com', 'summaries')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def add_insurance(self, customer_id, end_period):
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.get_or_create(id_customer=customer_id, defaults={'customer_name': customer_id})
+            return Insurance.objects.create(
+                no_insurance=f'POL-{customer_id}-{end_period}', ins_co='Co', id_customer_id=customer_id,
+                sum_amount=1, total_payable=1, starting_period=date(2020, 1, 1), end_period=end_period, status='Active',
+            )
+
+    def listed(self, params):
+        response = self.client.get(reverse('customer_list'), {**params, 'page_size': 100})
+        return [customer.pk for customer in response.context['page_obj']]
+
+    def test_filters_and_sorts_use_todays_colors_after_the_date_rolls_over(self):
+        today = timezone.now().date()
+        self.add_insurance('ROLL1', today + timezone.timedelta(days=10))
+        self.add_insurance('ROLL2', today + timezone.timedelta(days=100))
+        run_job('rebuild_status_summaries', today)
+        self.assertEqual(self.listed({'status': 'red'}), [])
+
+        # The policy expires overnight; nothing is saved before the next request.
+        later = timezone.now() + timezone.timedelta(days=11)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(self.listed({'status': 'red'}), ['ROLL1'])
+            self.assertEqual(self.listed({'sort_by': '-urgency'}), ['ROLL2', 'ROLL1'])
+            response = self.client.get(reverse('customer_detail', args=['ROLL1']))
+            self.assertEqual(response.context['customer'].status_color, 'red')
+        # The requests only read; the rebuild is left to the scheduler.
+        self.assertEqual(set(CustomerStatusSummary.objects.values_list('as_of', flat=True)), {today})
+        self.assertFalse(JobRun.objects.filter(name='rebuild_status_summaries', run_date=later.date()).exists())
+
+    def test_live_status_matches_the_rebuilt_summaries(self):
+        seed_data(len(END_DATE_OFFSETS), prefix='LIVE')
+        Customer.objects.create(id_customer='LIVE-EMPTY', customer_name='No items')
+        today = timezone.now().date()
+        cases = [
+            {'status': color} for color in STATUS_COLORS
+        ] + [
+            {f'{group}_status': color} for group in SUMMARY_GROUPS for color in STATUS_COLORS
+        ] + [
+            {'expires_within': days} for days in EXPIRES_WITHIN_CHOICES
+        ] + [
+            {'sort_by': f'{sign}{field}'} for field in STATUS_SORT_FIELDS for sign in ('', '-')
+        ] + [
+            {'status': 'yellow', 'sort_by': 'next_expiry', 'expires_within': 90},
+        ]
+        live = {}
+        with CaptureQueriesContext(connection) as queries:
+            for params in cases:
+                live[str(params)] = self.listed(params)
+        self.assertFalse([q for q in queries if q['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))])
+        self.assertFalse(CustomerStatusSummary.objects.filter(as_of__lt=today).exists())
+        # LIVE-EMPTY has no summary row yet (its on_commit refresh never ran): only the live path lists it.
+        self.assertEqual(live[str({'status': 'gray'})], ['LIVE-EMPTY'])
+
+        run_job('rebuild_status_summaries', today)
+        for params in cases:
+            with self.subTest(params=params):
+                self.assertEqual(live[str(params)], self.listed(params))
+
+    def test_group_rank_sorts_put_customers_without_an_upcoming_expiry_last(self):
+        today = timezone.now().date()
+        self.add_insurance('NUL1', today - timezone.timedelta(days=5))
+        self.add_insurance('NUL2', today - timezone.timedelta(days=5))
+        with self.captureOnCommitCallbacks(execute=True):
+            Warranty.objects.create(id_customer_id='NUL2', product_name='Inverter', start_date=date(2020, 1, 1),
+                                    end_date=today + timezone.timedelta(days=400))
+        # Both are red on insurance; only NUL2 has something still to expire.
+        self.assertEqual(self.listed({'sort_by': 'insurance_status'}), ['NUL2', 'NUL1'])
+        self.assertEqual(self.listed({'sort_by': '-insurance_status'}), ['NUL2', 'NUL1'])
+
+    def test_saving_or_deleting_a_child_updates_the_summary(self):
+        today = timezone.now().date()
+        insurance = self.add_insurance('CHG1', today + timezone.timedelta(days=10))
+
+        def summary():
+            return CustomerStatusSummary.objects.get(customer_id='CHG1')
+        self.assertEqual((summary().insurance_color, summary().next_expiry), ('yellow', insurance.end_period))
+
+        insurance.end_period = today - timezone.timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            insurance.save()
+        self.assertEqual((summary().insurance_color, summary().next_expiry), ('red', None))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            insurance.delete()
+        self.assertEqual((summary().insurance_color, summary().insurance_total), ('gray', 0))
+
+    def test_check_status_summaries_reports_and_fixes_drift(self):
+        self.add_insurance('DRIFT1', timezone.now().date() + timezone.timedelta(days=10))
+        CustomerStatusSummary.objects.filter(customer_id='DRIFT1').update(insurance_color='green', insurance_rank=2)
+
+        out = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command('check_status_summaries', stdout=out)
+        self.assertIn('DRIFT1: differs in insurance_color, insurance_rank', out.getvalue())
+
+        call_command('check_status_summaries', '--fix', stdout=io.StringIO())
+        out = io.StringIO()
+        call_command('check_status_summaries', stdout=out)
+        self.assertIn('All customer status summaries are consistent.', out.getvalue())
+
+
+def baseline_feed_items(today):
+    # The notification page's original per-model loops, sorted in Python.
+    soon = today + timezone.timedelta(days=30)
+    items = []
+    for key, label, model, date_field, filters in FEED_SOURCES:
+        for item in model.objects.filter(**filters, **{f'{date_field}__lte': soon}).select_related('id_customer'):
+            end_date = getattr(item, date_field)
+            items.append((label, item.id_customer_id, end_date, get_status_color(end_date, today)))
+    return sorted(items, key=lambda item: (item[2], item[0], item[1]))
+
+
+def feed_item_tuple(item):
+    return (item['type'], item['customer']['id_customer'], item['end_date'], item['status_color'])
+
+
+class ExpiringItemsFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('feed', 'feed@example.com', 'feed')
+        seed_data(len(END_DATE_OFFSETS), prefix='FEED')
+
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.baseline = baseline_feed_items(self.today)
+
+    def feed(self, **filters):
+        return [feed_item_tuple(feed_row_to_item(row, self.today))
+                for row in expiring_items_feed(self.today, **filters)]
+
+    def test_union_matches_the_per_model_baseline_in_order(self):
+        feed = self.feed()
+        self.assertEqual(feed, self.baseline)
+        self.assertEqual({item[0] for item in feed}, {source[1] for source in FEED_SOURCES})
+        self.assertEqual({item[3] for item in feed}, {'red', 'yellow'})
+
+    def test_type_and_status_filters(self):
+        labels = {source[0]: source[1] for source in FEED_SOURCES}
+        for item_type in (None, *labels):
+            for status in (None, 'red', 'yellow'):
+                with self.subTest(item_type=item_type, status=status):
+                    expected = [
+                        item for item in self.baseline
+                        if (item_type is None or item[0] == labels[item_type])
+                        and (status is None or item[3] == status)
+                    ]
+                    self.assertTrue(expected)
+                    self.assertEqual(self.feed(item_type=item_type, status=status), expected)
+
+    def test_paging_through_the_view_covers_the_baseline_once(self):
+        self.client.force_login(self.user)
+        page_size = 7
+        seen, page = [], 1
+        while True:
+            response = self.client.get(reverse('notification_page'), {'page': page, 'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            seen.extend(feed_item_tuple(item) for item in response.context['items'])
+            if not response.context['page_obj'].has_next():
+                break
+            page += 1
+        self.assertGreater(page, 2)
+        self.assertEqual(seen, self.baseline)
+
+        # Past the end shows the last page; garbage shows the first.
+        last = self.client.get(reverse('notification_page'), {'page': page + 5, 'page_size': page_size})
+        self.assertEqual([feed_item_tuple(item) for item in last.context['items']],
+                         self.baseline[(page - 1) * page_size:])
+        first = self.client.get(reverse('notification_page'), {'page': 'x', 'page_size': page_size})
+        self.assertEqual([feed_item_tuple(item) for item in first.context['items']], self.baseline[:page_size])
+
+        filtered = self.client.get(reverse('notification_page'), {'type': 'warranty', 'status': 'red', 'page_size': 100})
+        self.assertEqual([feed_item_tuple(item) for item in filtered.context['items']],
+                         [item for item in self.baseline if item[0] == 'Warranty' and item[3] == 'red'])
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Seven customers sharing three names, so pages split inside runs of equal sort values.
+        Customer.objects.bulk_create([
+            Customer(id_customer=f'KS{i:02d}', customer_name=f'Name {i % 3}') for i in range(7)
+        ])
+
+    def walk(self, sort_by, page_size=3):
+        paginator = KeysetPaginator(Customer.objects.all(), sort_by, page_size)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(after=pages[-1].next_cursor))
+        return paginator, pages
+
+    def test_forward_and_back_over_ties_in_both_directions(self):
+        for sort_by in ('customer_name', '-customer_name'):
+            with self.subTest(sort_by=sort_by):
+                expected = [c.pk for c in Customer.objects.order_by(sort_by, '-pk' if sort_by[0] == '-' else 'pk')]
+                paginator, pages = self.walk(sort_by)
+                self.assertEqual([c.pk for page in pages for c in page], expected)
+                self.assertEqual([len(page) for page in pages], [3, 3, 1])
+                self.assertFalse(pages[0].has_previous())
+                self.assertFalse(pages[-1].has_next())
+
+                back = [pages[-1]]
+                while back[-1].has_previous():
+                    back.append(paginator.page(before=back[-1].previous_cursor))
+                self.assertEqual([[c.pk for c in page] for page in reversed(back)],
+                                 [[c.pk for c in page] for page in pages])
+
+    def test_null_sort_values_page_last_in_both_directions(self):
+        Customer.objects.filter(pk__in=['KS01', 'KS02', 'KS05']).update(email='')
+        Customer.objects.exclude(pk__in=['KS01', 'KS02', 'KS05']).update(email=F('customer_name'))
+        contacts = Customer.objects.annotate(contact=NullIf('email', Value('')))
+        for sort_by in ('contact', '-contact'):
+            with self.subTest(sort_by=sort_by):
+                ordered = contacts.order_by(
+                    F('contact').desc(nulls_last=True) if sort_by[0] == '-' else F('contact').asc(nulls_last=True),
+                    '-pk' if sort_by[0] == '-' else 'pk',
+                )
+                paginator = KeysetPaginator(contacts, sort_by, 2)
+                pages = [paginator.page()]
+                while pages[-1].has_next():
+                    pages.append(paginator.page(after=pages[-1].next_cursor))
+                self.assertEqual([c.pk for page in pages for c in page], [c.pk for c in ordered])
+                # Pages of two over seven rows: the cursors cross into and through the NULL run.
+                self.assertEqual([c.contact for page in pages for c in page][-3:], [None] * 3)
+
+                back = [pages[-1]]
+                while back[-1].has_previous():
+                    back.append(paginator.page(before=back[-1].previous_cursor))
+                self.assertEqual([[c.pk for c in page] for page in reversed(back)],
+                                 [[c.pk for c in page] for page in pages])
+
+    def test_garbage_and_tampered_cursors_fall_back_to_the_first_page(self):
+        paginator = KeysetPaginator(Customer.objects.all(), 'customer_name', 3)
+        first = [c.pk for c in paginator.page()]
+        for cursor in ('not-a-cursor', '%%%', encode_cursor(['Name 1']), encode_cursor({'a': 1}),
+                       encode_cursor([{'a': 1}, 'KS01']), encode_cursor(['Name 1', ['KS01']])):
+            with self.subTest(cursor=cursor):
+                self.assertEqual([c.pk for c in paginator.page(after=cursor)], first)
+                self.assertEqual([c.pk for c in paginator.page(before=cursor)], first)
+
+    def test_customer_list_accepts_a_tampered_cursor(self):
+        self.client.force_login(User.objects.create_superuser('keyset', 'keyset@example.com', 'keyset'))
+        response = self.client.get(reverse('customer_list'), {
+            'pagination': 'cursor', 'after': encode_cursor([{'a': 1}, None]),
+        })
+        self.assertEqual(response.status_code, 200)
+
+
+class CustomerSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Customer.objects.bulk_create([
+            Customer(id_customer='S1', customer_name='Solar Works', email='info@solarworks.my'),
+            Customer(id_customer='S2', customer_name='Works of Solar', address='1 Jalan Solar'),
+            Customer(id_customer='S3', customer_name='solar', phone_num='0123'),
+            Customer(id_customer='S4', customer_name='Wind Farm', email='wind@example.com'),
+        ])
+
+    def assert_backend_filters(self, backend):
+        def ids(query, field='all'):
+            return sorted(backend.filter(Customer.objects.all(), query, field).values_list('pk', flat=True))
+        self.assertEqual(ids('SOLAR'), ['S1', 'S2', 'S3'])
+        self.assertEqual(ids('solar', 'address'), ['S2'])
+        self.assertEqual(ids('solarworks', 'email'), ['S1'])
+        self.assertEqual(ids('0123', 'phone'), ['S3'])
+        self.assertEqual(ids('solar', 'unknown-field'), ['S1', 'S2', 'S3'])
+        self.assertEqual(ids('nothing'), [])
+
+    def test_basic_backend_filters_and_ranks_exact_then_prefix_then_contains(self):
+        backend = BasicSearchBackend()
+        self.assert_backend_filters(backend)
+        ranked = backend.rank(backend.filter(Customer.objects.all(), 'solar', 'name'), 'solar', 'name')
+        self.assertEqual(list(ranked.order_by('-search_rank', 'pk').values_list('pk', 'search_rank')),
+                         [('S3', 3), ('S1', 2), ('S2', 1)])
+
+    @skipUnless(connection.vendor == 'postgresql', "trigram search needs PostgreSQL with pg_trgm")
+    def test_trigram_backend_filters_like_basic_and_ranks_by_similarity(self):
+        backend = TrigramSearchBackend()
+        self.assert_backend_filters(backend)
+        ranked = backend.rank(Customer.objects.filter(pk__in=['S3', 'S4']), 'solar', 'name')
+        self.assertEqual(list(ranked.order_by('-search_rank').values_list('pk', flat=True)), ['S3', 'S4'])
+
+    def test_backend_setting(self):
+        self.assertIsInstance(get_search_backend('auto'),
+                              TrigramSearchBackend if connection.vendor == 'postgresql' else BasicSearchBackend)
+        with override_settings(CUSTOMER_SEARCH_BACKEND='elastic'):
+            with self.assertRaisesMessage(ImproperlyConfigured, "'elastic'"):
+                get_search_backend()
+
+
+class CustomerTypeaheadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('typeahead', 'typeahead@example.com', 'typeahead')
+        Customer.objects.bulk_create([
+            Customer(id_customer='TA1', customer_name='Beta Solar'),
+            Customer(id_customer='TA2', customer_name='Solar Alpha'),
+            Customer(id_customer='TA3', customer_name='Alpha Solar Works'),
+            Customer(id_customer='TA4', customer_name='Solar Beta'),
+            Customer(id_customer='SOL9', customer_name='Zeta'),
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def results(self, **params):
+        response = self.client.get(reverse('customer_typeahead'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, [row['id_customer'] for row in response.json()['results']]
+
+    def test_prefix_matches_come_before_contains_matches(self):
+        response, ids = self.results(q='sol')
+        # Prefix on name or ID first (by name), then substring matches (by name).
+        self.assertEqual(ids, ['TA2', 'TA4', 'SOL9', 'TA3', 'TA1'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+    def test_limit_is_applied_and_clamped(self):
+        self.assertEqual(self.results(q='sol', limit=2)[1], ['TA2', 'TA4'])
+        self.assertEqual(self.results(q='sol', limit=4)[1], ['TA2', 'TA4', 'SOL9', 'TA3'])
+        self.assertEqual(len(self.results(q='sol', limit=0)[1]), 1)
+        self.assertEqual(len(self.results(q='sol', limit='x')[1]), 5)
+        self.assertEqual(self.results(q='')[1], [])
+
+
+class CustomerExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('exporter', 'exporter@example.com', 'exporter')
+        seed_data(len(END_DATE_OFFSETS) + 2, prefix='EXP')
+        Customer.objects.filter(pk='EXP000001').update(customer_name='=HYPERLINK("http://x")', address='-1+2')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def export(self, params=None):
+        response = self.client.get(reverse('export_customers'), params or {})
+        self.assertEqual(response.status_code, 200)
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_header_and_status_columns(self):
+        header, *rows = self.export()
+        self.assertEqual(header, export_header())
+        self.assertEqual(header[10:15], ['insurance_color', 'insurance_green', 'insurance_yellow', 'insurance_red',
+                                         'insurance_total'])
+        self.assertEqual(len(rows), Customer.objects.count())
+
+        customers = attach_group_statuses(list(Customer.objects.all()), timezone.now().date())
+        expected = {
+            customer.pk: [str(getattr(customer, attr)[column]) for attr, _, _, _ in STATUS_GROUPS
+                          for column in ('color', 'green', 'yellow', 'red', 'total')]
+            for customer in customers
+        }
+        self.assertEqual({row[0]: row[10:] for row in rows}, expected)
+
+    def test_formula_cells_are_escaped(self):
+        row = next(row for row in self.export()[1:] if row[0] == 'EXP000001')
+        self.assertEqual(row[1:3], ['\'=HYPERLINK("http://x")', "'-1+2"])
+
+    def test_filters_and_sort_match_customer_list(self):
+        for params in (
+            {},
+            {'sort_by': '-customer_name'},
+            {'sort_by': 'urgency'},
+            {'sort_by': '-next_expiry', 'status': 'red'},
+            {'sort_by': 'insurance_status', 'warranty_status': 'green'},
+            {'expires_within': 30, 'sort_by': '-defect_status'},
+            {'query': 'EXP00000', 'search_field': 'id'},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('customer_list'), {**params, 'page_size': 100})
+                listed = [customer.pk for customer in response.context['page_obj']]
+                self.assertEqual([row[0] for row in self.export(params)[1:]], listed)
+
+    def test_command_writes_to_stdout(self):
+        out = io.StringIO()
+        call_command('export_customers', '--status', 'red', stdout=out)
+        header, *rows = csv.reader(io.StringIO(out.getvalue()))
+        self.assertEqual(header, export_header())
+        self.assertEqual([row[0] for row in rows], list(
+            Customer.objects.filter(status_summary__status_color='red').order_by('customer_name', 'pk')
+            .values_list('pk', flat=True)))
+
+
+INSURANCE_HEADER = 'no_insurance,ins_co,id_customer,sum_amount,total_payable,starting_period,end_period,status'
+
+
+def csv_text(*lines):
+    return io.StringIO('\n'.join(lines) + '\n')
+
+
+class RecordImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Customer.objects.create(id_customer='IMP1', customer_name='Existing Customer')
+        Insurance.objects.create(
+            no_insurance='POL-OLD', ins_co='Old Co', id_customer_id='IMP1', sum_amount=1, total_payable=1,
+            starting_period=date(2020, 1, 1), end_period=date(2021, 1, 1), status='Expired',
+        )
+
+    def test_missing_columns_are_reported_on_the_header_line(self):
+        result = import_records('insurance', csv_text('no_insurance,ins_co', 'P1,Co'))
+        self.assertEqual(result.errors, [(1, "Missing column(s): id_customer, sum_amount, total_payable, "
+                                             "starting_period, end_period, status.")])
+        self.assertEqual(result.rows, 0)
+
+    def test_row_errors_are_reported_per_line(self):
+        result = import_records('insurance', csv_text(
+            INSURANCE_HEADER,
+            'P1,Co,IMP1,100,10,2024-01-01,2025-01-01,Active',
+            'P2,Co,IMP1,100,10,01/02/2024,2025-01-01,Active',
+            'P3,Co,IMP1,lots,10,2024-01-01,2025-01-01,Active',
+            'P4,Co,IMP1,100,10,2024-02-30,2025-01-01,Active',
+            'P5,,IMP1,100,10,2024-01-01,2025-01-01,Active',
+            'P6,Co,NOPE,100,10,2024-01-01,2025-01-01,Active',
+        ))
+        self.assertEqual(result.errors, [
+            (3, "'starting_period' must be a date in YYYY-MM-DD format."),
+            (4, "'sum_amount' must be a number."),
+            (5, "'starting_period' must be a date in YYYY-MM-DD format."),
+            (6, "'ins_co' is required."),
+            (7, "Customer with ID 'NOPE' not found."),
+        ])
+        self.assertEqual((result.rows, result.valid, result.created), (6, 1, 1))
+        self.assertEqual(list(Insurance.objects.exclude(pk='POL-OLD').values_list('pk', flat=True)), ['P1'])
+
+    def test_other_choices_and_engineers_follow_the_form_rules(self):
+        result = import_records('customers', csv_text(
+            'id_customer,customer_name,in_charge_person,in_charge_other,engineers,engineers_other',
+            'IMP2,Other Rules,Other,Aminah,"Ali, Bala",Chong',
+        ))
+        self.assertEqual(result.errors, [])
+        customer = Customer.objects.get(pk='IMP2')
+        self.assertEqual((customer.in_charge_person, customer.engineers), ('Aminah', 'Ali,Bala,Chong'))
+
+        result = import_records('warranties', csv_text(
+            'id_customer,product_select,product_other,start_date,end_date',
+            'IMP1,other,,2024-01-01,2026-01-01',
+            'IMP1,,,2024-01-01,2026-01-01',
+            'IMP1,other,Solar Pump,2024-01-01,2026-01-01',
+        ))
+        self.assertEqual(result.errors, [
+            (2, "You selected 'Other' but did not specify a product name."),
+            (3, "You must select a product name."),
+        ])
+        self.assertEqual(list(Warranty.objects.values_list('product_name', flat=True)), ['Solar Pump'])
+
+    def test_duplicate_keys_in_the_file_and_in_the_database(self):
+        result = import_records('insurance', csv_text(
+            INSURANCE_HEADER,
+            'POL-OLD,Co,IMP1,100,10,2024-01-01,2025-01-01,Active',
+            'P1,Co,IMP1,100,10,2024-01-01,2025-01-01,Active',
+            'P1,Co,IMP1,100,10,2024-01-01,2025-01-01,Active',
+        ))
+        self.assertEqual(result.errors, [(2, "'POL-OLD' already exists."), (4, "'P1' appears more than once in this file.")])
+        self.assertEqual(result.created, 1)
+
+        # A later batch checks against the rows the earlier batches wrote.
+        result = import_records('insurance', csv_text(
+            INSURANCE_HEADER,
+            'P2,Co,IMP1,100,10,2024-01-01,2025-01-01,Active',
+            'P1,Co,IMP1,100,10,2024-01-01,2025-01-01,Active',
+        ), batch_size=1)
+        self.assertEqual(result.errors, [(3, "'P1' already exists.")])
+
+    def test_dry_run_writes_nothing(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as source:
+            source.write('id_customer,customer_name\nIMP2,Dry Run\nIMP1,Existing Again\n')
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_records', 'customers', source.name, '--dry-run', stdout=out, stderr=err)
+        os.unlink(source.name)
+        self.assertIn('Dry run: 1 of 2 row(s) valid, 1 error(s).', out.getvalue())
+        self.assertIn("line 3: 'IMP1' already exists.", err.getvalue())
+        self.assertFalse(Customer.objects.filter(pk='IMP2').exists())
+        self.assertFalse(CustomerStatusSummary.objects.exists())
+
+    def test_a_failed_batch_rolls_back_and_reports_each_of_its_lines(self):
+        refresh_summaries = imports.refresh_customer_summaries
+
+        def refresh(customer_ids):
+            if 'IMP3' in customer_ids:
+                raise DatabaseError('disk full')
+            return refresh_summaries(customer_ids)
+        with mock.patch.object(imports, 'refresh_customer_summaries', side_effect=refresh):
+            result = import_records('customers', csv_text(
+                'id_customer,customer_name', 'IMP2,First Batch', 'IMP4,First Batch', 'IMP3,Second Batch', 'IMP5,Second Batch',
+            ), batch_size=2)
+        self.assertEqual(result.errors, [(4, 'Batch rolled back: disk full'), (5, 'Batch rolled back: disk full')])
+        self.assertEqual(result.created, 2)
+        self.assertEqual(sorted(Customer.objects.values_list('pk', flat=True)), ['IMP1', 'IMP2', 'IMP4'])
+
+    def test_summaries_and_fragment_stamps_are_refreshed_after_bulk_create(self):
+        cache.clear()
+        stamp = customer_fragment_stamp('IMP1')
+        end_period = timezone.now().date() + timezone.timedelta(days=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            result = import_records('insurance', csv_text(
+                INSURANCE_HEADER, f'P1,Co,IMP1,100,10,2024-01-01,{end_period},Active',
+            ))
+        self.assertEqual(result.created, 1)
+        summary = CustomerStatusSummary.objects.get(customer_id='IMP1')
+        self.assertEqual((summary.insurance_color, summary.insurance_yellow, summary.next_expiry),
+                         ('yellow', 1, end_period))
+        self.assertNotEqual(customer_fragment_stamp('IMP1'), stamp)
+
+
+class NotificationCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('counters', 'counters@example.com', 'counters')
+        seed_data(len(END_DATE_OFFSETS), prefix='CNT')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counters_are_cached_and_reset_only_after_commit(self):
+        counters = get_notification_counters(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_notification_counters(self.user), counters)
+
+        customer = Customer.objects.order_by('pk').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            Warranty.objects.create(
+                id_customer=customer, product_name='Battery',
+                start_date=date(2020, 1, 1), end_date=timezone.now().date(),
+            )
+            # Still inside the writing transaction: the cached value stands.
+            with self.assertNumQueries(0):
+                get_notification_counters(self.user)
+        self.assertEqual(get_notification_counters(self.user)['expiring_items_count'],
+                         counters['expiring_items_count'] + 1)
+
+    def test_per_process_cache_keeps_counters_briefly(self):
+        for shared in (True, False):
+            with self.subTest(shared=shared), override_settings(SHARED_CACHE=shared, LOCAL_CACHE_TIMEOUT=0):
+                cache.clear()
+                get_notification_counters(self.user)
+                get_dashboard_stats()
+                with CaptureQueriesContext(connection) as queries:
+                    get_notification_counters(self.user)
+                    get_dashboard_stats()
+                # LOCAL_CACHE_TIMEOUT=0: a per-process cache does not keep them at all.
+                self.assertEqual(len(queries) > 0, not shared)
+
+    def test_pending_renewals_are_counted_before_the_daily_roll(self):
+        today = timezone.now().date()
+        expected = renewals.pending_renewal_count(today)
+        self.assertGreater(expected, 1)
+        # One notice dismissed; the rest not generated yet because roll_calendar has not run today.
+        dismissed = renewals.pending_notices(today).order_by('pk').first()
+        dismissed.is_dismissed = True
+        dismissed.save()
+        InsuranceRenewalNotice.objects.filter(is_dismissed=False).delete()
+        cache.clear()
+
+        self.assertEqual(get_notification_counters(self.user)['pending_renewal_count'], expected - 1)
+        self.assertEqual(InsuranceRenewalNotice.objects.count(), 1)
+
+        run_job('roll_calendar', today)
+        self.assertEqual(get_notification_counters(self.user)['pending_renewal_count'], expected - 1)
+
+
+def baseline_dashboard_figures(today):
+    # The dashboard's original one-count-per-figure queries.
+    soon = today + timezone.timedelta(days=30)
+    return {
+        'total_expired_count': (
+            Insurance.objects.filter(end_period__lt=today).count()
+            + Warranty.objects.filter(end_date__lt=today).count()
+            + Defect.objects.filter(resolution_deadline__lt=today, accident_date__isnull=True).count()
+        ),
+        'expiring_items_count': (
+            Insurance.objects.filter(end_period__gte=today, end_period__lte=soon).count()
+            + Warranty.objects.filter(end_date__gte=today, end_date__lte=soon).count()
+            + Defect.objects.filter(resolution_deadline__gte=today, resolution_deadline__lte=soon,
+                                    accident_date__isnull=True).count()
+        ),
+        'total_customers_count': Customer.objects.count(),
+        'active_policies_count': Insurance.objects.filter(end_period__gte=today).count(),
+    }
+
+
+class DashboardStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('dashboard', 'dashboard@example.com', 'dashboard')
+        seed_data(len(END_DATE_OFFSETS), prefix='DSH')
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.now().date()
+
+    def assertMatchesBaseline(self, stats):
+        baseline = baseline_dashboard_figures(self.today)
+        self.assertEqual({key: stats[key] for key in baseline}, baseline)
+
+    def test_cached_figures_follow_create_update_and_delete(self):
+        self.assertMatchesBaseline(get_dashboard_stats(self.today))
+        customer = Customer.objects.order_by('pk').first()
+
+        def create():
+            Warranty.objects.create(id_customer=customer, product_name='Inverter',
+                                    start_date=date(2020, 1, 1), end_date=self.today)
+
+        def update():
+            insurance = Insurance.objects.filter(end_period__gte=self.today).order_by('pk').first()
+            insurance.end_period = self.today - timezone.timedelta(days=1)
+            insurance.save()
+
+        def delete():
+            Defect.objects.filter(accident_date__isnull=True).order_by('pk').first().delete()
+
+        for change in (create, update, delete):
+            with self.subTest(change=change.__name__):
+                before = get_dashboard_stats(self.today)
+                with self.captureOnCommitCallbacks(execute=True):
+                    change()
+                    # Still inside the writing transaction: the cached figures stand.
+                    with self.assertNumQueries(0):
+                        self.assertEqual(get_dashboard_stats(self.today), before)
+                self.assertMatchesBaseline(get_dashboard_stats(self.today))
+
+    def test_customer_delete_cascades_into_fresh_figures(self):
+        get_dashboard_stats(self.today)
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.order_by('pk').first().delete()
+        self.assertMatchesBaseline(get_dashboard_stats(self.today))
+
+    def test_json_endpoint_serves_the_cached_figures(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('dashboard_stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertMatchesBaseline(response.json())
+        self.assertEqual(response.json()['date'], self.today.isoformat())
+
+        with self.assertNumQueries(2):  # session and user only
+            self.assertEqual(self.client.get(reverse('dashboard_stats')).json(), response.json())
+
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('dashboard_stats')).status_code, 302)
+
+
+class JobRunTests(TestCase):
+
+    def test_daily_job_runs_once_per_date_and_records_rows(self):
+        seed_data(4, prefix='JOB')
+        today = timezone.now().date()
+        InsuranceRenewalNotice.objects.all().delete()
+
+        run = run_job('roll_calendar', today)
+        self.assertEqual(run.status, JobRun.SUCCEEDED)
+        self.assertEqual(run.rows['renewal_notices'], InsuranceRenewalNotice.objects.count())
+        self.assertIsNotNone(run.duration_ms)
+        self.assertIsNone(run_job('roll_calendar', today))
+        self.assertEqual(run_job('roll_calendar', today, force=True).rows['renewal_notices'], 0)
+
+    def test_notices_written_by_a_concurrent_run_are_not_counted(self):
+        seed_data(1, prefix='DUP')
+        insurance = Insurance.objects.get()
+
+        def notice(year):
+            return InsuranceRenewalNotice(insurance=insurance, renewal_year=year, due_date=date(year, 1, 1))
+        self.assertEqual(insert_notices([notice(1990)]), 1)
+        # A run that read the notices before the other run committed tries 1990 again.
+        self.assertEqual(insert_notices([notice(1990), notice(1991)]), 1)
+        self.assertEqual(InsuranceRenewalNotice.objects.filter(insurance=insurance, renewal_year__lt=2000).count(), 2)
+
+    def test_policies_ending_on_29_february_start_on_the_28th(self):
+        leap_day = timezone.make_aware(timezone.datetime(2028, 2, 29, 12))
+        with mock.patch('django.utils.timezone.now', return_value=leap_day):
+            seed_data(3, prefix='LEAP')
+        insurance = Insurance.objects.get(end_period=date(2028, 2, 29))
+        self.assertEqual(insurance.starting_period, date(2025, 2, 28))
+
+
+class ViewLatencyBenchmark(ViewQueryBudgetMixin, TestCase):
+    """
+    Opt-in: BENCHMARK_BASELINE=path/to/baseline.json python manage.py test
+    insurance_app.tests.ViewLatencyBenchmark. Fails when a view issues more
+    queries than the recorded baseline, otherwise rewrites the baseline.
+    """
+
+    def test_record_latency_baseline(self):
+        if not BENCHMARK_BASELINE:
+            self.skipTest("BENCHMARK_BASELINE is not set.")
+
+        previous = {}
+        if os.path.exists(BENCHMARK_BASELINE):
+            with open(BENCHMARK_BASELINE) as baseline_file:
+                previous = json.load(baseline_file).get('views', {})
+
+        results = {}
+        for name in url_names():
+            url = reverse(name, kwargs=url_kwargs(name))
+            timings = []
+            for _ in range(BENCHMARK_REPEAT):
+                cache.clear()
+                start = time.perf_counter()
+                self.client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = {
+                'queries': self.count_queries(name),
+                'p50_ms': round(statistics.median(timings), 2),
+                'p95_ms': round(percentile(timings, 0.95), 2),
+            }
+
+        grown = {
+            name: (previous[name]['queries'], result['queries'])
+            for name, result in results.items()
+            if name in previous and result['queries'] > previous[name]['queries']
+        }
+
+        self.assertEqual(grown, {}, "Query counts grew since the last baseline (before, after).")
+
+        with open(BENCHMARK_BASELINE, 'w') as baseline_file:
+            json.dump({
+                'recorded': date.today().isoformat(),
+                'scale': {
+                    'customers': self.seed_customers,
+                    'policy_years': BENCHMARK_POLICY_YEARS,
+                    'warranties': BENCHMARK_WARRANTIES,
+                    'defects': BENCHMARK_DEFECTS,
+                    'files': BENCHMARK_FILES,
+                },
+                'views': results,
+            }, baseline_file, indent=2, sort_keys=True)
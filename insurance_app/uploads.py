@@ -0,0 +1,263 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+
+from .models import Customer, CustomerFile
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development machines
+    fcntl = None
+
+READ_BLOCK_SIZE = 64 * 1024
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+class PartialFile(File):
+    # FileSystemStorage moves content that has a temporary_file_path() instead
+    # of copying it; other storage backends read it in chunks.
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def upload_dir():
+    return settings.CUSTOMER_UPLOAD_TEMP_DIR or os.path.join(settings.MEDIA_ROOT, '.uploads')
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(READ_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def store_customer_file(customer_id, content, filename, description=''):
+    """Write the file to storage first, then insert the row in a short transaction."""
+    name = CustomerFile._meta.get_field('file').generate_filename(None, filename)
+    name = default_storage.save(name, content)
+    try:
+        with transaction.atomic():
+            return CustomerFile.objects.create(id_customer_id=customer_id, file=name, description=description)
+    except Exception:
+        default_storage.delete(name)
+        raise
+
+
+class UploadSession:
+    """
+    A resumable upload kept as ``<id>.part`` plus a ``<id>.json`` sidecar in
+    upload_dir(). The part file's size is the resume offset, so chunks need
+    no database writes; the CustomerFile row is created on finalize.
+    """
+
+    def __init__(self, upload_id, meta):
+        self.upload_id = upload_id
+        self.meta = meta
+
+    @property
+    def part_path(self):
+        return os.path.join(upload_dir(), f'{self.upload_id}.part')
+
+    @property
+    def meta_path(self):
+        return os.path.join(upload_dir(), f'{self.upload_id}.json')
+
+    @property
+    def storing_path(self):
+        return os.path.join(upload_dir(), f'{self.upload_id}.storing')
+
+    @property
+    def offset(self):
+        try:
+            return os.path.getsize(self.part_path)
+        except FileNotFoundError:
+            raise self.part_missing()
+
+    def part_missing(self):
+        # purge_stale_uploads() or a finalize in another request removed the
+        # part file; drop the sidecar too so the upload is simply gone.
+        self.discard()
+        return UploadError("Upload not found.", status=404)
+
+    @classmethod
+    def start(cls, customer_id, user, filename, size, sha256='', description=''):
+        filename = os.path.basename((filename or '').replace('\\', '/')).strip()
+        if not filename:
+            raise UploadError("A file name is required.")
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            raise UploadError("The file size must be a whole number of bytes.")
+        if size <= 0:
+            raise UploadError("The file is empty.")
+        if size > settings.CUSTOMER_UPLOAD_MAX_SIZE:
+            raise UploadError("The file is larger than the upload limit.", status=413)
+        sha256 = (sha256 or '').strip().lower()
+        if sha256 and not SHA256_PATTERN.match(sha256):
+            raise UploadError("sha256 must be a hex SHA-256 digest.")
+
+        session = cls(str(uuid.uuid4()), {
+            'customer_id': customer_id,
+            'user_id': user.pk,
+            'filename': filename,
+            'size': size,
+            'sha256': sha256,
+            'description': description or '',
+            'created': time.time(),
+        })
+        os.makedirs(upload_dir(), exist_ok=True)
+        open(session.part_path, 'xb').close()
+        with open(session.meta_path, 'x') as fh:
+            json.dump(session.meta, fh)
+        return session
+
+    @classmethod
+    def load(cls, upload_id, user):
+        session = cls(upload_id, None)
+        try:
+            with open(session.meta_path) as fh:
+                session.meta = json.load(fh)
+        except (OSError, ValueError):
+            raise UploadError("Upload not found.", status=404)
+        if session.meta['user_id'] != user.pk:
+            raise UploadError("Upload not found.", status=404)
+        return session
+
+    def status(self):
+        return {
+            'upload_id': self.upload_id,
+            'filename': self.meta['filename'],
+            'size': self.meta['size'],
+            'offset': self.offset,
+            'chunk_size': settings.CUSTOMER_UPLOAD_CHUNK_SIZE,
+        }
+
+    def append(self, stream, offset, length, chunk_sha256=''):
+        if length <= 0:
+            raise UploadError("The chunk is empty.")
+        if length > settings.CUSTOMER_UPLOAD_CHUNK_SIZE:
+            raise UploadError("The chunk is larger than chunk_size.", status=413)
+
+        try:
+            # Not 'ab', which would recreate a part file that has been purged.
+            fh = open(self.part_path, 'r+b')
+        except FileNotFoundError:
+            raise self.part_missing()
+        with fh:
+            fh.seek(0, os.SEEK_END)
+            if fcntl is not None:
+                try:
+                    fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise UploadError("Another chunk is being written.", status=409, offset=fh.tell())
+            current = fh.tell()
+            if offset != current:
+                raise UploadError("Upload-Offset does not match the bytes received.", status=409, offset=current)
+            if current + length > self.meta['size']:
+                raise UploadError("The chunk runs past the declared file size.", offset=current)
+
+            digest = hashlib.sha256()
+            remaining = length
+            while remaining:
+                block = stream.read(min(READ_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                fh.write(block)
+                digest.update(block)
+                remaining -= len(block)
+
+            if remaining or (chunk_sha256 and digest.hexdigest() != chunk_sha256.strip().lower()):
+                # Keep uploads chunk-aligned: drop a short or corrupt chunk so the client resends it.
+                fh.truncate(current)
+                raise UploadError("The chunk was incomplete or failed its checksum.", status=422, offset=current)
+        return current + length
+
+    def finalize(self):
+        offset = self.offset
+        if offset != self.meta['size']:
+            raise UploadError("The upload is not complete.", status=409, offset=offset)
+        if not Customer.objects.filter(pk=self.meta['customer_id']).exists():
+            self.discard()
+            raise UploadError("Customer not found.", status=404)
+        try:
+            if self.meta['sha256'] and file_sha256(self.part_path) != self.meta['sha256']:
+                self.discard()
+                raise UploadError("The uploaded file does not match its sha256; start the upload again.", status=422)
+            self.link_for_storing()
+        except FileNotFoundError:
+            raise self.part_missing()
+
+        # Storage may move the .storing link away; the part file stays until
+        # the row exists, so a failed finalize can be retried.
+        try:
+            with open(self.storing_path, 'rb') as fh:
+                customer_file = store_customer_file(
+                    self.meta['customer_id'],
+                    PartialFile(fh, name=self.meta['filename']),
+                    self.meta['filename'],
+                    self.meta['description'],
+                )
+        except (IntegrityError, Customer.DoesNotExist):
+            # The customer was deleted while the file was being stored.
+            self.discard()
+            raise UploadError("Customer not found.", status=404)
+        finally:
+            self.remove(self.storing_path)
+        self.discard()
+        return customer_file
+
+    def link_for_storing(self):
+        try:
+            os.link(self.part_path, self.storing_path)
+        except FileExistsError:
+            raise UploadError("The upload is already being finalized.", status=409)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            # No hard links on this filesystem.
+            shutil.copyfile(self.part_path, self.storing_path)
+
+    def discard(self):
+        for path in (self.part_path, self.meta_path, self.storing_path):
+            self.remove(path)
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def purge_stale_uploads(max_age=None, now=None):
+    if max_age is None:
+        max_age = settings.CUSTOMER_UPLOAD_SESSION_MAX_AGE
+    if now is None:
+        now = time.time()
+    if not os.path.isdir(upload_dir()):
+        return 0
+
+    purged = 0
+    with os.scandir(upload_dir()) as entries:
+        for entry in entries:
+            if entry.name.endswith('.part') and now - entry.stat().st_mtime > max_age:
+                UploadSession(entry.name[:-len('.part')], None).discard()
+                purged += 1
+    return purged
@@ -4,16 +4,25 @@ from . import views
 urlpatterns = [
     # Main pages
     path('', views.main_page, name='main_page'),
+    path('api/dashboard/', views.dashboard_stats, name='dashboard_stats'),
+    path('metrics', views.metrics, name='metrics'),
     path('notifications/', views.notification_page, name='notification_page'),
     path('notification_page/', views.notification_page, name='notification_page'),
     path('renewals/', views.renewal_notices_page, name='renewal_notices_page'),
     path('renewals/dismiss/<int:notice_pk>/', views.dismiss_renewal, name='dismiss_renewal'), 
     path('customer_list/', views.customer_list, name='customer_list'),
+    path('customer_list/export/', views.export_customers, name='export_customers'),
+    path('import/', views.import_records, name='import_records'),
+    path('api/customer_typeahead/', views.customer_typeahead, name='customer_typeahead'),
 
     # Customer CRUD
     path('customers/', views.customer_list, name='customer_list'),
     path('customers/<str:pk>/', views.customer_detail, name='customer_detail'),
     path('customers/<str:customer_pk>/upload_file/', views.upload_customer_file, name='upload_customer_file'),
+    path('customers/<str:customer_pk>/uploads/', views.start_customer_upload, name='start_customer_upload'),
+    path('uploads/<uuid:upload_id>/', views.customer_upload, name='customer_upload'),
+    path('files/<int:file_pk>/', views.download_customer_file, name='download_customer_file'),
+    path('files/<int:file_pk>/preview/', views.customer_file_preview, name='customer_file_preview'),
     path('delete_file/<int:file_pk>/', views.delete_customer_file, name='delete_customer_file'),
     path('add_customer/', views.add_customer, name='add_customer'),
     path('edit_customer/<str:pk>/', views.edit_customer, name='edit_customer'),
@@ -0,0 +1,33 @@
+WARRANTY_PRODUCTS = [
+    "Inverter", "String Inverter", "Hybrid Inverter",
+    "Battery-based Inverter", "Micro Inverter", "Central Optimiser", "Central Inverter"
+]
+
+
+class RuleError(ValueError):
+    pass
+
+
+def resolve_other_choice(choice, other):
+    if choice == 'Other':
+        return other
+    return choice
+
+
+def join_engineers(engineer_list, engineers_other):
+    engineer_list = list(engineer_list)
+    if engineers_other:
+        extras = [e.strip() for e in engineers_other.split(',') if e.strip()]
+        engineer_list.extend(extras)
+    return ",".join(engineer_list)
+
+
+def resolve_warranty_product(product_choice, other_product):
+    other_product = (other_product or '').strip()
+    if product_choice == 'other':
+        if other_product:
+            return other_product
+        raise RuleError("You selected 'Other' but did not specify a product name.")
+    if product_choice:
+        return product_choice
+    raise RuleError("You must select a product name.")
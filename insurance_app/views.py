@@ -1,140 +1,137 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.exceptions import PermissionDenied
+from django.utils.cache import patch_cache_control
+from django.conf import settings
 from .models import Customer, Insurance, Warranty, Defect, CustomerFile, InsuranceRenewalNotice 
+from . import jobs
+from .dashboard import aget_dashboard_stats, get_dashboard_stats
+from .downloads import serve_file
+from .exports import export_queryset, export_rows, stream_csv
+from .imports import IMPORTERS, import_records as run_import
+from .fragments import customer_fragment_stamp, seconds_until_tomorrow
+from .feeds import FEED_STATUSES, FEED_TYPES, expiring_items_feed, feed_row_to_item
+from .metrics import render_prometheus
+from .parallel import gather_reads
+from .previews import PLACEHOLDER_MAX_AGE, PREVIEW_CONTENT_TYPE, open_preview, placeholder_svg
+from .routers import keep_read_database, reads_from_replica
+from .pagination import KeysetPaginator, PAGE_SIZE_CHOICES, get_page_size
+from .search import clean_sort, get_search_backend, sort_ordering
+from .validation import RuleError, WARRANTY_PRODUCTS, join_engineers, resolve_other_choice, resolve_warranty_product
+from .summaries import (
+    EXPIRES_WITHIN_CHOICES, LIVE_PREFIX, STATUS_COLORS, SUMMARY_GROUPS, SUMMARY_PREFIX, annotate_live_status,
+    attach_summary_statuses, filter_by_status, get_expires_within, is_status_sort, order_by_status, uses_summaries,
+)
+from .status import get_status_color
+from .uploads import UploadError, UploadSession, store_customer_file
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db.models import Q, Max
 from django.contrib import messages
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from django.db import transaction
 from itertools import chain
 from django.contrib.auth.decorators import login_required, permission_required
+from django.contrib.auth.views import redirect_to_login
+from django.utils.crypto import constant_time_compare
+import io
 import os
-import json
+from urllib.parse import urlencode
 from datetime import date 
 
-def get_status_color(end_date):
-    today = timezone.now().date()
-    thirty_days_from_now = today + timezone.timedelta(days=30)
-    
-    if end_date < today:
-        return 'red' 
-    if today <= end_date <= thirty_days_from_now:
-        return 'yellow'
-    return 'green'
-
-def get_detailed_group_status(items, date_field_name):
-    if not items:
-        return {'color': 'gray', 'green': 0, 'yellow': 0, 'red': 0, 'gray': 0, 'total': 0}
-
-    status_counts = {'green': 0, 'yellow': 0, 'red': 0, 'gray': 0}
-    for item in items:
-        color = get_status_color(getattr(item, date_field_name)) 
-        status_counts[color] += 1
-    
-    summary_color = 'green' 
-    statuses_present = {s for s, count in status_counts.items() if count > 0}
-    
-    if 'yellow' in statuses_present:
-        summary_color = 'yellow'
-    elif 'red' in statuses_present and 'green' in statuses_present:
-        summary_color = 'yellow'
-    elif statuses_present == {'green'}:
-        summary_color = 'green'
-    elif statuses_present == {'red'}:
-        summary_color = 'red'
-
-    return {
-        'color': summary_color,
-        'green': status_counts['green'],
-        'yellow': status_counts['yellow'],
-        'red': status_counts['red'],
-        'total': len(items)
-    }
+NOTIFICATION_PAGE_SIZE = 50
+IMPORT_ERROR_DISPLAY_LIMIT = 200
+
+async def arender(request, template_name, context):
+    # The async auth decorators cache the user from request.auser() apart from
+    # the lazy request.user that the sync context processors read; share it.
+    request.user = await request.auser()
+    # Rendering runs the sync context processors (sidebar counters), so it stays in a thread.
+    return await sync_to_async(render)(request, template_name, context)
+
 
+@reads_from_replica
 @login_required
-def main_page(request):
-    today = timezone.now().date()
-    thirty_days_from_now = today + timezone.timedelta(days=30)
-    expired_insurances = Insurance.objects.filter(end_period__lt=today).count()
-    expired_warranties = Warranty.objects.filter(end_date__lt=today).count()
-    expired_defects = Defect.objects.filter(resolution_deadline__lt=today, accident_date__isnull=True).count()
-    total_expired_count = expired_insurances + expired_warranties + expired_defects
-    expiring_insurances = Insurance.objects.filter(end_period__gte=today, end_period__lte=thirty_days_from_now).count()
-    expiring_warranties = Warranty.objects.filter(end_date__gte=today, end_date__lte=thirty_days_from_now).count()
-    expiring_defects = Defect.objects.filter(resolution_deadline__gte=today, resolution_deadline__lte=thirty_days_from_now, accident_date__isnull=True).count()
-    total_expiring_soon_count = expiring_insurances + expiring_warranties + expiring_defects
-
-    total_customers_count = Customer.objects.count()
-    active_policies_count = Insurance.objects.filter(end_period__gte=today).count()
-    
+async def main_page(request):
+    stats = await aget_dashboard_stats()
+
     context = {
-        'total_expired_count': total_expired_count,
-        'expiring_items_count': total_expiring_soon_count,
-        'total_customers_count': total_customers_count,
-        'active_policies_count': active_policies_count, 
+        'total_expired_count': stats['total_expired_count'],
+        'expiring_items_count': stats['expiring_items_count'],
+        'total_customers_count': stats['total_customers_count'],
+        'active_policies_count': stats['active_policies_count'],
     }
-    return render(request, 'insurance_app/main_page.html', context)
+    return await arender(request, 'insurance_app/main_page.html', context)
+
+
+def metrics(request):
+    """Prometheus text exposition for staff, or for a scraper presenting METRICS_TOKEN."""
+    token = settings.METRICS_TOKEN
+    if not (token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')):
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        if not request.user.is_staff:
+            raise PermissionDenied
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 
+@reads_from_replica
 @login_required
-def notification_page(request):
+def dashboard_stats(request):
+    return JsonResponse(get_dashboard_stats())
+
+@reads_from_replica
+@login_required
+async def notification_page(request):
     today = timezone.now().date()
-    thirty_days_from_now = today + timezone.timedelta(days=30)
-    
-    insurances = Insurance.objects.filter(end_period__lte=thirty_days_from_now)
-    warranties = Warranty.objects.filter(end_date__lte=thirty_days_from_now)
-    defects = Defect.objects.filter(resolution_deadline__lte=thirty_days_from_now, accident_date__isnull=True)
+    item_type = request.GET.get('type', '')
+    status = request.GET.get('status', '')
+    if item_type not in FEED_TYPES:
+        item_type = ''
+    if status not in FEED_STATUSES:
+        status = ''
+
+    feed = expiring_items_feed(today, item_type=item_type or None, status=status or None)
+    page_size = get_page_size(request.GET.get('page_size'), default=NOTIFICATION_PAGE_SIZE)
+    try:
+        page_number = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page_number = 1
+
+    # The count and the requested page are independent reads; only an
+    # out-of-range page number needs a second fetch of the last page.
+    count, rows = await gather_reads(
+        feed.count,
+        lambda: list(feed[(page_number - 1) * page_size:page_number * page_size]),
+    )
+    paginator = Paginator(feed, page_size)
+    paginator.count = count
+    if page_number > paginator.num_pages:
+        page_number = paginator.num_pages
+        rows = await sync_to_async(list)(feed[(page_number - 1) * page_size:page_number * page_size])
+    page_obj = paginator.page(page_number)
+    page_obj.object_list = rows
 
-    expiring_items = []
-    
-    for item in insurances:
-        expiring_items.append({
-            'type': 'Insurance',
-            'customer': item.id_customer,
-            'end_date': item.end_period,
-            'status_color': get_status_color(item.end_period)
-        })
-    for item in warranties:
-        expiring_items.append({
-            'type': 'Warranty',
-            'customer': item.id_customer,
-            'end_date': item.end_date,
-            'status_color': get_status_color(item.end_date)
-        })
-    for item in defects:
-        expiring_items.append({
-            'type': 'Defect Liability',
-            'customer': item.id_customer,
-            'end_date': item.resolution_deadline,
-            'status_color': get_status_color(item.resolution_deadline)
-        })
-    sorted_expiring_items = sorted(expiring_items, key=lambda x: x['end_date'])
-    
     context = {
-        'items': sorted_expiring_items,
+        'items': [feed_row_to_item(row, today) for row in rows],
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
+        'item_type': item_type,
+        'status': status,
+        'page_size': page_size,
     }
-    return render(request, 'insurance_app/notification_page.html', context)
+    return await arender(request, 'insurance_app/notification_page.html', context)
 
 
 @login_required
 @permission_required('insurance_app.change_insurance', raise_exception=True) 
 def renewal_notices_page(request):
     today = timezone.now().date()
-    active_policies = Insurance.objects.filter(end_period__gt=today)
-    
-    for policy in active_policies:
-        start_year = policy.starting_period.year
-        end_year = policy.end_period.year
-
-        for year in range(start_year + 1, end_year + 1):
-            renewal_due_date = policy.end_period.replace(year=year)
-
-            if renewal_due_date <= today and today < policy.end_period:
-                InsuranceRenewalNotice.objects.get_or_create(
-                    insurance=policy,
-                    renewal_year=year,
-                    defaults={'due_date': renewal_due_date, 'is_dismissed': False}
-                )
+    jobs.ensure_job_ran('roll_calendar', today)
 
-    renewal_notices_to_show = InsuranceRenewalNotice.objects.filter(
+    renewal_notices_to_show = InsuranceRenewalNotice.objects.for_notice_list().filter(
         is_dismissed=False,
         due_date__lte=today 
     ).order_by('due_date')
@@ -151,107 +148,177 @@ def dismiss_renewal(request, notice_pk):
         notice = get_object_or_404(InsuranceRenewalNotice, pk=notice_pk)
         notice.is_dismissed = True
         notice.save()
-        messages.success(request, f"Renewal for {notice.insurance.no_insurance} (Year {notice.renewal_year}) has been marked as complete.")
+        messages.success(request, f"Renewal for {notice.insurance_id} (Year {notice.renewal_year}) has been marked as complete.")
     
     return redirect('renewal_notices_page') 
 
+@reads_from_replica
 @login_required
 @permission_required('insurance_app.view_customer', raise_exception=True)
 def customer_list(request):
     query = request.GET.get('query', '')
     search_field = request.GET.get('search_field', 'all')
     sort_by = request.GET.get('sort_by', 'customer_name')
+    status = request.GET.get('status', '')
+    if status not in STATUS_COLORS:
+        status = ''
+    group_statuses = {
+        group: request.GET.get(f'{group}_status')
+        for group in SUMMARY_GROUPS
+        if request.GET.get(f'{group}_status') in STATUS_COLORS
+    }
+    expires_within = get_expires_within(request.GET.get('expires_within'))
+    today = timezone.now().date()
 
-    customers_list = Customer.objects.all()
+    customers_list = Customer.objects.select_related('status_summary')
+    search_backend = get_search_backend()
+    status_prefix = SUMMARY_PREFIX
+    if uses_summaries(sort_by, status, group_statuses, expires_within) and not jobs.job_ran('rebuild_status_summaries', today):
+        # Summaries from an earlier day would filter and sort on yesterday's
+        # colors; the rebuild is left to the scheduler.
+        customers_list = annotate_live_status(customers_list, today)
+        status_prefix = LIVE_PREFIX
 
     if query:
-        if search_field == 'name': customers_list = customers_list.filter(customer_name__icontains=query)
-        elif search_field == 'id': customers_list = customers_list.filter(id_customer__icontains=query)
-        elif search_field == 'email': customers_list = customers_list.filter(email__icontains=query)
-        elif search_field == 'address': customers_list = customers_list.filter(address__icontains=query)
-        elif search_field == 'phone': customers_list = customers_list.filter(phone_num__icontains=query)
-        else:
-            customers_list = customers_list.filter(
-                Q(id_customer__icontains=query) | 
-                Q(customer_name__icontains=query) | 
-                Q(address__icontains=query) | 
-                Q(email__icontains=query) | 
-                Q(phone_num__icontains=query)
-            )
-    valid_sort_fields = ['id_customer', 'customer_name', 'email', 'phone_num']
-    if sort_by.lstrip('-') in valid_sort_fields:
-        customers_list = customers_list.order_by(sort_by)
+        customers_list = search_backend.filter(customers_list, query, search_field)
+    customers_list = filter_by_status(customers_list, status, group_statuses, expires_within, today, status_prefix)
+
+    page_size = get_page_size(request.GET.get('page_size'))
+    pagination = request.GET.get('pagination', settings.CUSTOMER_LIST_PAGINATION)
+    if pagination != 'cursor':
+        pagination = 'pages'
+
+    if is_status_sort(sort_by):
+        # Ordered on summary columns, which the single-field keyset cursor cannot follow.
+        pagination = 'pages'
+        customers_list = order_by_status(customers_list, sort_by, status_prefix)
+    elif sort_by == 'relevance' and query and pagination == 'pages':
+        customers_list = search_backend.rank(customers_list, query, search_field).order_by('-search_rank', 'customer_name', 'pk')
+    else:
+        sort_by = clean_sort(sort_by)
+        customers_list = customers_list.order_by(*sort_ordering(sort_by))
 
-    paginator = Paginator(customers_list, 10) 
-    page_number = request.GET.get('page')
-    
-    try:
-        page_obj = paginator.page(page_number)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
-
-    for customer in page_obj:
-        insurances = list(Insurance.objects.filter(id_customer=customer))
-        warranties = list(Warranty.objects.filter(id_customer=customer))
-        defects = list(Defect.objects.filter(id_customer=customer, accident_date__isnull=True))
-        customer.insurance_status = get_detailed_group_status(insurances, 'end_period')
-        customer.warranty_status = get_detailed_group_status(warranties, 'end_date')
-        customer.defect_status = get_detailed_group_status(defects, 'resolution_deadline')
+    if pagination == 'cursor':
+        paginator = KeysetPaginator(customers_list, sort_by, page_size)
+        page_obj = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    else:
+        paginator = Paginator(customers_list, page_size)
+        page_number = request.GET.get('page')
+        
+        try:
+            page_obj = paginator.page(page_number)
+        except PageNotAnInteger:
+            page_obj = paginator.page(1)
+        except EmptyPage:
+            page_obj = paginator.page(paginator.num_pages)
+
+    attach_summary_statuses(page_obj, today)
 
     context = {
         'page_obj': page_obj, 
         'is_paginated': page_obj.has_other_pages(),
         'query': query,
         'search_field': search_field,
+        'status': status,
+        'group_filters': [
+            (group, group.capitalize(), group_statuses.get(group, '')) for group in SUMMARY_GROUPS
+        ],
+        'expires_within': expires_within,
+        'expires_within_choices': EXPIRES_WITHIN_CHOICES,
+        'filter_params': urlencode({
+            'status': status,
+            **{f'{group}_status': color for group, color in group_statuses.items()},
+            'expires_within': expires_within or '',
+        }),
         'current_sort': sort_by,
+        'sorted_by_status': is_status_sort(sort_by) and sort_by.lstrip('-') != 'next_expiry',
+        'page_size': page_size,
+        'page_size_choices': PAGE_SIZE_CHOICES,
+        'pagination': pagination,
     }
     return render(request, 'insurance_app/customer_list.html', context)
 
 
+@reads_from_replica
 @login_required
 @permission_required('insurance_app.view_customer', raise_exception=True)
-def customer_detail(request, pk):
-    customer = get_object_or_404(Customer, pk=pk)
+def export_customers(request):
+    customers = export_queryset(
+        request.GET.get('query', ''),
+        request.GET.get('search_field', 'all'),
+        request.GET.get('sort_by', 'customer_name'),
+        request.GET.get('status', ''),
+        {group: request.GET.get(f'{group}_status') for group in SUMMARY_GROUPS},
+        get_expires_within(request.GET.get('expires_within')),
+    )
+    rows = keep_read_database(stream_csv(export_rows(customers)))
+    response = StreamingHttpResponse(rows, content_type='text/csv')
+    filename = f"customers_{timezone.now().date().isoformat()}.csv"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
-    insurances = Insurance.objects.filter(id_customer=customer)
-    for item in insurances:
-        item.status_color = get_status_color(item.end_period)
-        item.generic_end_date = item.end_period
-        
-    warranties = Warranty.objects.filter(id_customer=customer)
-    for item in warranties:
-        item.status_color = get_status_color(item.end_date)
-        item.generic_end_date = item.end_date
-
-    defects = Defect.objects.filter(id_customer=customer, accident_date__isnull=True)
-    for item in defects:
-        item.status_color = get_status_color(item.resolution_deadline)
-        item.generic_end_date = item.resolution_deadline
-
-    customer_files = CustomerFile.objects.filter(id_customer=customer)
-    all_items_for_status = list(insurances) + list(warranties) + list(defects)
-    
-    if not all_items_for_status:
-        customer.status_color, customer.status_text = 'gray', 'No Items'
-    else:
-        status_details = get_detailed_group_status(all_items_for_status, 'generic_end_date')
-        customer.status_color = status_details['color'] 
-        
-        if customer.status_color == 'green': customer.status_text = 'Active'
-        elif customer.status_color == 'yellow': customer.status_text = 'Attention Needed'
-        elif customer.status_color == 'red': customer.status_text = 'Expired'
-        else: customer.status_text = 'No Items'
 
+@login_required
+def import_records(request):
+    context = {'kinds': sorted(IMPORTERS), 'kind': request.POST.get('kind', 'customers')}
+    if request.method == 'POST':
+        kind = context['kind']
+        upload = request.FILES.get('csv_file')
+        if kind not in IMPORTERS:
+            messages.error(request, "Please choose what kind of records to import.")
+        elif not request.user.has_perm(f'insurance_app.add_{IMPORTERS[kind].model._meta.model_name}'):
+            raise PermissionDenied
+        elif not upload:
+            messages.error(request, "Please choose a CSV file to upload.")
+        else:
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            result = run_import(kind, stream, dry_run=bool(request.POST.get('dry_run')))
+            context['result'] = result
+            context['errors'] = result.errors[:IMPORT_ERROR_DISPLAY_LIMIT]
+    return render(request, 'insurance_app/import_records.html', context)
+
+
+def status_rows(queryset, date_field, today):
+    rows = list(queryset)
+    for item in rows:
+        item.status_color = get_status_color(getattr(item, date_field), today)
+        item.generic_end_date = getattr(item, date_field)
+    return rows
+
+
+@reads_from_replica
+@login_required
+@permission_required('insurance_app.view_customer', raise_exception=True)
+async def customer_detail(request, pk):
+    today = timezone.now().date()
+    customer, stamp = await gather_reads(
+        lambda: get_object_or_404(Customer.objects.select_related('status_summary'), pk=pk),
+        lambda: customer_fragment_stamp(pk, today),
+    )
+
+    await sync_to_async(attach_summary_statuses)([customer], today)
+    customer.status_color = customer.status_summary.status_color
+    if customer.status_color == 'green': customer.status_text = 'Active'
+    elif customer.status_color == 'yellow': customer.status_text = 'Attention Needed'
+    elif customer.status_color == 'red': customer.status_text = 'Expired'
+    else: customer.status_text = 'No Items'
+
+    # The tables are cached as fragments under the customer's version stamp;
+    # their rows are only loaded when rendering misses the cache.
     context = {
         'customer': customer,
-        'insurances': insurances,
-        'warranties': warranties,
-        'defects': defects,
-        'customer_files': customer_files,
+        'fragment_stamp': stamp,
+        'fragment_timeout': seconds_until_tomorrow(),
+        'insurances': SimpleLazyObject(lambda: status_rows(
+            Insurance.objects.for_detail_table().filter(id_customer=pk), 'end_period', today)),
+        'warranties': SimpleLazyObject(lambda: status_rows(
+            Warranty.objects.for_detail_table().filter(id_customer=pk), 'end_date', today)),
+        'defects': SimpleLazyObject(lambda: status_rows(
+            Defect.objects.for_detail_table().filter(id_customer=pk, accident_date__isnull=True),
+            'resolution_deadline', today)),
+        'customer_files': SimpleLazyObject(lambda: list(CustomerFile.objects.filter(id_customer=pk))),
     }
-    return render(request, 'insurance_app/customer_detail.html', context)
+    return await arender(request, 'insurance_app/customer_detail.html', context)
 
 @login_required
 @permission_required('insurance_app.add_customer', raise_exception=True)
@@ -259,21 +326,9 @@ def add_customer(request):
     if request.method == 'POST':
         try:
             with transaction.atomic():
-                in_charge = request.POST.get('in_charge_person')
-                if in_charge == 'Other':
-                    in_charge = request.POST.get('in_charge_other')
-
-                proposal = request.POST.get('proposal_prepared_by')
-                if proposal == 'Other':
-                    proposal = request.POST.get('proposal_other')
-
-                engineer_list = request.POST.getlist('engineers')
-                engineers_other = request.POST.get('engineers_other')
-                if engineers_other:
-                    extras = [e.strip() for e in engineers_other.split(',') if e.strip()]
-                    engineer_list.extend(extras)
-                
-                engineers_str = ",".join(engineer_list)
+                in_charge = resolve_other_choice(request.POST.get('in_charge_person'), request.POST.get('in_charge_other'))
+                proposal = resolve_other_choice(request.POST.get('proposal_prepared_by'), request.POST.get('proposal_other'))
+                engineers_str = join_engineers(request.POST.getlist('engineers'), request.POST.get('engineers_other'))
 
                 Customer.objects.create(
                     id_customer=request.POST.get('id_customer'),
@@ -312,21 +367,9 @@ def edit_customer(request, pk):
 
     if request.method == 'POST':
 
-        in_charge = request.POST.get('in_charge_person')
-        if in_charge == 'Other':
-            in_charge = request.POST.get('in_charge_other')
-
-        proposal = request.POST.get('proposal_prepared_by')
-        if proposal == 'Other':
-            proposal = request.POST.get('proposal_other')
-
-        engineer_list = request.POST.getlist('engineers')
-        engineers_other = request.POST.get('engineers_other')
-        if engineers_other:
-            extras = [e.strip() for e in engineers_other.split(',') if e.strip()]
-            engineer_list.extend(extras)
-        
-        engineers_str = ",".join(engineer_list)
+        in_charge = resolve_other_choice(request.POST.get('in_charge_person'), request.POST.get('in_charge_other'))
+        proposal = resolve_other_choice(request.POST.get('proposal_prepared_by'), request.POST.get('proposal_other'))
+        engineers_str = join_engineers(request.POST.getlist('engineers'), request.POST.get('engineers_other'))
 
         customer.customer_name = request.POST.get('customer_name')
         customer.address = request.POST.get('address', '') 
@@ -375,22 +418,78 @@ def delete_customer(request, pk):
         return redirect('customer_list')
     return render(request, 'insurance_app/delete_customer_confirm.html', {'customer': customer})
 
+TYPEAHEAD_DEFAULT_LIMIT = 10
+TYPEAHEAD_MAX_LIMIT = 25
+TYPEAHEAD_PERMISSIONS = (
+    'insurance_app.view_customer',
+    'insurance_app.add_insurance',
+    'insurance_app.add_defect',
+)
+
+@reads_from_replica
+@login_required
+def customer_typeahead(request):
+    if not any(request.user.has_perm(perm) for perm in TYPEAHEAD_PERMISSIONS):
+        raise PermissionDenied
+
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', TYPEAHEAD_DEFAULT_LIMIT)), 1), TYPEAHEAD_MAX_LIMIT)
+    except ValueError:
+        limit = TYPEAHEAD_DEFAULT_LIMIT
+
+    results = []
+    if query:
+        fields = ('id_customer', 'customer_name')
+        results = list(
+            Customer.objects.filter(Q(id_customer__istartswith=query) | Q(customer_name__istartswith=query))
+            .order_by('customer_name', 'id_customer')
+            .values(*fields)[:limit]
+        )
+        if len(results) < limit:
+            seen = [row['id_customer'] for row in results]
+            results += list(
+                Customer.objects.filter(Q(id_customer__icontains=query) | Q(customer_name__icontains=query))
+                .exclude(id_customer__in=seen)
+                .order_by('customer_name', 'id_customer')
+                .values(*fields)[:limit - len(results)]
+            )
+
+        if results and request.GET.get('deadlines'):
+            latest_deadlines = dict(
+                Defect.objects.filter(
+                    id_customer__in=[row['id_customer'] for row in results],
+                    resolution_deadline__isnull=False,
+                    accident_date__isnull=True,
+                )
+                .values('id_customer')
+                .annotate(latest=Max('resolution_deadline'))
+                .values_list('id_customer', 'latest')
+                .order_by()
+            )
+            for row in results:
+                deadline = latest_deadlines.get(row['id_customer'])
+                row['latest_deadline'] = deadline.isoformat() if deadline else None
+
+    response = JsonResponse({'results': results})
+    patch_cache_control(response, private=True, max_age=60)
+    return response
+
 @login_required
 @permission_required('insurance_app.add_insurance', raise_exception=True)
 def add_insurance(request):
-    customers = Customer.objects.all()
     if request.method == 'POST':
         customer_id = request.POST.get('id_customer')
 
         if not customer_id:
             messages.error(request, "Please search and select a valid customer from the list.")
-            return render(request, 'insurance_app/add_insurance.html', {'customers': customers})
+            return render(request, 'insurance_app/add_insurance.html')
 
         try:
             customer = Customer.objects.get(pk=customer_id)
         except Customer.DoesNotExist:
             messages.error(request, f"Customer with ID '{customer_id}' not found. Please select a valid customer.")
-            return render(request, 'insurance_app/add_insurance.html', {'customers': customers})
+            return render(request, 'insurance_app/add_insurance.html')
 
         try:
             Insurance.objects.create(
@@ -407,15 +506,15 @@ def add_insurance(request):
             return redirect('main_page')
         except Exception as e:
             messages.error(request, f"Error saving policy: {e}")
-            return render(request, 'insurance_app/add_insurance.html', {'customers': customers})
+            return render(request, 'insurance_app/add_insurance.html')
         
-    return render(request, 'insurance_app/add_insurance.html', {'customers': customers})
+    return render(request, 'insurance_app/add_insurance.html')
 
 
 @login_required
 @permission_required('insurance_app.change_insurance', raise_exception=True)
 def edit_insurance(request, pk):
-    insurance = get_object_or_404(Insurance, pk=pk)
+    insurance = get_object_or_404(Insurance.objects.with_customer(), pk=pk)
     if request.method == 'POST':
         insurance.sum_amount = request.POST.get('sum_amount')
         insurance.starting_period = request.POST.get('starting_period')
@@ -425,14 +524,14 @@ def edit_insurance(request, pk):
         insurance.ins_co = request.POST.get('ins_co')
         insurance.save()
         messages.success(request, f"Insurance policy '{insurance.no_insurance}' updated successfully.")
-        return redirect('customer_detail', pk=insurance.id_customer.id_customer)
+        return redirect('customer_detail', pk=insurance.id_customer_id)
     return render(request, 'insurance_app/edit_insurance.html', {'insurance': insurance})
 
 @login_required
 @permission_required('insurance_app.delete_insurance', raise_exception=True)
 def delete_insurance(request, pk):
-    insurance = get_object_or_404(Insurance, pk=pk)
-    customer_pk = insurance.id_customer.id_customer
+    insurance = get_object_or_404(Insurance.objects.with_customer(), pk=pk)
+    customer_pk = insurance.id_customer_id
     
     if request.method == 'POST':
         insurance_no = insurance.no_insurance
@@ -447,20 +546,10 @@ def delete_insurance(request, pk):
 def add_warranty(request, customer_pk):
     customer = get_object_or_404(Customer, pk=customer_pk)
     if request.method == 'POST':
-        product_choice = request.POST.get('product_select')
-        other_product = request.POST.get('product_other', '').strip()
-        final_product_name = ""
-
-        if product_choice == 'other':
-            if other_product:
-                final_product_name = other_product
-            else:
-                messages.error(request, "You selected 'Other' but did not specify a product name.")
-                return redirect('add_warranty', customer_pk=customer_pk)
-        elif product_choice:
-            final_product_name = product_choice
-        else:
-            messages.error(request, "You must select a product name.")
+        try:
+            final_product_name = resolve_warranty_product(request.POST.get('product_select'), request.POST.get('product_other'))
+        except RuleError as e:
+            messages.error(request, str(e))
             return redirect('add_warranty', customer_pk=customer_pk)
 
         Warranty.objects.create(
@@ -473,13 +562,9 @@ def add_warranty(request, customer_pk):
         messages.success(request, "New warranty added successfully.")
         return redirect('customer_detail', pk=customer.id_customer)
     
-    predefined_items = [
-        "Inverter", "String Inverter", "Hybrid Inverter", 
-        "Battery-based Inverter", "Micro Inverter", "Central Optimiser", "Central Inverter"
-    ]
     context = {
         'customer': customer,
-        'predefined_items': predefined_items,
+        'predefined_items': WARRANTY_PRODUCTS,
     }
     return render(request, 'insurance_app/add_warranty.html', context)
 
@@ -487,30 +572,17 @@ def add_warranty(request, customer_pk):
 @login_required
 @permission_required('insurance_app.change_warranty', raise_exception=True)
 def edit_warranty(request, pk):
-    warranty = get_object_or_404(Warranty, pk=pk)
+    warranty = get_object_or_404(Warranty.objects.with_customer(), pk=pk)
     
-    predefined_items = [
-        "Inverter", "String Inverter", "Hybrid Inverter", 
-        "Battery-based Inverter", "Micro Inverter", "Central Optimiser", "Central Inverter"
-    ]
+    predefined_items = WARRANTY_PRODUCTS
     
     if request.method == 'POST':
         product_choice = request.POST.get('product_select')
-        other_product = request.POST.get('product_other', '').strip()
-        final_product_name = ""
-
-        if product_choice == 'other':
-            if other_product:
-                final_product_name = other_product
-            else:
-                messages.error(request, "You selected 'Other' but did not specify a product name.")
-                context = {'warranty': warranty, 'predefined_items': predefined_items, 'is_other': True}
-                return render(request, 'insurance_app/edit_warranty.html', context)
-        elif product_choice:
-            final_product_name = product_choice
-        else:
-            messages.error(request, "You must select a product name.")
-            context = {'warranty': warranty, 'predefined_items': predefined_items, 'is_other': False}
+        try:
+            final_product_name = resolve_warranty_product(product_choice, request.POST.get('product_other'))
+        except RuleError as e:
+            messages.error(request, str(e))
+            context = {'warranty': warranty, 'predefined_items': predefined_items, 'is_other': product_choice == 'other'}
             return render(request, 'insurance_app/edit_warranty.html', context)
         
         warranty.product_name = final_product_name
@@ -519,7 +591,7 @@ def edit_warranty(request, pk):
         warranty.details = request.POST.get('details')
         warranty.save()
         messages.success(request, "Warranty details updated successfully.")
-        return redirect('customer_detail', pk=warranty.id_customer.id_customer)
+        return redirect('customer_detail', pk=warranty.id_customer_id)
     
     is_other = warranty.product_name not in predefined_items
     context = {
@@ -532,8 +604,8 @@ def edit_warranty(request, pk):
 @login_required
 @permission_required('insurance_app.delete_warranty', raise_exception=True)
 def delete_warranty(request, pk):
-    warranty = get_object_or_404(Warranty, pk=pk)
-    customer_pk = warranty.id_customer.id_customer
+    warranty = get_object_or_404(Warranty.objects.with_customer(), pk=pk)
+    customer_pk = warranty.id_customer_id
     if request.method == 'POST':
         warranty.delete()
         messages.success(request, "Warranty has been deleted.")
@@ -558,7 +630,7 @@ def add_defect(request, customer_pk):
 @login_required
 @permission_required('insurance_app.change_defect', raise_exception=True)
 def edit_defect(request, pk):
-    defect = get_object_or_404(Defect, pk=pk)
+    defect = get_object_or_404(Defect.objects.with_customer(), pk=pk)
     if request.method == 'POST':
 
         r_date = request.POST.get('report_date')
@@ -576,15 +648,15 @@ def edit_defect(request, pk):
         
         if defect.accident_date:
              return redirect('defect_list')
-        return redirect('customer_detail', pk=defect.id_customer.id_customer)
+        return redirect('customer_detail', pk=defect.id_customer_id)
         
     return render(request, 'insurance_app/edit_defect.html', {'defect': defect})
 
 @login_required
 @permission_required('insurance_app.delete_defect', raise_exception=True)
 def delete_defect(request, pk):
-    defect = get_object_or_404(Defect, pk=pk)
-    customer_pk = defect.id_customer.id_customer
+    defect = get_object_or_404(Defect.objects.with_customer(), pk=pk)
+    customer_pk = defect.id_customer_id
     if request.method == 'POST':
         defect.delete()
         messages.success(request, "Defect report has been deleted.")
@@ -594,59 +666,123 @@ def delete_defect(request, pk):
 @login_required
 @permission_required('insurance_app.add_customerfile', raise_exception=True)
 def upload_customer_file(request, customer_pk):
-    customer = get_object_or_404(Customer, pk=customer_pk)
+    customer = get_object_or_404(Customer.objects.only('pk'), pk=customer_pk)
     if request.method == 'POST' and 'file' in request.FILES:
+        upload = request.FILES['file']
         try:
-            with transaction.atomic():
-                CustomerFile.objects.create(
-                    id_customer=customer,
-                    file=request.FILES['file'],
-                    description=request.POST.get('description', '')
-                )
+            store_customer_file(customer.pk, upload, upload.name, request.POST.get('description', ''))
             messages.success(request, "File uploaded successfully.")
         except Exception as e:
             messages.error(request, f"Error uploading file: {e}")
     return redirect('customer_detail', pk=customer.id_customer)
 
 
+def upload_error_response(error):
+    return JsonResponse({'error': str(error), **error.extra}, status=error.status)
+
+
+@login_required
+@permission_required('insurance_app.add_customerfile', raise_exception=True)
+def start_customer_upload(request, customer_pk):
+    """GET returns the upload limits; POST (filename, size, optional sha256 and description) opens a session."""
+    customer = get_object_or_404(Customer.objects.only('pk'), pk=customer_pk)
+    if request.method == 'POST':
+        try:
+            session = UploadSession.start(
+                customer.pk,
+                request.user,
+                request.POST.get('filename'),
+                request.POST.get('size'),
+                sha256=request.POST.get('sha256', ''),
+                description=request.POST.get('description', ''),
+            )
+        except UploadError as e:
+            return upload_error_response(e)
+        return JsonResponse(session.status(), status=201)
+    return JsonResponse({
+        'chunk_size': settings.CUSTOMER_UPLOAD_CHUNK_SIZE,
+        'max_size': settings.CUSTOMER_UPLOAD_MAX_SIZE,
+    })
+
+
+@login_required
+@permission_required('insurance_app.add_customerfile', raise_exception=True)
+def customer_upload(request, upload_id):
+    """
+    GET reports the resume offset, PUT appends the request body at the
+    Upload-Offset header (optionally checked against Upload-Checksum, a hex
+    SHA-256), POST finalizes into a CustomerFile and DELETE abandons it.
+    """
+    try:
+        session = UploadSession.load(str(upload_id), request.user)
+        if request.method == 'PUT':
+            try:
+                offset = int(request.headers.get('Upload-Offset', ''))
+                length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                raise UploadError("Upload-Offset and Content-Length must be whole numbers.")
+            session.append(request, offset, length, request.headers.get('Upload-Checksum', ''))
+        elif request.method == 'POST':
+            customer_file = session.finalize()
+            return JsonResponse({
+                'id': customer_file.pk,
+                'url': reverse('download_customer_file', args=[customer_file.pk]),
+            }, status=201)
+        elif request.method == 'DELETE':
+            session.discard()
+            return HttpResponse(status=204)
+        return JsonResponse(session.status())
+    except UploadError as e:
+        return upload_error_response(e)
+
+
+@login_required
+@permission_required('insurance_app.view_customerfile', raise_exception=True)
+def download_customer_file(request, file_pk):
+    customer_file = get_object_or_404(CustomerFile.objects.only('file'), pk=file_pk)
+    return serve_file(request, customer_file.file, as_attachment='download' in request.GET)
+
+
+@login_required
+@permission_required('insurance_app.view_customerfile', raise_exception=True)
+def customer_file_preview(request, file_pk):
+    customer_file = get_object_or_404(CustomerFile.objects.only('file'), pk=file_pk)
+    preview = open_preview(customer_file.file)
+    if preview is None:
+        response = HttpResponse(placeholder_svg(customer_file.file.name), content_type='image/svg+xml')
+        patch_cache_control(response, private=True, max_age=PLACEHOLDER_MAX_AGE)
+        return response
+    response = FileResponse(preview, content_type=PREVIEW_CONTENT_TYPE)
+    # A CustomerFile's content never changes after upload, so neither does its preview URL.
+    patch_cache_control(response, private=True, max_age=settings.FILE_PREVIEW_MAX_AGE, immutable=True)
+    return response
+
+
 @login_required
 @permission_required('insurance_app.delete_customerfile', raise_exception=True)
 def delete_customer_file(request, file_pk):
     customer_file = get_object_or_404(CustomerFile, pk=file_pk)
-    customer_pk = customer_file.id_customer.id_customer
+    customer_pk = customer_file.id_customer_id
 
     if request.method == 'POST':
         try:
-            if os.path.exists(customer_file.file.path):
-                os.remove(customer_file.file.path)
-            
+            # The stored file is queued for the batched cleanup job rather than removed here.
             customer_file.delete()
             messages.success(request, f"File '{os.path.basename(customer_file.file.name)}' was deleted successfully.")
         except Exception as e:
             messages.error(request, f"Error deleting file: {e}")    
     return redirect('customer_detail', pk=customer_pk)
 
+@reads_from_replica
 @login_required
 def defect_list(request):
-    defects = Defect.objects.filter(accident_date__isnull=False).order_by('status', '-accident_date')
+    defects = Defect.objects.for_defect_list().filter(accident_date__isnull=False).order_by('status', '-accident_date')
     context = {'defects': defects}
     return render(request, 'insurance_app/defect_list.html', context)
 
 @login_required
 @permission_required('insurance_app.add_defect', raise_exception=True)
 def add_defect_record(request):
-    customers = Customer.objects.all()
-
-    latest_deadlines = {}
-    liability_periods = Defect.objects.filter(resolution_deadline__isnull=False, accident_date__isnull=True)
-    
-    for d in liability_periods:
-        cid = d.id_customer.id_customer
-        if cid not in latest_deadlines or d.resolution_deadline > latest_deadlines[cid]:
-            latest_deadlines[cid] = d.resolution_deadline
-
-    deadlines_json = json.dumps({k: v.isoformat() for k, v in latest_deadlines.items()})
-
     if request.method == 'POST':
         customer_id = request.POST.get('id_customer')
         defect_type_selection = request.POST.get('defect_type_select')
@@ -656,13 +792,13 @@ def add_defect_record(request):
 
         if not customer_id:
             messages.error(request, "Please search and select a valid customer.")
-            return render(request, 'insurance_app/add_defect_record.html', {'customers': customers, 'deadlines_json': deadlines_json})
+            return render(request, 'insurance_app/add_defect_record.html')
         
         try:
             customer = Customer.objects.get(pk=customer_id)
         except Customer.DoesNotExist:
             messages.error(request, "Customer not found.")
-            return render(request, 'insurance_app/add_defect_record.html', {'customers': customers, 'deadlines_json': deadlines_json})
+            return render(request, 'insurance_app/add_defect_record.html')
 
         final_defect_type = defect_type_selection
         if defect_type_selection == 'Other':
@@ -684,13 +820,13 @@ def add_defect_record(request):
         except Exception as e:
             messages.error(request, f"Error adding defect: {e}")
 
-    return render(request, 'insurance_app/add_defect_record.html', {'customers': customers, 'deadlines_json': deadlines_json})
+    return render(request, 'insurance_app/add_defect_record.html')
 
 
 @login_required
 @permission_required('insurance_app.change_defect', raise_exception=True)
 def edit_defect_record(request, pk):
-    defect = get_object_or_404(Defect, pk=pk)
+    defect = get_object_or_404(Defect.objects.with_customer(), pk=pk)
     
     context = {
         'defect': defect
@@ -728,7 +864,7 @@ def edit_defect_record(request, pk):
 @login_required
 @permission_required('insurance_app.delete_defect', raise_exception=True)
 def delete_defect_record(request, pk):
-    defect = get_object_or_404(Defect, pk=pk)
+    defect = get_object_or_404(Defect.objects.with_customer(), pk=pk)
     
     if request.method == 'POST':
         try:
@@ -744,7 +880,7 @@ def delete_defect_record(request, pk):
 @login_required
 @permission_required('insurance_app.change_defect', raise_exception=True)
 def solve_defect(request, pk):
-    defect = get_object_or_404(Defect, pk=pk)
+    defect = get_object_or_404(Defect.objects.with_customer(), pk=pk)
     if request.method == 'POST':
         defect.status = 'Solved'
         defect.save()
@@ -0,0 +1,26 @@
+"""
+Gunicorn profile for serving insurance_project.asgi with uvicorn workers:
+
+    gunicorn insurance_project.asgi:application -c insurance_project/gunicorn_asgi.py
+
+Needs the uvicorn and uvicorn-worker packages. For a single local process,
+``uvicorn insurance_project.asgi:application --port 8000`` serves the same app.
+
+Each worker runs one event loop: the async views (main_page,
+notification_page, customer_detail) run their independent reads at the same
+time on pool threads (see ASYNC_PARALLEL_READS), and sync views and sync-only
+middleware (WhiteNoise) run in the worker's thread pool. Under ASGI each
+request's ORM work runs in its own thread, so CONN_MAX_AGE does not keep
+connections between requests; put a pooler such as PgBouncer in front of
+PostgreSQL when moving to this profile.
+Compare with the WSGI setup using ``manage.py benchmark_servers``.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'uvicorn_worker.UvicornWorker'
+keepalive = 5
+timeout = 60
+graceful_timeout = 30
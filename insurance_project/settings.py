@@ -14,6 +14,7 @@ from pathlib import Path
 from decouple import config
 import dj_database_url
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -51,19 +52,59 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'insurance_app.middleware.RequestInstrumentationMiddleware',
+    'insurance_app.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'insurance_app.middleware.DuplicateQueryWarningMiddleware',
 ]
 
+# DuplicateQueryWarningMiddleware (DEBUG only) warns at this many repeats of one SQL shape.
+DUPLICATE_QUERY_THRESHOLD = config('DUPLICATE_QUERY_THRESHOLD', default=5, cast=int)
+
+# RequestInstrumentationMiddleware: Server-Timing header on every response and
+# a JSON line on the 'insurance_app.slow_requests' logger for this fraction of
+# requests slower than SLOW_REQUEST_THRESHOLD_MS.
+REQUEST_INSTRUMENTATION = config('REQUEST_INSTRUMENTATION', default=True, cast=bool)
+SERVER_TIMING_HEADER = config('SERVER_TIMING_HEADER', default=True, cast=bool)
+SLOW_REQUEST_THRESHOLD_MS = config('SLOW_REQUEST_THRESHOLD_MS', default=500, cast=int)
+SLOW_REQUEST_SAMPLE_RATE = config('SLOW_REQUEST_SAMPLE_RATE', default=1.0, cast=float)
+
+# Per-view latency, query and cache metrics (insurance_app/metrics.py). Each
+# worker process writes its numbers to METRICS_DIR at most every
+# METRICS_FLUSH_INTERVAL seconds; staff (or a scraper sending
+# "Authorization: Bearer <METRICS_TOKEN>") read the sum at /metrics in
+# Prometheus text format. Files of exited workers are folded into
+# aggregate.json there, so totals survive worker restarts; empty METRICS_DIR
+# on deploy to start counters afresh.
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_DIR = config('METRICS_DIR', default=os.path.join(tempfile.gettempdir(), 'insurance-metrics'))
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=1.0, cast=float)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# The async views (main_page, notification_page, customer_detail) run their
+# independent reads at the same time, each on a pool thread with its own
+# database connection (insurance_app.parallel.gather_reads). Each such read
+# opens a connection when none is kept for its thread, so under ASGI put a
+# pooler such as PgBouncer in front of PostgreSQL. Off runs them one by one
+# on the request's connection.
+ASYNC_PARALLEL_READS = config('ASYNC_PARALLEL_READS', default=True, cast=bool)
+
 ROOT_URLCONF = 'insurance_project.urls'
 
+# No 'loaders' option on purpose: Django then wraps the filesystem and app
+# loaders in the cached loader, so each template is compiled once per process
+# (in DEBUG too, where the autoreloader clears it when a template changes).
+# customer_detail.html also caches rendered fragments in the 'fragments'
+# cache (see CACHES), keyed by insurance_app.fragments version stamps.
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend with render timing for RequestInstrumentationMiddleware.
+        'BACKEND': 'insurance_app.instrumentation.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR , 'templates')], # Tells Django to look for the 'registration' folder here
         'APP_DIRS': True, # Tells Django to look for templates inside app directories
         'OPTIONS': {
@@ -91,6 +132,68 @@ DATABASES = {
     )
 }
 
+# Optional read replica. Views marked with insurance_app.routers.reads_from_replica
+# (dashboard, lists, notifications, export) read from it; a browser that has just
+# sent a POST reads from the primary for REPLICA_PIN_SECONDS, which should exceed
+# the usual replication lag. Two SQLite files work locally: copy the primary to
+# the replica file and set REPLICA_DATABASE_URL=sqlite:///replica.sqlite3.
+
+REPLICA_DATABASE_URL = config('REPLICA_DATABASE_URL', default='')
+REPLICA_DATABASE_ALIAS = 'replica' if REPLICA_DATABASE_URL else ''
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+REPLICA_PIN_COOKIE = 'use_primary'
+
+if REPLICA_DATABASE_ALIAS:
+    DATABASES[REPLICA_DATABASE_ALIAS] = dj_database_url.parse(REPLICA_DATABASE_URL, conn_max_age=600)
+    # Tests run against one database; the replica alias reads it too.
+    DATABASES[REPLICA_DATABASE_ALIAS]['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['insurance_app.routers.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory is per process; use 'file' or 'db' to share the cache between gunicorn workers.
+
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+
+if CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_LOCATION', default=os.path.join(BASE_DIR, 'cache')),
+        }
+    }
+elif CACHE_BACKEND == 'db':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': config('CACHE_LOCATION', default='django_cache'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'insurance-app',
+        }
+    }
+
+# Whatever a save invalidates must live in a cache every worker shares, or
+# the other workers keep serving the old value:
+# - customer_detail.html caches rendered fragments under per-customer version
+#   stamps that every save bumps; with 'locmem' the page is rendered uncached.
+# - The sidebar counters and dashboard figures are cleared on save; with
+#   'locmem' each worker keeps its copy for LOCAL_CACHE_TIMEOUT seconds only,
+#   instead of the whole day.
+SHARED_CACHE = CACHE_BACKEND in ('file', 'db')
+LOCAL_CACHE_TIMEOUT = config('LOCAL_CACHE_TIMEOUT', default=60, cast=int)
+
+if SHARED_CACHE:
+    CACHES['fragments'] = CACHES['default']
+else:
+    CACHES['fragments'] = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -146,3 +249,54 @@ LOGIN_REDIRECT_URL = 'main_page'
 # These settings are now active for local media
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Resumable customer file uploads (insurance_app/uploads.py). Partial uploads
+# are kept in CUSTOMER_UPLOAD_TEMP_DIR (default: MEDIA_ROOT/.uploads), which
+# should be on the same filesystem as MEDIA_ROOT so finishing one is a rename;
+# the daily purge_stale_uploads job removes ones idle for longer than
+# CUSTOMER_UPLOAD_SESSION_MAX_AGE seconds.
+CUSTOMER_UPLOAD_CHUNK_SIZE = config('CUSTOMER_UPLOAD_CHUNK_SIZE', default=4 * 1024 * 1024, cast=int)
+CUSTOMER_UPLOAD_MAX_SIZE = config('CUSTOMER_UPLOAD_MAX_SIZE', default=2 * 1024 * 1024 * 1024, cast=int)
+CUSTOMER_UPLOAD_TEMP_DIR = config('CUSTOMER_UPLOAD_TEMP_DIR', default='')
+CUSTOMER_UPLOAD_SESSION_MAX_AGE = config('CUSTOMER_UPLOAD_SESSION_MAX_AGE', default=60 * 60 * 24 * 2, cast=int)
+
+# Deleted customer files are queued and removed by the daily cleanup_files job
+# (or `manage.py cleanup_files`), which also queues files under
+# customer_files/ that no CustomerFile references once they are older than
+# ORPHAN_FILE_GRACE_SECONDS (uploads reach storage before their row commits).
+ORPHAN_FILE_GRACE_SECONDS = config('ORPHAN_FILE_GRACE_SECONDS', default=60 * 60 * 24, cast=int)
+
+# How download_customer_file sends files once the permission check passes:
+# 'python' streams them with Range support, 'nginx' hands off with
+# X-Accel-Redirect to FILE_DOWNLOAD_ACCEL_PREFIX + the file's name, which
+# needs an internal location such as
+#     location /protected-media/ { internal; alias /srv/app/media/; }
+# and 'sendfile' sets X-Sendfile for Apache mod_xsendfile / lighttpd.
+FILE_DOWNLOAD_BACKEND = config('FILE_DOWNLOAD_BACKEND', default='python')
+FILE_DOWNLOAD_ACCEL_PREFIX = config('FILE_DOWNLOAD_ACCEL_PREFIX', default='/protected-media/')
+
+# Customer file previews (insurance_app/previews.py): JPEG thumbnails of
+# images, and of a PDF's first page when pypdfium2 is installed, cached in
+# FILE_PREVIEW_CACHE_DIR (default: MEDIA_ROOT/.previews) by file hash and
+# trimmed least-recently-used first once over FILE_PREVIEW_CACHE_MAX_BYTES.
+FILE_PREVIEW_SIZE = config('FILE_PREVIEW_SIZE', default=160, cast=int)
+FILE_PREVIEW_CACHE_DIR = config('FILE_PREVIEW_CACHE_DIR', default='')
+FILE_PREVIEW_CACHE_MAX_BYTES = config('FILE_PREVIEW_CACHE_MAX_BYTES', default=256 * 1024 * 1024, cast=int)
+FILE_PREVIEW_MAX_AGE = config('FILE_PREVIEW_MAX_AGE', default=60 * 60 * 24 * 365, cast=int)
+
+# 'pages' shows numbered pages with a total count; 'cursor' uses keyset
+# pagination with next/previous links only and skips the COUNT(*).
+CUSTOMER_LIST_PAGINATION = config('CUSTOMER_LIST_PAGINATION', default='pages')
+
+# 'auto' picks 'trigram' on PostgreSQL and 'basic' elsewhere; see insurance_app/search.py.
+CUSTOMER_SEARCH_BACKEND = config('CUSTOMER_SEARCH_BACKEND', default='auto')
+
+# Daily jobs (insurance_app/jobs.py) run at this UTC time, matching the
+# timezone.now().date() rollover the views use. Run them with
+# `manage.py run_jobs` from cron, `manage.py run_jobs --loop`, or set
+# JOB_SCHEDULER_IN_PROCESS to start the scheduler thread inside each web worker.
+JOB_SCHEDULE_TIME = config('JOB_SCHEDULE_TIME', default='00:05')
+JOB_SCHEDULER_IN_PROCESS = config('JOB_SCHEDULER_IN_PROCESS', default=False, cast=bool)
+
+# Creates the unmanaged insurance_app tables in the test database.
+TEST_RUNNER = 'insurance_app.test_runner.UnmanagedModelTestRunner'
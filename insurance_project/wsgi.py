@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'insurance_project.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.JOB_SCHEDULER_IN_PROCESS:
+    from insurance_app.jobs import start_scheduler_thread
+    start_scheduler_thread()